@@ -0,0 +1,336 @@
+"""Benchmarks for the Spirit scoring hot path.
+
+Times every stage a sample goes through, from the conduit's line parsing to
+the full ``Spirit.measure``, against synthetic conduits that replay
+pregenerated motion from memory, so only the host-side cost is measured.
+Each case reports samples per second and per-sample latency percentiles as
+JSON, one object per case::
+
+    python benchmarks/hot_path.py                   # JSON on stdout
+    python benchmarks/hot_path.py -o results.json   # JSON to a file
+    python benchmarks/hot_path.py --quick -k measure   # suites named *measure*
+
+A short summary table goes to stderr. Compare two result files to spot
+regressions; the case names and parameters are stable.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Runnable as a script from a checkout, without installing the package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from channelling_portal.buffers import y_rotations
+from channelling_portal.entities import Measurement, Quaternion, Spirit, SpiritState, parse_measurements
+from channelling_portal.frames import encode_frames, parse_sample, parse_samples, take_frames
+from channelling_portal.instrumentation import Instrumentation
+from channelling_portal.scoring import BatchScorer, DTWJob, ScoringEngine
+from channelling_portal.summoning import rotation_function_ms
+
+SAMPLE_PERIOD_MS = 10
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def synthetic_samples(count: int, motion: str = "summoning", seed: int = 0) -> np.ndarray:
+    """(count, 5) timestamp and quaternion rows at 100 Hz, rotating about the y axis.
+
+    ``summoning`` follows the summoning function with a little jitter;
+    spirits accept the stretches of it that the y rotation's ±90° range can
+    represent. ``noise`` is random motion that keeps them rejecting and
+    realigning, and ``still`` a device lying on a table, only the jitter.
+    Each measure case reports the fraction of samples accepted.
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(count) * SAMPLE_PERIOD_MS
+    if motion == "summoning":
+        angles = rotation_function_ms(timestamps) + rng.normal(0, 0.005, count)
+    elif motion == "noise":
+        angles = rng.uniform(-np.pi, np.pi, count)
+    elif motion == "still":
+        angles = rng.normal(0, 0.005, count)
+    else:
+        raise ValueError(f"Unknown motion {motion!r}")
+    samples = np.zeros((count, 5))
+    samples[:, 0] = timestamps
+    samples[:, 1] = np.cos(angles / 2)
+    samples[:, 3] = np.sin(angles / 2)
+    return samples
+
+
+def synthetic_lines(samples: np.ndarray) -> List[bytes]:
+    return [f"{int(t)},{qw:.6f},{qx:.6f},{qy:.6f},{qz:.6f}".encode() for t, qw, qx, qy, qz in samples]
+
+
+class SyntheticSpiritCommunication:
+    """Conduit that hands out pregenerated measurements, looping forever."""
+
+    def __init__(self, samples: np.ndarray):
+        self._measurements = [Measurement.trusted(*sample) for sample in samples.tolist()]
+        self._position = 0
+        self._offset = 0
+        self._span = int(samples[-1, 0]) + SAMPLE_PERIOD_MS
+
+    def measure(self) -> Measurement:
+        measurement = self._measurements[self._position]
+        offset = self._offset
+        self._position += 1
+        if self._position == len(self._measurements):
+            self._position = 0
+            self._offset += self._span
+        if not offset:
+            return measurement
+        # Later loops keep the device clock running forward
+        quaternion = measurement.quaternion
+        return Measurement.trusted(measurement.timestamp + offset,
+                                   quaternion.qw, quaternion.qx, quaternion.qy, quaternion.qz)
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def notify_state(self, state: SpiritState):
+        pass
+
+
+def run_case(name: str, operation: Callable[[], object], samples_per_call: int, repeat: int,
+             warmup: int, **parameters) -> Dict:
+    for _ in range(warmup):
+        operation()
+    latencies = np.empty(repeat, dtype=np.int64)
+    clock = time.perf_counter_ns
+    started = clock()
+    for index in range(repeat):
+        before = clock()
+        operation()
+        latencies[index] = clock() - before
+    elapsed_ns = clock() - started
+
+    per_sample_us = latencies / samples_per_call / 1000
+    return {
+        "name": name,
+        "parameters": parameters,
+        "samples": repeat * samples_per_call,
+        "samples_per_second": repeat * samples_per_call / (elapsed_ns / 1e9),
+        "latency_us": {
+            "mean": float(per_sample_us.mean()),
+            **{f"p{p:g}": float(np.percentile(per_sample_us, p)) for p in PERCENTILES},
+            "max": float(per_sample_us.max()),
+        },
+    }
+
+
+def rotation_function_cases(windows: Iterable[int], repeat: int) -> Iterable[Dict]:
+    for window in windows:
+        times = np.arange(window, dtype=float) * SAMPLE_PERIOD_MS
+        yield run_case("rotation_function_ms", lambda: rotation_function_ms(times), window, repeat, repeat // 10,
+                       window=window)
+
+
+def y_rotation_cases(repeat: int) -> Iterable[Dict]:
+    samples = synthetic_samples(1024)
+    quaternion = Quaternion(qw=samples[3, 1], qx=samples[3, 2], qy=samples[3, 3], qz=samples[3, 4])
+    yield run_case("Quaternion.y_rotation", quaternion.y_rotation, 1, repeat, repeat // 10)
+    yield run_case("y_rotations", lambda: y_rotations(samples[:, 1:]), len(samples), repeat // 100 or 1,
+                   repeat // 1000, batch=len(samples))
+
+
+def parsing_cases(repeat: int) -> Iterable[Dict]:
+    samples = synthetic_samples(64)
+    lines = synthetic_lines(samples)
+    yield run_case("parse_sample", lambda: parse_sample(lines[7]), 1, repeat, repeat // 10)
+    for strict in (False, True):
+        yield run_case("parse_measurements", lambda: parse_measurements(lines[:1], strict), 1, repeat,
+                       repeat // 10, batch=1, strict=strict)
+        yield run_case("parse_measurements", lambda: parse_measurements(lines, strict), len(lines),
+                       repeat // 10 or 1, repeat // 100, batch=len(lines), strict=strict)
+    yield run_case("parse_samples", lambda: parse_samples(lines), len(lines), repeat // 10 or 1, repeat // 100,
+                   batch=len(lines))
+    frames = encode_frames(samples)
+    yield run_case("take_frames", lambda: take_frames(bytearray(frames)), len(samples), repeat // 10 or 1,
+                   repeat // 100, batch=len(samples))
+
+
+def dtw_cases(windows: Iterable[int], repeat: int) -> Iterable[Dict]:
+    for window in windows:
+        spirit = Spirit(name="bench", color="white", conduit=SyntheticSpiritCommunication(synthetic_samples(window)),
+                        measurement_count=window)
+        for _ in range(window):
+            spirit.measurements.append(spirit.conduit.measure())
+        yield run_case("Spirit.dtw", spirit.dtw, 1, max(repeat // window, 10), 1, window=window)
+
+
+def measure_cases(windows: Iterable[int], spirit_counts: Iterable[int], motions: Iterable[str],
+                  repeat: int) -> Iterable[Dict]:
+    for motion in motions:
+        for window in windows:
+            for spirit_count in spirit_counts:
+                spirits = [
+                    Spirit(name=f"spirit{i}", color="white", measurement_count=window,
+                           conduit=SyntheticSpiritCommunication(synthetic_samples(4 * window, motion, seed=i)))
+                    for i in range(spirit_count)
+                ]
+
+                accepted = [0]
+
+                def measure_all():
+                    # One round: every spirit takes a sample, as a portal would
+                    for spirit in spirits:
+                        gauge = spirit.gauge
+                        spirit.measure()
+                        spirit.update_state()
+                        accepted[0] += spirit.gauge > gauge
+
+                rounds = max(repeat // (window * spirit_count), 20)
+                result = run_case("Spirit.measure", measure_all, spirit_count, rounds, window,
+                                  window=window, spirits=spirit_count, motion=motion)
+                result["accepted"] = accepted[0] / ((rounds + window) * spirit_count)
+                result["template_cache"] = {
+                    "hits": sum(spirit.summoning.cache.hits for spirit in spirits),
+                    "misses": sum(spirit.summoning.cache.misses for spirit in spirits),
+                }
+                yield result
+
+
+def engine_cases(windows: Iterable[int], motions: Iterable[str], repeat: int) -> Iterable[Dict]:
+    for motion in motions:
+        for window in windows:
+            for engine in ScoringEngine:
+                spirit = Spirit(name="bench", color="white", measurement_count=window, engine=engine,
+                                conduit=SyntheticSpiritCommunication(synthetic_samples(4 * window, motion)))
+                yield run_case("Spirit.measure", spirit.measure, 1, max(repeat // window, 20), window,
+                               window=window, engine=engine.value, motion=motion)
+
+
+def batch_cases(windows: Iterable[int], spirit_counts: Iterable[int], repeat: int) -> Iterable[Dict]:
+    # One tick of every spirit, scored one after the other or as one batch on
+    # one worker, two and every core; only more cores than one can be faster
+    worker_counts = sorted({1, 2, os.cpu_count() or 1})
+    for window in windows:
+        for spirit_count in spirit_counts:
+            for workers in [0] + worker_counts:
+                batched = workers > 0
+                spirits = [
+                    Spirit(name=f"spirit{i}", color="white", measurement_count=window,
+                           conduit=SyntheticSpiritCommunication(synthetic_samples(4 * window, "noise", seed=i)))
+                    for i in range(spirit_count)
+                ]
+                scorer = BatchScorer(workers) if batched else None
+                if scorer is not None:
+                    # Spawn the workers before timing
+                    scorer.distances([DTWJob(np.zeros(2), np.zeros(2))] * workers)
+
+                def tick():
+                    measurements = [(spirit, spirit.conduit.measure()) for spirit in spirits]
+                    if scorer is None:
+                        for spirit, measurement in measurements:
+                            spirit.process(measurement)
+                    else:
+                        scorer.score(measurements)
+
+                yield run_case("tick", tick, spirit_count, max(repeat // (window * spirit_count), 20), window,
+                               window=window, spirits=spirit_count, batched=batched,
+                               workers=scorer.workers if scorer else 1)
+                if scorer is not None:
+                    scorer.shutdown()
+
+
+def adaptive_cases(windows: Iterable[int], motions: Iterable[str], repeat: int) -> Iterable[Dict]:
+    # A round of 16 spirits, as a portal would run it, with and without compute tiers
+    for motion in motions:
+        for window in windows:
+            for adaptive in (False, True):
+                spirits = [
+                    Spirit(name=f"spirit{i}", color="white", measurement_count=window, adaptive=adaptive,
+                           conduit=SyntheticSpiritCommunication(synthetic_samples(4 * window, motion, seed=i)))
+                    for i in range(16)
+                ]
+
+                def round_all():
+                    for spirit in spirits:
+                        spirit.measure()
+                        spirit.update_state()
+
+                rounds = max(repeat // (window * 16), 20)
+                yield run_case("Spirit.measure", round_all, len(spirits), rounds, 4 * window,
+                               window=window, spirits=len(spirits), adaptive=adaptive, motion=motion)
+
+
+def instrumentation_cases(windows: Iterable[int], repeat: int) -> Iterable[Dict]:
+    # The same single-spirit round with and without recording, for its overhead
+    for window in windows:
+        for instrumented in (False, True):
+            spirit = Spirit(name="bench", color="white", measurement_count=window,
+                            conduit=SyntheticSpiritCommunication(synthetic_samples(4 * window)))
+            if instrumented:
+                spirit.instrumentation = Instrumentation()
+            yield run_case("Spirit.measure", spirit.measure, 1, max(repeat // window, 20), window,
+                           window=window, instrumented=instrumented)
+
+
+def summary(results: List[Dict]) -> str:
+    rows = [f"{'case':<60} {'samples/s':>12} {'p50 us':>9} {'p99 us':>9}"]
+    for result in results:
+        parameters = ",".join(f"{key}={value}" for key, value in result["parameters"].items())
+        latency = result["latency_us"]
+        rows.append(f"{result['name'] + ' ' + parameters:<60} {result['samples_per_second']:>12.0f} "
+                    f"{latency['p50']:>9.2f} {latency['p99']:>9.2f}")
+    return "\n".join(rows)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("-k", "--filter", default="", help="only run the suites whose name contains this, such as parse or engine")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations and sizes, for a smoke run")
+    parser.add_argument("--windows", type=int, nargs="+", default=[50, 100, 200, 400])
+    parser.add_argument("--spirits", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args(argv)
+
+    repeat = 2_000 if args.quick else 20_000
+    windows = args.windows[:2] if args.quick else args.windows
+    spirit_counts = args.spirits[:2] if args.quick else args.spirits
+    suites = [
+        ("rotation_function_ms", lambda: rotation_function_cases(windows, repeat)),
+        ("y_rotation", lambda: y_rotation_cases(repeat)),
+        ("parse", lambda: parsing_cases(repeat)),
+        ("Spirit.dtw", lambda: dtw_cases(windows, repeat * 10)),
+        ("Spirit.measure", lambda: measure_cases(windows, spirit_counts, ("summoning", "noise"), repeat * 10)),
+        ("engine", lambda: engine_cases(windows, ("summoning", "noise"), repeat * 10)),
+        ("batch", lambda: batch_cases(windows, spirit_counts, repeat * 10)),
+        ("adaptive", lambda: adaptive_cases(windows, ("still", "noise", "summoning"), repeat * 10)),
+        ("instrumentation", lambda: instrumentation_cases(windows, repeat * 10)),
+    ]
+
+    results = []
+    for suite, cases in suites:
+        if args.filter.lower() not in suite.lower():
+            continue
+        for result in cases():
+            results.append(result)
+            print(summary([result]).splitlines()[1], file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
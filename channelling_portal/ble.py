@@ -0,0 +1,163 @@
+import asyncio
+import contextlib
+import queue
+import threading
+from typing import Callable, List, Optional
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+from .entities import Measurement, SpiritState, take_measurements
+from .frames import FrameFormat
+from .instrumentation import Instrumentation, NullInstrumentation
+from .queues import put_dropping_oldest, take_queued
+
+# Nordic UART service, as advertised by the spirit firmware's BLEUart
+UART_SERVICE_UUID = "6E400001-B5A3-F393-E0A9-E50E24DCCA9E"
+UART_RX_CHAR_UUID = "6E400002-B5A3-F393-E0A9-E50E24DCCA9E"  # host -> device writes
+UART_TX_CHAR_UUID = "6E400003-B5A3-F393-E0A9-E50E24DCCA9E"  # device -> host notifications
+
+
+def bleak_client(address: str, disconnected_callback: Optional[Callable] = None):
+    from bleak import BleakClient
+    return BleakClient(address, disconnected_callback=disconnected_callback)
+
+
+class BLENotifySpiritCommunication(BaseModel):
+    """BLE UART conduit driven by notifications instead of polling reads.
+
+    bleak runs on a private event loop thread. Every notification is appended
+    to a frame buffer, complete lines are parsed in one batch and the
+    measurements are put on a bounded queue that ``measure`` and
+    ``measure_batch`` consume. When the consumer falls behind, the oldest
+    measurements are dropped and counted in ``dropped``; lines garbled on
+    the radio are skipped and counted in ``malformed``. Once the device
+    disconnects, ``measure`` raises ``ConnectionError`` instead of waiting
+    for notifications that will never come, and ``TimeoutError`` after
+    ``silence_timeout`` seconds without a sample from a device that went
+    quiet without the host noticing. ``mtu_size`` is the MTU negotiated on
+    connect, which bounds how much one notification carries.
+    """
+
+    mac_address: str
+    service_uuid: str = UART_SERVICE_UUID
+    tx_characteristic_uuid: str = UART_TX_CHAR_UUID
+    rx_characteristic_uuid: str = UART_RX_CHAR_UUID
+    queue_size: int = 1024
+    timeout: float = 10.0
+    silence_timeout: Optional[float] = None
+    strict: bool = False
+    # Binary frames are a third of the text line's size on the radio link
+    frame_format: FrameFormat = FrameFormat.text
+    client_factory: Callable = bleak_client
+    mtu_size: Optional[int] = None
+    dropped: int = 0
+    malformed: int = 0
+    instrumentation: Instrumentation = Field(default_factory=NullInstrumentation)
+    _client = PrivateAttr(default=None)
+    _loop: Optional[asyncio.AbstractEventLoop] = PrivateAttr(default=None)
+    _thread: Optional[threading.Thread] = PrivateAttr(default=None)
+    _frames: bytearray = PrivateAttr(default_factory=bytearray)
+    _measurements: queue.Queue = PrivateAttr(default=None)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(self.timeout)
+
+    def connect(self):
+        self._measurements = queue.Queue(maxsize=self.queue_size)
+        self._frames.clear()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=f"ble-{self.mac_address}", daemon=True)
+        self._thread.start()
+        try:
+            self._run(self._connect())
+        except BaseException:
+            # Nothing is left running after a failed connect, so it can be retried
+            with contextlib.suppress(Exception):
+                self.disconnect()
+            raise
+
+    async def _connect(self):
+        self._client = self.client_factory(self.mac_address, disconnected_callback=self._on_disconnect)
+        await self._client.connect()
+        await self._acquire_mtu()
+        self.mtu_size = self._client.mtu_size
+        await self._client.start_notify(self.tx_characteristic_uuid, self._on_notification)
+        # Always sent, as the device may still be in the format of an earlier session
+        await self._client.write_gatt_char(
+            self.rx_characteristic_uuid, f"format:{self.frame_format.value}\n".encode(), response=False)
+
+    async def _acquire_mtu(self):
+        # BlueZ reports the default 23 bytes until the negotiated MTU is
+        # acquired, which bleak only exposes on its backend, as in its own
+        # MTU example. The other backends negotiate it on connect.
+        backend = getattr(self._client, "_backend", None)
+        if type(backend).__name__ != "BleakClientBlueZDBus":
+            return
+        acquire_mtu = getattr(backend, "_acquire_mtu", None)
+        if acquire_mtu is None:
+            return
+        try:
+            await acquire_mtu()
+        except Exception:
+            # Not every BlueZ version can; notifications then come in the default MTU
+            self.instrumentation.count("mtu_unavailable")
+
+    def disconnect(self):
+        if self._loop is None:
+            return
+        try:
+            if self._client is not None:
+                self._run(self._client.disconnect())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(self.timeout)
+            self._loop.close()
+            self._loop = None
+            self._client = None
+
+    def _on_disconnect(self, client):
+        # Wakes a waiting measure; it stays queued, so every later one raises too
+        self.dropped += put_dropping_oldest(self._measurements, None)
+
+    def _on_notification(self, sender, data: bytearray):
+        self._frames += data
+        start = self.instrumentation.clock()
+        measurements, malformed = take_measurements(self._frames, self.strict, self.frame_format)
+        self.instrumentation.record("parse", start)
+        self.malformed += malformed
+        for measurement in measurements:
+            self.dropped += put_dropping_oldest(self._measurements, measurement)
+
+    def _disconnected(self):
+        put_dropping_oldest(self._measurements, None)
+        raise ConnectionError(f"BLE device {self.mac_address} disconnected")
+
+    def measure(self) -> Measurement:
+        if self._measurements is None:
+            raise Exception("Not connected to a BLE device")
+        try:
+            measurement = self._measurements.get(timeout=self.silence_timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No samples from {self.mac_address} for {self.silence_timeout} s") from None
+        if measurement is None:
+            self._disconnected()
+        return measurement
+
+    def measure_batch(self) -> List[Measurement]:
+        """Blocks for one measurement and returns it with everything already queued."""
+        return take_queued(self._measurements, [self.measure()])
+
+    def notify_state(self, state: SpiritState):
+        if self._client is None:
+            raise Exception("Not connected to a BLE device")
+        self._run(self._client.write_gatt_char(
+            self.rx_characteristic_uuid, f"state:{state.value}\n".encode(), response=False))
+
+    def request_rate(self, rate_hz: int):
+        if self._client is None:
+            raise Exception("Not connected to a BLE device")
+        self._run(self._client.write_gatt_char(
+            self.rx_characteristic_uuid, f"rate:{rate_hz}\n".encode(), response=False))
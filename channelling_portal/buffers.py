@@ -0,0 +1,148 @@
+import math
+
+import numpy as np
+
+QUATERNION_COMPONENTS = ("qw", "qx", "qy", "qz")
+
+
+class MeasurementBuffer:
+    """Fixed-size window of timestamps and quaternion components.
+
+    Storage is preallocated at twice the window length and every sample is
+    written twice, at its slot and at its slot plus ``maxlen``. That way the
+    window is always one contiguous slice and ``timestamps`` / ``quaternions``
+    are views, never copies. Views are only valid until the next append.
+
+    The y rotation the scoring path needs is derived once per sample at
+    append time and stored next to the raw components, as are the full Euler
+    angles when ``euler`` is set.
+    """
+
+    def __init__(self, maxlen: int, euler: bool = False):
+        self.maxlen = maxlen
+        self._timestamps = np.zeros(2 * maxlen, dtype=np.int64)
+        self._quaternions = np.zeros((2 * maxlen, len(QUATERNION_COMPONENTS)))
+        self._y_rotations = np.zeros(2 * maxlen)
+        self._euler_angles = np.zeros((2 * maxlen, 3)) if euler else None
+        self._start = 0
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    @property
+    def full(self) -> bool:
+        return self._length == self.maxlen
+
+    def clear(self):
+        self._start = 0
+        self._length = 0
+
+    def drop_before(self, timestamp: int):
+        """Drops the oldest samples up to the first one at or after ``timestamp``."""
+        after = self.timestamps >= timestamp
+        dropped = int(after.argmax()) if after.any() else self._length
+        self._start = (self._start + dropped) % self.maxlen
+        self._length -= dropped
+
+    def _slot(self) -> int:
+        if self._length < self.maxlen:
+            slot = (self._start + self._length) % self.maxlen
+            self._length += 1
+        else:
+            slot = self._start
+            self._start = (self._start + 1) % self.maxlen
+        return slot
+
+    def append_values(self, timestamp: int, qw: float, qx: float, qy: float, qz: float):
+        slot = self._slot()
+        rotation = y_rotation(qw, qx, qy, qz)
+        angles = euler_angle(qw, qx, qy, qz) if self._euler_angles is not None else None
+        for index in (slot, slot + self.maxlen):
+            self._timestamps[index] = timestamp
+            self._quaternions[index] = (qw, qx, qy, qz)
+            self._y_rotations[index] = rotation
+            if angles is not None:
+                self._euler_angles[index] = angles
+
+    def extend(self, timestamps: np.ndarray, quaternions: np.ndarray):
+        """Appends a batch of samples with vectorized copies and derived features."""
+        timestamps, quaternions = timestamps[-self.maxlen:], quaternions[-self.maxlen:]
+        count = len(timestamps)
+        if not count:
+            return
+        # The next free slot, or the oldest one once full, is always start + length
+        slots = (self._start + self._length + np.arange(count)) % self.maxlen
+        overflow = max(self._length + count - self.maxlen, 0)
+        self._start = (self._start + overflow) % self.maxlen
+        self._length = min(self._length + count, self.maxlen)
+        rotations = y_rotations(quaternions)
+        angles = euler_angles(quaternions) if self._euler_angles is not None else None
+        for indices in (slots, slots + self.maxlen):
+            self._timestamps[indices] = timestamps
+            self._quaternions[indices] = quaternions
+            self._y_rotations[indices] = rotations
+            if angles is not None:
+                self._euler_angles[indices] = angles
+
+    def append(self, measurement):
+        quaternion = measurement.quaternion
+        self.append_values(measurement.timestamp, quaternion.qw, quaternion.qx, quaternion.qy, quaternion.qz)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps[self._start:self._start + self._length]
+
+    @property
+    def quaternions(self) -> np.ndarray:
+        return self._quaternions[self._start:self._start + self._length]
+
+    @property
+    def y_rotations(self) -> np.ndarray:
+        return self._y_rotations[self._start:self._start + self._length]
+
+    @property
+    def euler_angles(self) -> np.ndarray:
+        """Roll, pitch and yaw of the window; computed on the spot unless stored."""
+        if self._euler_angles is None:
+            return euler_angles(self.quaternions)
+        return self._euler_angles[self._start:self._start + self._length]
+
+    def rotations(self, axis: str) -> np.ndarray:
+        """Contiguous rotations of the window about the ``x``, ``y`` or ``z`` axis."""
+        if axis == "y":
+            return self.y_rotations
+        return np.ascontiguousarray(self.euler_angles[:, {"x": 0, "z": 2}[axis]])
+
+
+# Rounding can push a unit quaternion's sine slightly past 1, so it is clamped
+def y_rotation(qw: float, qx: float, qy: float, qz: float) -> float:
+    return math.asin(min(1.0, max(-1.0, 2.0 * (qw*qy - qx*qz))))
+
+
+def euler_angle(qw: float, qx: float, qy: float, qz: float) -> tuple:
+    roll = math.atan2(2.0 * (qw*qx + qy*qz), 1.0 - 2.0 * (qx*qx + qy*qy))
+    yaw = math.atan2(2.0 * (qw*qz + qx*qy), 1.0 - 2.0 * (qy*qy + qz*qz))
+    return roll, y_rotation(qw, qx, qy, qz), yaw
+
+
+def axis_rotation(axis: str, qw: float, qx: float, qy: float, qz: float) -> float:
+    """Rotation of one sample about the ``x``, ``y`` or ``z`` axis."""
+    if axis == "y":
+        return y_rotation(qw, qx, qy, qz)
+    return euler_angle(qw, qx, qy, qz)[{"x": 0, "z": 2}[axis]]
+
+
+def y_rotations(quaternions: np.ndarray) -> np.ndarray:
+    qw, qx, qy, qz = quaternions.T
+    return np.arcsin(np.clip(2.0 * (qw*qy - qx*qz), -1.0, 1.0))
+
+
+def euler_angles(quaternions: np.ndarray) -> np.ndarray:
+    qw, qx, qy, qz = quaternions.T
+    roll = np.arctan2(2.0 * (qw*qx + qy*qz), 1.0 - 2.0 * (qx*qx + qy*qy))
+    yaw = np.arctan2(2.0 * (qw*qz + qx*qy), 1.0 - 2.0 * (qy*qy + qz*qz))
+    return np.column_stack((roll, y_rotations(quaternions), yaw))
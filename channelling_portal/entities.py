@@ -1,15 +1,25 @@
 import enum
-import time
+import threading
 from collections import deque
-from typing import Protocol, Optional
+from typing import Deque, List, Protocol, Optional, Sequence, Tuple, Union, runtime_checkable
 import socket
 import numpy as np
 
 import serial
 from bluepy import btle
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from dtaidistance import dtw
 
+from .buffers import MeasurementBuffer, axis_rotation, y_rotation
+from .frames import TIMESTAMP_LIMIT, FrameFormat, parse_sample, parse_samples, take_frames
+from .ingest import BackpressurePolicy, IngestQueue
+from .instrumentation import Instrumentation, NullInstrumentation
+from .notifier import StateNotifier
+from .scoring import (
+    ComputeTier, DerivativeDetector, DTWJob, ScoringEngine, ThresholdCascade, paa, phase_search, resample)
+from .summoning import RotationSummoning, SummoningFunction, rotation_function_ms
+from .supervisor import ConnectionSupervisor
+
 
 class SpiritState(str, enum.Enum):
     inert = "inert"
@@ -26,14 +36,93 @@ class Quaternion(BaseModel):
     qz: float = Field(..., ge=-1, le=1)
 
     def y_rotation(self) -> float:
-        return np.arcsin(2.0 * (self.qw*self.qy - self.qx*self.qz))
+        return y_rotation(self.qw, self.qx, self.qy, self.qz)
 
 
 class Measurement(BaseModel):
-    timestamp: int
+    timestamp: int = Field(..., ge=-TIMESTAMP_LIMIT, lt=TIMESTAMP_LIMIT)
     quaternion: Quaternion
 
+    @classmethod
+    def trusted(cls, timestamp, qw, qx, qy, qz) -> "Measurement":
+        """Builds a measurement from already range-checked values, skipping validation."""
+        return cls.construct(
+            timestamp=int(timestamp),
+            quaternion=Quaternion.construct(qw=qw, qx=qx, qy=qy, qz=qz),
+        )
+
 
+def parse_measurements(lines: Sequence[Union[str, bytes]], strict: bool = False) -> List[Measurement]:
+    if strict:
+        measurements = []
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            data = list(map(float, line.split(',')))
+            measurements.append(Measurement(
+                timestamp=data[0],
+                quaternion=Quaternion(qw=data[1], qx=data[2], qy=data[3], qz=data[4]),
+            ))
+        return measurements
+    if len(lines) == 1:
+        return [Measurement.trusted(*parse_sample(lines[0]))]
+    return [Measurement.trusted(*sample) for sample in parse_samples(lines).tolist()]
+
+
+def take_measurements(
+    buffer: bytearray, strict: bool = False, frame_format: FrameFormat = FrameFormat.text
+) -> Tuple[List[Measurement], int]:
+    """Parses and removes every complete line or frame from a conduit's receive buffer.
+
+    The incomplete tail stays in the buffer for the next read. Lines that fail
+    to parse, such as a partial line at the start of a stream, are skipped;
+    their count is returned next to the measurements. For binary frames that
+    count is the bytes skipped to resynchronize.
+    """
+    if frame_format == FrameFormat.binary:
+        samples, skipped = take_frames(buffer)
+        return [Measurement.trusted(*sample) for sample in samples.tolist()], skipped
+
+    end_idx = buffer.rfind(b'\n')
+    if end_idx == -1:
+        return [], 0
+    lines = [line for line in bytes(buffer[:end_idx]).split(b'\n') if line.strip()]
+    del buffer[:end_idx + 1]
+    try:
+        return parse_measurements(lines, strict), 0
+    except ValueError:
+        measurements, malformed = [], 0
+        for line in lines:
+            try:
+                measurements.extend(parse_measurements([line], strict))
+            except ValueError:
+                malformed += 1
+        return measurements, malformed
+
+
+def take_samples(
+    buffer: bytearray, strict: bool = False, frame_format: FrameFormat = FrameFormat.text
+) -> Tuple[np.ndarray, int]:
+    """``take_measurements`` as an (n, 5) array of ``timestamp, qw, qx, qy, qz`` rows.
+
+    Binary frames go straight from ``take_frames`` into the array, without a
+    ``Measurement`` for each sample.
+    """
+    if frame_format == FrameFormat.binary:
+        return take_frames(buffer)
+    measurements, malformed = take_measurements(buffer, strict, frame_format)
+    return samples_array(measurements), malformed
+
+
+def samples_array(measurements: Sequence[Measurement]) -> np.ndarray:
+    samples = np.empty((len(measurements), 5))
+    for row, measurement in zip(samples, measurements):
+        quaternion = measurement.quaternion
+        row[:] = (measurement.timestamp, quaternion.qw, quaternion.qx, quaternion.qy, quaternion.qz)
+    return samples
+
+
+@runtime_checkable
 class SpiritCommunication(Protocol):
     def measure(self) -> Measurement:
         ...
@@ -51,27 +140,78 @@ class SpiritCommunication(Protocol):
 class SerialSpiritCommunication(BaseModel):
     port: str
     baud_rate: int
-    serial = serial.Serial
+    serial: Optional["serial.Serial"] = None
+    # Validate every sample with pydantic instead of the batched NumPy checks
+    strict: bool = False
+    # Longest a read blocks waiting for the first byte before trying again
+    timeout: float = 0.5
+    frame_format: FrameFormat = FrameFormat.text
+    buffer: bytearray = Field(default_factory=bytearray)
+    pending: Deque[Measurement] = Field(default_factory=deque)
+    malformed: int = 0
+    instrumentation: Instrumentation = Field(default_factory=NullInstrumentation)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _receive(self):
+        # Block until something arrives, then drain whatever else is waiting
+        chunk = self.serial.read(max(1, self.serial.in_waiting))
+        if self.serial.in_waiting:
+            chunk += self.serial.read(self.serial.in_waiting)
+        self.buffer += chunk
+
+    def _read(self):
+        self._receive()
+        start = self.instrumentation.clock()
+        measurements, malformed = take_measurements(self.buffer, self.strict, self.frame_format)
+        self.instrumentation.record("parse", start)
+        self.pending.extend(measurements)
+        self.malformed += malformed
 
     def measure(self) -> Measurement:
-        while not self.serial.in_waiting:
-            time.sleep(0.01)
-        line = self.serial.readline().decode('utf-8').rstrip()
-        data = list(map(float, line.split(',')))
-        return Measurement(
-            timestamp=data[0],
-            quaternion=Quaternion(qw=data[1], qx=data[2], qy=data[3], qz=data[4])
-        )
+        while not self.pending:
+            self._read()
+        return self.pending.popleft()
+
+    def measure_batch(self) -> List[Measurement]:
+        """Returns every measurement received so far, waiting for at least one."""
+        while not self.pending:
+            self._read()
+        batch = list(self.pending)
+        self.pending.clear()
+        return batch
+
+    def measure_samples(self) -> np.ndarray:
+        """``measure_batch`` as an (n, 5) array, decoded without a ``Measurement`` per binary frame."""
+        if self.pending:
+            return samples_array(self.measure_batch())
+        while True:
+            self._receive()
+            start = self.instrumentation.clock()
+            samples, malformed = take_samples(self.buffer, self.strict, self.frame_format)
+            self.instrumentation.record("parse", start)
+            self.malformed += malformed
+            if len(samples):
+                return samples
 
     def connect(self):
         self.serial = serial.Serial(self.port, self.baud_rate)
+        self.serial.timeout = self.timeout
+        self.buffer.clear()
+        self.pending.clear()
+        # Always sent, as the device may still be in the format of an earlier session
+        self.serial.write(f"format:{self.frame_format.value}\n".encode())
 
     def disconnect(self):
         if self.serial and self.serial.is_open:
             self.serial.close()
 
     def notify_state(self, state: SpiritState):
-        self.serial.write(f"state:{state}\n".encode())
+        self.serial.write(f"state:{state.value}\n".encode())
+
+    def request_rate(self, rate_hz: int):
+        self.serial.write(f"rate:{rate_hz}\n".encode())
 
 
 class BLESpiritCommunication(BaseModel):
@@ -80,7 +220,14 @@ class BLESpiritCommunication(BaseModel):
     characteristic_uuid: str
     peripheral: btle.Peripheral = None
     characteristic: btle.Characteristic = None
-    buffer: str = ""
+    buffer: bytearray = Field(default_factory=bytearray)
+    strict: bool = False
+    instrumentation: Instrumentation = Field(default_factory=NullInstrumentation)
+    # bluepy peripherals are not thread safe, and states are written from the notifier's thread
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    class Config:
+        arbitrary_types_allowed = True
 
     def connect(self):
         self.peripheral = btle.Peripheral(self.mac_address)
@@ -95,30 +242,31 @@ class BLESpiritCommunication(BaseModel):
         if not self.characteristic:
             raise Exception("Not connected to a BLE device")
 
-        while True:
-            data_part = self.characteristic.read().decode('utf-8')
-
-            end_idx = data_part.find('\n')
-            if end_idx != -1:
-                self.buffer += data_part[:end_idx]
-                remaining = data_part[end_idx+1:]
-                break
-            else:
-                self.buffer += data_part
-
-        complete_data = self.buffer
-        self.buffer = remaining
-
-        data = list(map(float, complete_data.split(',')))
-        return Measurement(
-            timestamp=data[0],
-            quaternion=Quaternion(qw=data[1], qx=data[2], qy=data[3], qz=data[4]),
-        )
+        end_idx = self.buffer.find(b'\n')
+        while end_idx == -1:
+            searched = len(self.buffer)
+            with self._lock:
+                self.buffer += self.characteristic.read()
+            end_idx = self.buffer.find(b'\n', searched)
+
+        complete_data = self.buffer[:end_idx]
+        del self.buffer[:end_idx + 1]
+        start = self.instrumentation.clock()
+        measurement = parse_measurements([bytes(complete_data)], self.strict)[0]
+        self.instrumentation.record("parse", start)
+        return measurement
 
     def notify_state(self, state: SpiritState):
         if not self.characteristic:
             raise Exception("Not connected to a BLE device")
-        self.characteristic.write(str(state).encode())
+        with self._lock:
+            self.characteristic.write(f"state:{state.value}\n".encode())
+
+    def request_rate(self, rate_hz: int):
+        if not self.characteristic:
+            raise Exception("Not connected to a BLE device")
+        with self._lock:
+            self.characteristic.write(f"rate:{rate_hz}\n".encode())
 
 
 class WifiSpiritCommunication(BaseModel):
@@ -127,9 +275,21 @@ class WifiSpiritCommunication(BaseModel):
     server_socket: Optional[socket.socket] = None
     client_socket: Optional[socket.socket] = None
     address: Optional[tuple] = None
+    strict: bool = False
+    buffer: bytearray = Field(default_factory=bytearray)
+    pending: Deque[Measurement] = Field(default_factory=deque)
+    malformed: int = 0
+    instrumentation: Instrumentation = Field(default_factory=NullInstrumentation)
+
+    class Config:
+        arbitrary_types_allowed = True
 
     def connect(self):
+        self.buffer.clear()
+        self.pending.clear()
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Reconnecting binds the port again while the last connection is in TIME_WAIT
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.bind((self.ip_address, self.port))
         self.server_socket.listen(1)  # Listen for a single connection
         print(f"Listening on {self.ip_address}:{self.port}")
@@ -148,90 +308,401 @@ class WifiSpiritCommunication(BaseModel):
         if not self.client_socket:
             raise Exception("No client connected")
 
-        data = self.client_socket.recv(1024).decode('utf-8').strip()
-        if not data:
-            raise Exception("No data received")
-
-        data = list(map(float, data.split(',')))
-        return Measurement(
-            timestamp=data[0],
-            quaternion=Quaternion(qw=data[1], qx=data[2], qy=data[3], qz=data[4]),
-        )
+        # TCP may coalesce or split records, so frame the stream by newline
+        while not self.pending:
+            data = self.client_socket.recv(4096)
+            if not data:
+                raise Exception("No data received")
+            self.buffer += data
+            start = self.instrumentation.clock()
+            measurements, malformed = take_measurements(self.buffer, self.strict)
+            self.instrumentation.record("parse", start)
+            self.pending.extend(measurements)
+            self.malformed += malformed
+        return self.pending.popleft()
 
     def notify_state(self, state: SpiritState):
         if not self.client_socket:
             raise Exception("No client connected")
-        self.client_socket.send(f"state:{state}\n".encode())
-
-
-def rotation_function_ms(times, rotation_duration=1000, pause_duration=100):
-    # Calculate cycle length in milliseconds directly
-    cycle_length_ms = 2 * rotation_duration + 2 * pause_duration
-
-    # Initialize the result array
-    angles = np.zeros_like(times, dtype=float)
-
-    # Compute the ends of each phase within the cycle
-    left_rotation_end_ms = rotation_duration
-    first_pause_end_ms = left_rotation_end_ms + pause_duration
-    right_rotation_end_ms = first_pause_end_ms + rotation_duration
-
-    # Rates of rotation per millisecond
-    left_rate = np.radians(180) / rotation_duration  # Positive rate for left rotation
-    right_rate = -np.radians(180) / rotation_duration  # Negative rate for right rotation
-
-    for i, t in enumerate(times):
-        # Normalize time to the current cycle in milliseconds
-        cycle_time_ms = t % cycle_length_ms
-
-        if cycle_time_ms <= left_rotation_end_ms:
-            # Left rotation
-            angles[i] = left_rate * cycle_time_ms
-        elif cycle_time_ms <= first_pause_end_ms:
-            # First pause - keep the angle constant at 180 degrees (in radians)
-            angles[i] = np.radians(180)
-        elif cycle_time_ms <= right_rotation_end_ms:
-            # Right rotation
-            angles[i] = np.radians(180) + right_rate * (cycle_time_ms - first_pause_end_ms)
-        else:
-            # Second pause - angle goes back to 0
-            angles[i] = 0
+        self.client_socket.send(f"state:{state.value}\n".encode())
+
+    def request_rate(self, rate_hz: int):
+        if not self.client_socket:
+            raise Exception("No client connected")
+        self.client_socket.send(f"rate:{rate_hz}\n".encode())
 
-    return angles
+
+PHASE_SEARCH_STEPS = 64
+# Weight of the newest sample in the motion energy's moving average
+MOTION_SMOOTHING = 0.1
 
 
 class Spirit(BaseModel):
     name: str
     color: str
     conduit: SpiritCommunication
-    measurements: deque[Measurement]
+    measurements: MeasurementBuffer
     state: SpiritState = SpiritState.inert
     time_zero: int = 0
     gauge: int = 0
+    # The movement that summons the spirit, with its threshold and axis
+    summoning: SummoningFunction = Field(default_factory=RotationSummoning)
+    engine: ScoringEngine = ScoringEngine.dtw
+    # Scoring trade-offs: a Sakoe-Chiba band in (downsampled) samples, device
+    # timestamps interpolated onto a uniform grid of this many ms, and the
+    # PAA factor both series are averaged down by before DTW
+    window: Optional[int] = Field(None, ge=1)
+    resample_period: Optional[float] = Field(None, gt=0)
+    downsample: int = Field(1, ge=1)
+    # Adaptive compute: an inert or dormant spirit whose motion energy, a
+    # moving average of its rotation speed in rad/s, is under idle_energy is
+    # not scored at all, and a moving one only every coarse_stride samples,
+    # further downsampled by coarse_downsample, repeating its last decision
+    # in between. Interested and awakened spirits are always fully scored.
+    adaptive: bool = False
+    idle_energy: float = Field(1.0, ge=0)
+    coarse_stride: int = Field(4, ge=1)
+    coarse_downsample: int = Field(2, ge=1)
+    # On a rejected sample, search every phase of a periodic summoning
+    # function for the origin instead of restarting it at the window start.
+    # While rejections go on the search runs every this many samples and the
+    # origin found last is kept in between, as the holder's cycle goes on.
+    phase_search: bool = True
+    phase_search_interval: int = Field(8, ge=1)
+    # Per-stage latencies and counters; the default records nothing
+    instrumentation: Instrumentation = Field(default_factory=NullInstrumentation)
+    # While dancing, seconds a new state must hold before it is notified
+    notify_debounce: float = Field(0.0, ge=0)
+    # While dancing, the conduit is read into a queue of this many samples
+    # and what happens when scoring falls behind is up to the policy
+    ingest_policy: BackpressurePolicy = BackpressurePolicy.all
+    ingest_queue_size: int = Field(64, ge=1)
+    ingest_stride: int = Field(1, ge=1)
+    # While dancing, read what a conduit with measure_samples decodes at once
+    # as one burst, appended to the window in one copy; see process_samples
+    bursts: bool = False
+    # While dancing, the device is asked with "rate:<hz>" to send idle_rate
+    # samples a second while inert or dormant and full_rate once interested
+    # or awakened; None leaves it at its own rate. With an idle_rate the
+    # window is kept to the time measurement_count samples span at full_rate
+    # and the gauge counts full_rate samples' worth of accepted motion, so
+    # the window and the state thresholds last as long at either rate. The
+    # templates follow the device timestamps, so they fit either rate, and
+    # the window mixing both for a while after a change.
+    idle_rate: Optional[int] = Field(None, ge=1)
+    full_rate: int = Field(100, ge=1)
+    # While dancing with reconnect, a conduit that fails is reconnected in
+    # the background, reconnect_delay seconds after the first failed attempt
+    # and doubling up to reconnect_max_delay, instead of ending the dance.
+    # reconnect_reset starts the window and gauge over on the new connection;
+    # otherwise scoring carries on with them.
+    reconnect: bool = False
+    reconnect_delay: float = Field(0.5, gt=0)
+    reconnect_max_delay: float = Field(30.0, gt=0)
+    reconnect_reset: bool = False
+    _cascade: ThresholdCascade = PrivateAttr(default_factory=ThresholdCascade)
+    _unsearched: int = PrivateAttr(default=0)
+    _detector: DerivativeDetector = PrivateAttr(default_factory=DerivativeDetector)
+    _started: int = PrivateAttr(default=0)
+    _ingest: Optional[IngestQueue] = PrivateAttr(default=None)
+    _supervisor: Optional[ConnectionSupervisor] = PrivateAttr(default=None)
+    _energy: float = PrivateAttr(default=0.0)
+    _motion: Optional[Tuple[int, float]] = PrivateAttr(default=None)
+    _unscored: int = PrivateAttr(default=0)
+    _accepted: bool = PrivateAttr(default=False)
+
+    class Config:
+        arbitrary_types_allowed = True
 
     def __init__(self, name, color, conduit, measurement_count, **kwargs):
-        self.name = name
-        self.color = color
-        self.conduit = conduit
-        self.measurements = deque(maxlen=measurement_count)
-        super().__init__(**kwargs)
+        summoning = kwargs.setdefault("summoning", RotationSummoning())
+        super().__init__(
+            name=name,
+            color=color,
+            conduit=conduit,
+            measurements=MeasurementBuffer(measurement_count, euler=summoning.axis != "y"),
+            **kwargs,
+        )
+
+    def scored_series(self, downsample: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """The summoning template and the measured rotations, as DTW compares them.
+
+        ``downsample`` averages both down by a further PAA factor. A window
+        whose device clock went backwards, as after a reboot, cannot be
+        interpolated and is scored as sampled.
+        """
+        times = (self.measurements.timestamps - self.time_zero).astype(float)
+        values = self.measurements.rotations(self.summoning.axis)
+        if self.resample_period and (np.diff(times) > 0).all():
+            times, values = resample(times, values, self.resample_period)
+            template = self.summoning.grid_template(times[0], len(times), self.resample_period)
+        else:
+            template = self.summoning.template(times)
+        factor = self.downsample * downsample
+        if factor > 1:
+            template, values = paa(template, factor), paa(values, factor)
+        return template, values
 
     def dtw(self) -> float:
-        times = [m.timestamp - self.time_zero for m in self.measurements]
-        y_rotations = [m.quaternion.y_rotation() for m in self.measurements]
-        test_values = rotation_function_ms(times)
-        return dtw.distance_fast(test_values, y_rotations)
+        if not self.measurements:
+            return np.inf
+        start = self.instrumentation.clock()
+        test_values, values = self.scored_series()
+        start = self.instrumentation.record("template", start)
+        # Without pruning: its Euclidean upper bound turns an exactly
+        # diagonal alignment into inf now and then through rounding
+        distance = dtw.distance_fast(test_values, values, window=self.window, use_pruning=False)
+        self.instrumentation.record("dtw", start)
+        return distance
+
+    def _decision(self, downsample: int = 1) -> Union[bool, DTWJob]:
+        """The decision on the window so far if a lower bound makes it, else the DTW that will."""
+        if not self.measurements:
+            return False
+        start = self.instrumentation.clock()
+        test_values, values = self.scored_series(downsample)
+        start = self.instrumentation.record("template", start)
+        threshold = self.summoning.threshold
+        window = self.window and max(self.window // downsample, 1)
+        decision = self._cascade.screen(test_values, values, threshold, window)
+        if decision is None:
+            return DTWJob(test_values, values, window, self._cascade.margin(threshold))
+        self.instrumentation.record("dtw", start)
+        return decision
+
+    def accepts(self) -> bool:
+        """Whether the window so far is within the summoning function's threshold.
+
+        Gives the same answer as ``dtw() < summoning.threshold``, but most
+        mismatching windows are rejected by a lower bound or an early
+        abandoned DTW instead of the exact distance.
+        """
+        decision = self._decision()
+        if not isinstance(decision, DTWJob):
+            return decision
+        start = self.instrumentation.clock()
+        distance = decision.run()
+        self.instrumentation.record("dtw", start)
+        return self._cascade.decide(distance, self.summoning.threshold)
+
+    def search_phase(self) -> int:
+        """The origin that best aligns the window with the summoning cycle.
+
+        The window, on a uniform grid, is aligned by subsequence DTW against
+        one cycle of the template plus the window's span; where the best
+        alignment ends is the phase of the latest sample. The grid is at
+        most ``PHASE_SEARCH_STEPS`` points per cycle, which bounds the cost
+        of a search and still places the phase within a step. Falls back to the
+        window start for a function without a period, or when the device
+        clock went backwards inside the window.
+        """
+        timestamps = self.measurements.timestamps
+        period = self.summoning.period
+        if not period or timestamps[-1] <= timestamps[0]:
+            return int(timestamps[0])
+        start = self.instrumentation.clock()
+        sample_period = (timestamps[-1] - timestamps[0]) / (len(timestamps) - 1)
+        step = max(self.resample_period or sample_period, period / PHASE_SEARCH_STEPS)
+        times, values = resample(
+            (timestamps - timestamps[0]).astype(float), self.measurements.rotations(self.summoning.axis), step)
+        cycle = self.summoning.grid_template(0.0, int(period // step) + len(times), step)
+        end, _ = phase_search(values, cycle)
+        self.instrumentation.record("phase", start)
+        return int(round(timestamps[0] + times[-1] - end * step))
 
     def measure(self):
+        start = self.instrumentation.clock()
         measurement = self.conduit.measure()
-        distance = self.dtw()
+        self.instrumentation.record("read", start)
+        self.process(measurement)
+
+    def _slope_misses(self, measurement: Measurement) -> int:
+        """Feeds the derivative detector; the consecutive samples now out of tolerance."""
+        quaternion = measurement.quaternion
+        summoning = self.summoning
+        time_zero = self.time_zero
+        self._detector.update(
+            measurement.timestamp,
+            axis_rotation(summoning.axis, quaternion.qw, quaternion.qx, quaternion.qy, quaternion.qz),
+            lambda timestamp: summoning.value(timestamp - time_zero),
+            summoning.slope_tolerance,
+        )
+        return self._detector.misses
+
+    def _span(self) -> float:
+        # What the window spans at full_rate, in ms
+        return (self.measurements.maxlen - 1) * 1000 / self.full_rate
+
+    def _append(self, measurement: Measurement):
         self.measurements.append(measurement)
+        if self.idle_rate is not None:
+            self.measurements.drop_before(measurement.timestamp - self._span())
+
+    def _accepted_weight(self) -> int:
+        """What the newest sample adds to the gauge when accepted: 1, or its full_rate samples' worth."""
+        if self.idle_rate is None or len(self.measurements) < 2:
+            return 1
+        timestamps = self.measurements.timestamps
+        samples = round((timestamps[-1] - timestamps[-2]) * self.full_rate / 1000)
+        # A gap in the samples is not motion; at most one idle interval counts
+        return min(max(samples, 1), -(-self.full_rate // self.idle_rate))
+
+    def window_full(self) -> bool:
+        """Whether the window spans all of its length, in samples or with an idle_rate in time."""
+        measurements = self.measurements
+        if measurements.full or self.idle_rate is None or len(measurements) < 2:
+            return measurements.full
+        # Each sample stands for the interval up to the next one
+        timestamps = measurements.timestamps
+        count = len(timestamps)
+        return (timestamps[-1] - timestamps[0]) * count / (count - 1) >= self._span()
+
+    def _process_slope(self, measurement: Measurement):
+        self._append(measurement)
+        misses = self._slope_misses(measurement)
+        if not misses:
+            self.gauge += self._accepted_weight()
+            self.instrumentation.count("accepted")
+        elif misses >= self.summoning.max_misses:
+            # Start over from the origin of the summoning function
+            self.gauge = 0
+            self.time_zero = measurement.timestamp
+            self._detector.reset()
+            self.instrumentation.count("rejected")
+
+    def process(self, measurement: Measurement):
+        job = self.screen(measurement)
+        if job is not None:
+            start = self.instrumentation.clock()
+            distance = job.run()
+            self.instrumentation.record("dtw", start)
+            self.conclude(measurement, distance)
+
+    def process_samples(self, samples: np.ndarray):
+        """Processes a burst of ``timestamp, qw, qx, qy, qz`` rows decoded together.
+
+        With the full-window DTW engine the burst, but for its newest sample,
+        is appended to the window in one vectorized copy and only the newest
+        sample is scored, its decision repeated for the rest as the coarse
+        tier repeats it between the samples it scores. Other engines,
+        adaptive spirits and spirits with an ``idle_rate``, whose gauge
+        weighs each sample, process the burst one sample at a time.
+        """
+        if len(samples) == 1 or self.engine != ScoringEngine.dtw or self.adaptive or self.idle_rate is not None:
+            for sample in samples.tolist():
+                self.process(Measurement.trusted(*sample))
+            return
+        self.measurements.extend(samples[:-1, 0].astype(np.int64), samples[:-1, 1:])
+        self.process(Measurement.trusted(*samples[-1].tolist()))
+        repeated = len(samples) - 1
+        if self._accepted:
+            self.gauge += repeated
+            self.instrumentation.count("accepted", repeated)
+        else:
+            self.instrumentation.count("rejected", repeated)
+        self.instrumentation.count("samples", repeated)
+
+    def screen(self, measurement: Measurement) -> Optional[DTWJob]:
+        """The first half of ``process``, up to the exact DTW.
+
+        Processes ``measurement`` completely and returns ``None`` when the
+        engine or a lower bound decides it. Otherwise returns the
+        DTW that decides it, and ``conclude`` with that DTW's distance
+        finishes the sample. ``BatchScorer`` runs the DTWs of many spirits
+        in between.
+        """
+        instrumentation = self.instrumentation
+        self._started = instrumentation.clock()
+        if self.engine == ScoringEngine.derivative:
+            self._process_slope(measurement)
+            instrumentation.count("samples")
+            instrumentation.record("process", self._started)
+            return None
+
+        tier = self.compute_tier(measurement)
+        if tier == ComputeTier.idle:
+            instrumentation.count("idle")
+            self._settle(measurement, False, search=False)
+            return None
+        if tier == ComputeTier.coarse:
+            if self._unscored:
+                self._unscored -= 1
+                instrumentation.count("unscored")
+                self._settle(measurement, self._accepted, search=False)
+                return None
+            self._unscored = self.coarse_stride - 1
+
+        if self.engine == ScoringEngine.prefiltered and self._slope_misses(measurement) >= self.summoning.max_misses:
+            decision = False
+            instrumentation.count("prefiltered")
+        else:
+            decision = self._decision(self.coarse_downsample if tier == ComputeTier.coarse else 1)
+        if isinstance(decision, DTWJob):
+            return decision
+        self._settle(measurement, decision)
+        return None
+
+    def compute_tier(self, measurement: Measurement) -> ComputeTier:
+        """How much scoring ``measurement`` gets, from the state and the motion energy it updates."""
+        if not self.adaptive:
+            return ComputeTier.full
+        quaternion = measurement.quaternion
+        value = axis_rotation(self.summoning.axis, quaternion.qw, quaternion.qx, quaternion.qy, quaternion.qz)
+        previous, self._motion = self._motion, (measurement.timestamp, value)
+        if previous is not None and measurement.timestamp > previous[0]:
+            speed = abs(value - previous[1]) * 1000 / (measurement.timestamp - previous[0])
+            self._energy += MOTION_SMOOTHING * (speed - self._energy)
+        if self.state in (SpiritState.interested, SpiritState.awakened):
+            return ComputeTier.full
+        if self._energy < self.idle_energy:
+            return ComputeTier.idle
+        return ComputeTier.coarse
+
+    def conclude(self, measurement: Measurement, distance: float):
+        """Finishes a sample ``screen`` returned a DTW for, with its distance."""
+        self._settle(measurement, self._cascade.decide(distance, self.summoning.threshold))
+
+    def _restart_origin(self):
+        if not self.phase_search:
+            self.time_zero = int(self.measurements.timestamps[0])
+        elif self.gauge or not self._unsearched:
+            self.time_zero = self.search_phase()
+            self._unsearched = self.phase_search_interval - 1
+        else:
+            self._unsearched -= 1
+
+    def _settle(self, measurement: Measurement, accepted: bool, search: bool = True):
+        instrumentation = self.instrumentation
+        self._append(measurement)
+        self._accepted = accepted
 
-        if distance < 0.1:
-            self.gauge += 1
+        if accepted:
+            self.gauge += self._accepted_weight()
+            instrumentation.count("accepted")
         else:
+            time_zero = self.time_zero
+            if search:
+                self._restart_origin()
             self.gauge = 0
-            self.time_zero = self.measurements[0].timestamp
+            if self.time_zero != time_zero:
+                self._detector.reset()
+            instrumentation.count("rejected")
+        instrumentation.count("samples")
+        instrumentation.record("process", self._started)
+
+    def reconnected(self):
+        """Called before the first sample from a new connection to the device."""
+        if not self.reconnect_reset:
+            return
+        self.measurements.clear()
+        self.gauge = 0
+        self.time_zero = 0
+        self._unsearched = 0
+        self._detector.reset()
+        self._energy = 0.0
+        self._motion = None
+        self._unscored = 0
+        self._accepted = False
 
     def connect(self):
         self.conduit.connect()
@@ -240,7 +711,7 @@ class Spirit(BaseModel):
         self.conduit.disconnect()
 
     def determine_state(self) -> SpiritState:
-        if len(self.measurements) < self.measurements.maxlen:
+        if not self.window_full():
             return SpiritState.inert
         if self.gauge < 10:
             return SpiritState.dormant
@@ -249,18 +720,82 @@ class Spirit(BaseModel):
         if self.gauge >= 40:
             return SpiritState.awakened
 
+    def update_state(self) -> bool:
+        state = self.determine_state()
+        if state == self.state:
+            return False
+        self.state = state
+        self.instrumentation.count("transitions")
+        self.instrumentation.count(f"state:{state.value}")
+        return True
+
     def notify_state(self):
+        start = self.instrumentation.clock()
         self.conduit.notify_state(self.state)
+        self.instrumentation.record("notify", start)
+
+    def output_rate(self, state: SpiritState) -> Optional[int]:
+        """The rate (Hz) to ask the device for in ``state``."""
+        if self.idle_rate is None:
+            return None
+        if state in (SpiritState.inert, SpiritState.dormant):
+            return self.idle_rate
+        return self.full_rate
+
+    @property
+    def ingest(self) -> Optional[IngestQueue]:
+        """The queue the dance reads into, for its depth and drop counts."""
+        return self._ingest
+
+    @property
+    def supervisor(self) -> Optional[ConnectionSupervisor]:
+        """What keeps the conduit connected while dancing with reconnect, for its reconnects and downtime."""
+        return self._supervisor
 
     def dance(self):
-        self.connect()
+        # The conduit is read on the ingest thread and state changes are
+        # written from the notifier's, so neither waits for scoring and a
+        # slow write never delays the next sample
+        self._ingest = IngestQueue(self.ingest_queue_size, self.ingest_policy, self.ingest_stride,
+                                   self.instrumentation)
+        notifier = StateNotifier(self.conduit, self.notify_debounce, self.instrumentation, self.output_rate)
+        bursts = self.bursts and hasattr(self.conduit, "measure_samples")
+        if self.reconnect:
+            # Connecting, and reconnecting after a dropout, happen on the ingest thread
+            self._supervisor = ConnectionSupervisor(self.conduit, self.reconnect_delay, self.reconnect_max_delay,
+                                                    self.instrumentation, self._ingest.restart)
+            measure = self._supervisor.measure_samples if bursts else self._supervisor.measure
+        else:
+            self._supervisor = None
+            self.connect()
+            measure = self.conduit.measure_samples if bursts else self.conduit.measure
+        self._ingest.start(measure)
+        notifier.start()
+        connection = 0
         try:
             while True:
-                self.measure()
-                state = self.determine_state()
-                if state != self.state:
-                    self.state = state
-                    self.notify_state()
+                measurement = self._ingest.get()
+                if self._ingest.connection != connection:
+                    connection = self._ingest.connection
+                    self.reconnected()
+                    self.update_state()
+                    notifier.reconnected(self.state)
+                if bursts:
+                    self.process_samples(measurement)
+                else:
+                    self.process(measurement)
+                if self.update_state():
+                    notifier.submit(self.state)
         finally:
-            self.disconnect()
+            try:
+                notifier.stop()
+            finally:
+                try:
+                    if self._supervisor is not None:
+                        self._supervisor.disconnect()
+                    else:
+                        self.disconnect()
+                finally:
+                    self._ingest.stop(timeout=1.0)
+                    self.instrumentation.dump()
 
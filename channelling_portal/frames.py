@@ -0,0 +1,152 @@
+import enum
+from typing import Iterable, Tuple, Union
+
+import numpy as np
+
+FIELDS_PER_SAMPLE = 5  # timestamp, qw, qx, qy, qz
+# Timestamps go into int64 buffers, so they must be finite and fit one
+TIMESTAMP_LIMIT = 2.0 ** 63
+
+
+def parse_sample(line: Union[str, bytes]) -> list:
+    """Single-line counterpart of ``parse_samples``, without NumPy call overhead."""
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+    sample = list(map(float, line.split(',')))
+    if len(sample) != FIELDS_PER_SAMPLE:
+        raise ValueError(f"Expected {FIELDS_PER_SAMPLE} fields per sample, got {len(sample)}")
+    if not all(-1 <= component <= 1 for component in sample[1:]):
+        raise ValueError("Quaternion component out of range [-1, 1]")
+    if not -TIMESTAMP_LIMIT <= sample[0] < TIMESTAMP_LIMIT:
+        raise ValueError("Timestamp is not a finite int64")
+    return sample
+
+
+def parse_samples(lines: Iterable[Union[str, bytes]]) -> np.ndarray:
+    """Parses ``timestamp,qw,qx,qy,qz`` lines into an (n, 5) float array.
+
+    The whole batch is split and converted in one NumPy call and the
+    quaternion components and timestamps are range-checked together, so a
+    malformed or out of range sample raises ``ValueError`` for the batch. Every line's field
+    count is checked first, as a short line next to a long one would
+    otherwise shift every field after them.
+    """
+    lines = [line.decode('utf-8') if isinstance(line, bytes) else line for line in lines]
+    lines = [line.strip() for line in lines if line.strip()]
+    if not lines:
+        return np.empty((0, FIELDS_PER_SAMPLE))
+    if any(line.count(",") != FIELDS_PER_SAMPLE - 1 for line in lines):
+        raise ValueError(f"Expected {FIELDS_PER_SAMPLE} fields per sample")
+
+    values = np.array(",".join(lines).split(","), dtype=float)
+    samples = values.reshape(-1, FIELDS_PER_SAMPLE)
+
+    components = samples[:, 1:]
+    if not np.all((components >= -1) & (components <= 1)):
+        raise ValueError("Quaternion component out of range [-1, 1]")
+    timestamps = samples[:, 0]
+    if not np.all((timestamps >= -TIMESTAMP_LIMIT) & (timestamps < TIMESTAMP_LIMIT)):
+        raise ValueError("Timestamp is not a finite int64")
+    return samples
+
+
+class FrameFormat(str, enum.Enum):
+    text = "text"
+    binary = "binary"
+
+
+# Binary frame, little endian, 15 bytes against ~45 for the text line:
+#   sync (0xA5 0x5A) | timestamp ms (uint32) | qw qx qy qz (int16, q * 32767) | CRC-8
+SYNC = b"\xa5\x5a"
+QUATERNION_SCALE = 32767
+FRAME_DTYPE = np.dtype([
+    ("sync", "<u2"),
+    ("timestamp", "<u4"),
+    ("quaternion", "<i2", (4,)),
+    ("crc", "u1"),
+])
+FRAME_SIZE = FRAME_DTYPE.itemsize
+
+
+def _crc8_table(polynomial=0x07) -> np.ndarray:
+    table = np.zeros(256, dtype=np.uint8)
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ polynomial) if crc & 0x80 else (crc << 1)
+        table[byte] = crc & 0xFF
+    return table
+
+
+CRC8_TABLE = _crc8_table()
+
+
+def frame_crc(payload: np.ndarray) -> np.ndarray:
+    """CRC-8 (polynomial 0x07) of each row of an (n, k) uint8 array, one column at a time."""
+    crc = np.zeros(len(payload), dtype=np.uint8)
+    for column in payload.T:
+        crc = CRC8_TABLE[crc ^ column]
+    return crc
+
+
+def encode_frames(samples: np.ndarray) -> bytes:
+    samples = np.asarray(samples, dtype=float).reshape(-1, FIELDS_PER_SAMPLE)
+    frames = np.zeros(len(samples), dtype=FRAME_DTYPE)
+    frames["sync"] = np.frombuffer(SYNC, dtype="<u2")[0]
+    frames["timestamp"] = samples[:, 0]
+    frames["quaternion"] = np.round(samples[:, 1:] * QUATERNION_SCALE)
+    raw = frames.view(np.uint8).reshape(-1, FRAME_SIZE)
+    frames["crc"] = frame_crc(raw[:, 2:-1])
+    return frames.tobytes()
+
+
+def _decode(frames: np.ndarray) -> np.ndarray:
+    samples = np.empty((len(frames), FIELDS_PER_SAMPLE))
+    samples[:, 0] = frames["timestamp"]
+    # A frame can only carry -32768 through corruption that the CRC missed
+    samples[:, 1:] = np.clip(frames["quaternion"] / QUATERNION_SCALE, -1.0, 1.0)
+    return samples
+
+
+def take_frames(buffer: bytearray) -> Tuple[np.ndarray, int]:
+    """Decodes and removes every complete binary frame from a receive buffer.
+
+    Aligned frames are read in place with ``np.frombuffer`` and their sync
+    words and CRCs are checked as whole columns. On a bad frame the decoder
+    slides one byte and looks for the next sync word. Returns the (n, 5)
+    samples and the number of bytes skipped while resynchronizing.
+    """
+    decoded, skipped = [], 0
+    while True:
+        start = buffer.find(SYNC)
+        if start == -1:
+            # Keep a trailing first sync byte, its partner may be in the next read
+            keep = 1 if buffer[-1:] == SYNC[:1] else 0
+            skipped += len(buffer) - keep
+            del buffer[:len(buffer) - keep]
+            break
+        skipped += start
+        del buffer[:start]
+
+        count = len(buffer) // FRAME_SIZE
+        if not count:
+            break
+        frames = np.frombuffer(buffer, dtype=FRAME_DTYPE, count=count)
+        raw = frames.view(np.uint8).reshape(count, FRAME_SIZE)
+        valid = (raw[:, 0] == SYNC[0]) & (raw[:, 1] == SYNC[1]) & (frame_crc(raw[:, 2:-1]) == frames["crc"])
+        good = count if valid.all() else int(np.argmin(valid))
+        if good:
+            decoded.append(_decode(frames[:good]))
+        # The views must be gone before the bytearray can be resized
+        del frames, raw
+        consumed = good * FRAME_SIZE
+        if good < count:
+            consumed += 1
+            skipped += 1
+        del buffer[:consumed]
+        if good == count:
+            break
+
+    if not decoded:
+        return np.empty((0, FIELDS_PER_SAMPLE)), skipped
+    return np.concatenate(decoded), skipped
@@ -0,0 +1,202 @@
+import asyncio
+import enum
+import threading
+from collections import deque
+from typing import TYPE_CHECKING, Awaitable, Callable, Deque, Optional, Tuple
+
+from .instrumentation import Instrumentation, NullInstrumentation
+
+if TYPE_CHECKING:
+    from .entities import Measurement
+
+
+class BackpressurePolicy(str, enum.Enum):
+    # Every sample is scored; a full queue holds the reader back
+    all = "all"
+    # A full queue drops its oldest sample, so only the newest are scored
+    newest = "newest"
+    # Only every ``stride``-th sample is queued, the newest of them as above
+    stride = "stride"
+
+
+class IngestQueue:
+    """Reads a conduit on its own thread into a bounded queue for scoring.
+
+    Reading no longer waits for scoring, so the conduit is drained as fast
+    as the device sends and the ``policy`` decides what happens when
+    scoring falls behind: ``all`` keeps every sample and lets the queue
+    fill up to ``size``, ``newest`` and ``stride`` drop the oldest queued
+    sample instead, which bounds how far behind the device scoring can get
+    to ``size`` samples. ``depth`` is the queue's current length;
+    ``received``, ``dropped`` and ``skipped`` count what the reader got,
+    what was dropped from a full queue and what ``stride`` left out.
+
+    The time each sample waited is recorded under the ``queue`` stage, and
+    drops and skips count as ``ingest_dropped`` and ``ingest_skipped``. An
+    error the reader hits is raised by ``get`` after the samples read before
+    it.
+
+    ``restart`` marks the samples read after it as coming from a new
+    connection to the device; ``connection`` is the number of restarts
+    before the sample ``get`` returned last.
+    """
+
+    def __init__(self, size: int = 64, policy: BackpressurePolicy = BackpressurePolicy.all, stride: int = 1,
+                 instrumentation: Optional[Instrumentation] = None):
+        if size < 1 or stride < 1:
+            raise ValueError("size and stride must be at least 1")
+        self.size = size
+        self.policy = BackpressurePolicy(policy)
+        self.stride = stride if self.policy == BackpressurePolicy.stride else 1
+        self.instrumentation = instrumentation or NullInstrumentation()
+        self.received = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.connection = 0
+        self._connections = 0
+        self._items: Deque[Tuple[int, int, "Measurement"]] = deque()
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._items)
+
+    def _skip(self) -> bool:
+        self.received += 1
+        if (self.received - 1) % self.stride:
+            self.skipped += 1
+            self.instrumentation.count("ingest_skipped")
+            return True
+        return False
+
+    def _full(self) -> bool:
+        return self.policy == BackpressurePolicy.all and len(self._items) >= self.size and not self._closed
+
+    def _push(self, measurement: "Measurement"):
+        if len(self._items) >= self.size:
+            self._items.popleft()
+            self.dropped += 1
+            self.instrumentation.count("ingest_dropped")
+        self._items.append((self.instrumentation.clock(), self._connections, measurement))
+
+    def _pop(self) -> "Measurement":
+        if self._items:
+            queued, self.connection, measurement = self._items.popleft()
+            self.instrumentation.record("queue", queued)
+            return measurement
+        if self._error is not None:
+            raise self._error
+        raise EOFError("Ingest stopped")
+
+    def restart(self):
+        self._connections += 1
+
+    def put(self, measurement: "Measurement"):
+        with self._condition:
+            if self._skip():
+                return
+            while self._full():
+                self._condition.wait()
+            self._push(measurement)
+            self._condition.notify_all()
+
+    def get(self) -> "Measurement":
+        """The oldest queued sample, waiting for one."""
+        with self._condition:
+            while not self._items and self._error is None and not self._closed:
+                self._condition.wait()
+            measurement = self._pop()
+            self._condition.notify_all()
+        return measurement
+
+    def _fail(self, error: BaseException):
+        with self._condition:
+            self._error = error
+            self._condition.notify_all()
+
+    def start(self, measure: Callable[[], "Measurement"]):
+        """Starts reading ``measure`` into the queue until stopped or it raises."""
+        self._thread = threading.Thread(target=self._read, args=(measure,), name="ingest", daemon=True)
+        self._thread.start()
+
+    def _read(self, measure: Callable[[], "Measurement"]):
+        try:
+            while not self._closed:
+                start = self.instrumentation.clock()
+                measurement = measure()
+                self.instrumentation.record("read", start)
+                self.put(measurement)
+        except BaseException as error:
+            self._fail(error)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stops reading; a reader blocked on the device returns once the conduit is disconnected."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+class AsyncIngestQueue(IngestQueue):
+    """``IngestQueue`` for the Portal, reading from a task on its event loop.
+
+    ``measure`` is a coroutine function, as the Portal's conduits have.
+    """
+
+    def __init__(self, size: int = 64, policy: BackpressurePolicy = BackpressurePolicy.all, stride: int = 1,
+                 instrumentation: Optional[Instrumentation] = None):
+        super().__init__(size, policy, stride, instrumentation)
+        self._changed: Optional[asyncio.Condition] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def put(self, measurement: "Measurement"):
+        async with self._changed:
+            if self._skip():
+                return
+            await self._changed.wait_for(lambda: not self._full())
+            self._push(measurement)
+            self._changed.notify_all()
+
+    async def get(self) -> "Measurement":
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._items or self._error is not None or self._closed)
+            measurement = self._pop()
+            self._changed.notify_all()
+        return measurement
+
+    async def _fail(self, error: BaseException):
+        async with self._changed:
+            self._error = error
+            self._changed.notify_all()
+
+    def start(self, measure: Callable[[], Awaitable["Measurement"]]):
+        self._changed = asyncio.Condition()
+        self._task = asyncio.get_running_loop().create_task(self._read(measure))
+
+    async def _read(self, measure: Callable[[], Awaitable["Measurement"]]):
+        try:
+            while not self._closed:
+                start = self.instrumentation.clock()
+                measurement = await measure()
+                self.instrumentation.record("read", start)
+                await self.put(measurement)
+        except Exception as error:
+            await self._fail(error)
+
+    async def stop(self, timeout: Optional[float] = None):
+        self._closed = True
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await asyncio.wait_for(task, timeout)
+            except asyncio.CancelledError:
+                pass
+        if self._changed is not None:
+            async with self._changed:
+                self._changed.notify_all()
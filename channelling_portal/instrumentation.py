@@ -0,0 +1,149 @@
+import json
+import time
+from typing import Dict, List, Optional, TextIO, Union
+
+# Histogram buckets are 4 per power of two, so a percentile is reported
+# within 25% of the true latency from a fixed, allocation-free list
+_SUB_BUCKETS = 4
+_BUCKETS = 256
+
+
+def _bucket(elapsed_ns: int) -> int:
+    if elapsed_ns < 2 * _SUB_BUCKETS:
+        return max(elapsed_ns, 0)
+    exponent = elapsed_ns.bit_length() - 3
+    return min((exponent << 2) + (elapsed_ns >> exponent), _BUCKETS - 1)
+
+
+def _bucket_upper_ns(index: int) -> int:
+    if index < 2 * _SUB_BUCKETS:
+        return index + 1
+    exponent = (index >> 2) - 1
+    return ((index & 3) + _SUB_BUCKETS + 1) << exponent
+
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram with O(1) recording."""
+
+    def __init__(self):
+        self.buckets: List[int] = [0] * _BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, elapsed_ns: int):
+        self.buckets[_bucket(elapsed_ns)] += 1
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+    def percentile(self, percent: float) -> int:
+        """Upper bound, in ns, of the bucket holding the given percentile."""
+        if not self.count:
+            return 0
+        rank = percent / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(_bucket_upper_ns(index), self.max_ns)
+        return self.max_ns
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_us": self.total_ns / self.count / 1000 if self.count else 0.0,
+            "p50_us": self.percentile(50) / 1000,
+            "p90_us": self.percentile(90) / 1000,
+            "p99_us": self.percentile(99) / 1000,
+            "max_us": self.max_ns / 1000,
+        }
+
+
+class Instrumentation:
+    """Per-stage latency histograms and event counters for a spirit.
+
+    Stages are timed by taking ``clock()`` before and passing it to
+    ``record``, which returns the current clock so consecutive stages can be
+    chained without reading the clock twice::
+
+        start = instrumentation.clock()
+        template = spirit.summoning.template(times)
+        start = instrumentation.record("template", start)
+        distance = dtw.distance_fast(template, values)
+        instrumentation.record("dtw", start)
+
+    ``snapshot`` can be called at any time, also from another thread; the
+    figures are not taken atomically, so a concurrent snapshot may be a
+    sample behind in some of them. ``dump`` writes the snapshot as JSON, to
+    ``path`` when no file is given.
+    """
+
+    enabled = True
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.stages: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.started_ns = time.perf_counter_ns()
+
+    clock = staticmethod(time.perf_counter_ns)
+
+    def record(self, stage: str, start_ns: int) -> int:
+        now = time.perf_counter_ns()
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = LatencyHistogram()
+        histogram.record(now - start_ns)
+        return now
+
+    def count(self, counter: str, increment: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + increment
+
+    def reset(self):
+        self.stages.clear()
+        self.counters.clear()
+        self.started_ns = time.perf_counter_ns()
+
+    def snapshot(self) -> dict:
+        elapsed = (time.perf_counter_ns() - self.started_ns) / 1e9
+        counters = dict(self.counters)
+        return {
+            "elapsed_s": elapsed,
+            "counters": counters,
+            "rates_per_s": {name: value / elapsed for name, value in counters.items()} if elapsed else {},
+            "stages": {name: histogram.summary() for name, histogram in list(self.stages.items())},
+        }
+
+    def dump(self, file: Union[str, TextIO, None] = None):
+        file = file or self.path
+        if file is None:
+            return
+        if isinstance(file, str):
+            with open(file, "w") as output:
+                json.dump(self.snapshot(), output, indent=2)
+        else:
+            json.dump(self.snapshot(), file, indent=2)
+
+
+class NullInstrumentation(Instrumentation):
+    """Instrumentation that records nothing, at the cost of a method call."""
+
+    enabled = False
+
+    def __init__(self):
+        super().__init__()
+
+    @staticmethod
+    def clock() -> int:
+        return 0
+
+    def record(self, stage: str, start_ns: int) -> int:
+        return 0
+
+    def count(self, counter: str, increment: int = 1):
+        pass
+
+    def dump(self, file: Union[str, TextIO, None] = None):
+        pass
@@ -0,0 +1,501 @@
+import abc
+import heapq
+import queue
+import selectors
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, PrivateAttr
+
+from .entities import Measurement, SpiritState, take_measurements
+from .instrumentation import Instrumentation, NullInstrumentation
+from .osc import decode_packet, encode_message
+from .queues import put_dropping_oldest, take_queued
+
+HELLO_PREFIX = b"spirit:"
+
+
+class _Connection:
+    def __init__(self, sock: socket.socket, address: tuple):
+        self.socket = sock
+        self.address = address
+        self.buffer = bytearray()
+        self.outgoing = bytearray()
+        self.device_id: Optional[str] = None
+
+
+class DeviceServer(abc.ABC):
+    """A selector thread serving many spirit devices on one port.
+
+    The server runs while any of its conduits is connected: ``start`` and
+    ``stop`` count the users, the first one opens the sockets and the last
+    one closes them and ends every conduit's read.
+    """
+
+    thread_name = "server"
+
+    def __init__(self, ip_address: str, port: int, queue_size: int = 1024,
+                 instrumentation: Optional[Instrumentation] = None):
+        self.ip_address = ip_address
+        self.port = port
+        self.queue_size = queue_size
+        self.instrumentation = instrumentation or NullInstrumentation()
+        self.malformed = 0
+        self.errors = 0
+        self._conduits: Dict[str, "DeviceSpiritCommunication"] = {}
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = threading.Event()
+        self._users = 0
+        self._lock = threading.Lock()
+
+    def conduit(self, device_id: str) -> "DeviceSpiritCommunication":
+        if device_id not in self._conduits:
+            self._conduits[device_id] = DeviceSpiritCommunication(server=self, device_id=device_id)
+        return self._conduits[device_id]
+
+    @abc.abstractmethod
+    def connected(self, device_id: str) -> bool:
+        """Whether the server knows where to send the device's state and rate."""
+
+    def start(self):
+        with self._lock:
+            self._users += 1
+            if self._running.is_set():
+                return
+            self._selector = selectors.DefaultSelector()
+            self._open()
+            self._running.set()
+            self._thread = threading.Thread(target=self._serve, name=f"{self.thread_name}-{self.port}", daemon=True)
+            self._thread.start()
+
+    def stop(self, force: bool = False):
+        """Releases one user of the server and shuts it down after the last one."""
+        with self._lock:
+            self._users = 0 if force else max(self._users - 1, 0)
+            if self._users or not self._running.is_set():
+                return
+            self._running.clear()
+        self._thread.join()
+        self._shut()
+        self._selector.close()
+        for conduit in self._conduits.values():
+            conduit.deliver_disconnect()
+
+    @abc.abstractmethod
+    def _open(self):
+        """Opens the sockets and registers them with the selector."""
+
+    @abc.abstractmethod
+    def _shut(self):
+        """Closes the sockets once the selector thread has ended."""
+
+    @abc.abstractmethod
+    def _serve(self):
+        """The selector thread, until ``stop`` clears ``_running``."""
+
+    @abc.abstractmethod
+    def notify_state(self, device_id: str, state: SpiritState):
+        """Sends the spirit's state to the device."""
+
+    @abc.abstractmethod
+    def request_rate(self, device_id: str, rate_hz: int):
+        """Asks the device to output samples at ``rate_hz``."""
+
+
+class WifiSpiritServer(DeviceServer):
+    """Serves any number of spirit devices over TCP on a single port.
+
+    One selector thread accepts connections and reads whatever each socket
+    has ready. Every connection is framed by newline on its own, so records
+    split or coalesced by TCP are reassembled. A device may start by
+    sending ``spirit:<device id>``; its later lines go to the conduit
+    returned by ``conduit(device_id)``. A device that starts with a sample
+    instead, as the firmware does, is known by its IP address.
+
+    State and rate writes are queued for their connection and sent by the
+    selector thread, which owns every socket, so a write never blocks the
+    caller or races a connection closing. A connection whose data the
+    thread fails to handle is closed and counted in ``errors``, so it never
+    takes the other devices on the port down with it.
+    """
+
+    thread_name = "wifi"
+
+    def __init__(self, ip_address: str, port: int, queue_size: int = 1024, strict: bool = False,
+                 instrumentation: Optional[Instrumentation] = None):
+        super().__init__(ip_address, port, queue_size, instrumentation)
+        self.strict = strict
+        self._connections: Dict[str, _Connection] = {}
+        self._server_socket: Optional[socket.socket] = None
+        self._wakeup: Optional[socket.socket] = None
+        self._waker: Optional[socket.socket] = None
+        self._outgoing_lock = threading.Lock()
+
+    @property
+    def address(self) -> tuple:
+        return self._server_socket.getsockname()
+
+    def connected(self, device_id: str) -> bool:
+        return device_id in self._connections
+
+    def _open(self):
+        self._server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server_socket.bind((self.ip_address, self.port))
+        self._server_socket.listen()
+        self._server_socket.setblocking(False)
+        self._wakeup, self._waker = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self._waker.setblocking(False)
+        self._selector.register(self._server_socket, selectors.EVENT_READ)
+        self._selector.register(self._wakeup, selectors.EVENT_READ)
+
+    def _shut(self):
+        for key in list(self._selector.get_map().values()):
+            key.fileobj.close()
+        self._waker.close()
+        self._connections.clear()
+
+    def _serve(self):
+        while self._running.is_set():
+            for key, events in self._selector.select(timeout=0.1):
+                if key.fileobj is self._server_socket:
+                    self._accept()
+                elif key.fileobj is self._wakeup:
+                    self._drain_wakeups()
+                elif events & selectors.EVENT_READ:
+                    try:
+                        self._read(key.data)
+                    except Exception:
+                        self.errors += 1
+                        self.instrumentation.count("server_errors")
+                        self._close(key.data)
+            self._flush()
+
+    def _accept(self):
+        sock, address = self._server_socket.accept()
+        sock.setblocking(False)
+        self._selector.register(sock, selectors.EVENT_READ, _Connection(sock, address))
+
+    def _close(self, connection: _Connection):
+        if connection.socket.fileno() == -1:
+            return
+        self._selector.unregister(connection.socket)
+        connection.socket.close()
+        if self._connections.get(connection.device_id) is connection:
+            del self._connections[connection.device_id]
+            conduit = self._conduits.get(connection.device_id)
+            if conduit is not None:
+                conduit.deliver_disconnect()
+        with self._outgoing_lock:
+            connection.outgoing.clear()
+
+    def _drain_wakeups(self):
+        try:
+            while self._wakeup.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _flush(self):
+        """Sends what is queued for each connection, as much as its socket takes."""
+        for connection in list(self._connections.values()):
+            with self._outgoing_lock:
+                if not connection.outgoing:
+                    continue
+                try:
+                    sent = connection.socket.send(connection.outgoing)
+                except BlockingIOError:
+                    sent = 0
+                except OSError:
+                    sent = None
+                else:
+                    del connection.outgoing[:sent]
+                pending = bool(connection.outgoing)
+            if sent is None:
+                self._close(connection)
+                continue
+            # Wait for the socket to take the rest
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if pending else 0)
+            self._selector.modify(connection.socket, events, connection)
+
+    def _read(self, connection: _Connection):
+        try:
+            data = connection.socket.recv(4096)
+        except ConnectionError:
+            data = b""
+        if not data:
+            self._close(connection)
+            return
+        connection.buffer += data
+
+        if connection.device_id is None:
+            end_idx = connection.buffer.find(b'\n')
+            if end_idx == -1:
+                return
+            hello = bytes(connection.buffer[:end_idx]).strip()
+            if hello.startswith(HELLO_PREFIX):
+                del connection.buffer[:end_idx + 1]
+                connection.device_id = hello[len(HELLO_PREFIX):].decode('utf-8', 'replace')
+            else:
+                connection.device_id = connection.address[0]
+            self._connections[connection.device_id] = connection
+
+        start = self.instrumentation.clock()
+        measurements, malformed = take_measurements(connection.buffer, self.strict)
+        self.instrumentation.record("parse", start)
+        self.malformed += malformed
+        conduit = self._conduits.get(connection.device_id)
+        if conduit is not None:
+            conduit.deliver(measurements)
+
+    def _send(self, device_id: str, data: bytes):
+        connection = self._connections.get(device_id)
+        if connection is None:
+            raise Exception("No client connected")
+        with self._outgoing_lock:
+            connection.outgoing += data
+        try:
+            self._waker.send(b"\0")
+        except BlockingIOError:
+            # Already woken up more than enough
+            pass
+
+    def notify_state(self, device_id: str, state: SpiritState):
+        self._send(device_id, f"state:{state.value}\n".encode())
+
+    def request_rate(self, device_id: str, rate_hz: int):
+        self._send(device_id, f"rate:{rate_hz}\n".encode())
+
+
+class DeviceSpiritCommunication(BaseModel):
+    """One device's share of a multi-device server, as a ``SpiritCommunication``.
+
+    ``connect`` and ``disconnect`` start and release the shared server, so
+    every spirit of a group can be danced independently. ``measure`` raises
+    ``ConnectionError`` once the device's TCP connection closes, the
+    conduit is disconnected or the server stops, and ``TimeoutError`` after
+    ``silence_timeout`` seconds without a sample, the only sign a UDP
+    device is gone.
+    """
+
+    server: DeviceServer
+    device_id: str
+    silence_timeout: Optional[float] = None
+    dropped: int = 0
+    _measurements: queue.Queue = PrivateAttr()
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self._measurements = queue.Queue(maxsize=self.server.queue_size)
+
+    def deliver(self, measurements: List[Measurement]):
+        for measurement in measurements:
+            self.dropped += put_dropping_oldest(self._measurements, measurement)
+
+    def deliver_disconnect(self):
+        """Ends the read after what the device sent before its connection closed."""
+        self.dropped += put_dropping_oldest(self._measurements, None)
+
+    def connect(self):
+        self.server.start()
+        # What ended an earlier connection must not end this one
+        with self._measurements.mutex:
+            pending = [measurement for measurement in self._measurements.queue if measurement is not None]
+            self._measurements.queue.clear()
+            self._measurements.queue.extend(pending)
+
+    def disconnect(self):
+        try:
+            self.server.stop()
+        finally:
+            # Wakes a measure still waiting for the device
+            self.deliver_disconnect()
+
+    def measure(self) -> Measurement:
+        try:
+            measurement = self._measurements.get(timeout=self.silence_timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No samples from {self.device_id} for {self.silence_timeout} s") from None
+        if measurement is None:
+            raise ConnectionError(f"Device {self.device_id} disconnected")
+        return measurement
+
+    def measure_batch(self) -> List[Measurement]:
+        """Blocks for one measurement and returns it with everything already queued."""
+        return take_queued(self._measurements, [self.measure()])
+
+    def notify_state(self, state: SpiritState):
+        self.server.notify_state(self.device_id, state)
+
+    def request_rate(self, rate_hz: int):
+        self.server.request_rate(self.device_id, rate_hz)
+
+
+class UDPSpiritServer(DeviceServer):
+    """Receives OSC datagrams from many spirit devices on one UDP socket.
+
+    Devices send ``/spirit/<device id>/quaternion`` messages with a timestamp
+    (int32 or int64) and the four components (float32 or float64). Bundles
+    carry several samples in one datagram. Each wakeup drains every datagram
+    waiting in the socket before routing. There are no connections, so a
+    silent device costs nothing and a lost datagram is just a missing sample.
+
+    Datagrams may arrive out of order. Samples are held for
+    ``reorder_window`` ms of device time and released in timestamp order;
+    a device silent for ``reorder_window`` ms of wall-clock time has all of
+    its held samples released.
+    Anything older than what was already released counts as ``late`` and is
+    dropped, unless it is more than ``restart_gap`` ms older: then the device
+    restarted its clock, as after a reboot, so what is still held from
+    before is released and its samples are taken from the new clock on;
+    ``restarts`` counts those. Messages with the wrong address, argument
+    count or types count as ``malformed``, and datagrams that fail to route
+    for any other reason as ``errors``; neither stops the rest of the batch.
+    State notifications go back as ``/spirit/<device id>/state`` to the
+    address the device last sent from, and output rate requests as
+    ``/spirit/<device id>/rate`` with an int32 in Hz.
+    """
+
+    thread_name = "udp"
+
+    def __init__(self, ip_address: str, port: int, queue_size: int = 1024, reorder_window: int = 20,
+                 restart_gap: int = 1000, instrumentation: Optional[Instrumentation] = None):
+        super().__init__(ip_address, port, queue_size, instrumentation)
+        self.reorder_window = reorder_window
+        self.restart_gap = restart_gap
+        self.late = 0
+        self.restarts = 0
+        self._addresses: Dict[str, tuple] = {}
+        self._pending: Dict[str, List[Tuple[int, int, Measurement]]] = {}
+        self._heard: Dict[str, float] = {}
+        self._released: Dict[str, int] = {}
+        self._received = 0
+        self._socket: Optional[socket.socket] = None
+
+    @property
+    def address(self) -> tuple:
+        return self._socket.getsockname()
+
+    def connected(self, device_id: str) -> bool:
+        return device_id in self._addresses
+
+    def _open(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.ip_address, self.port))
+        self._socket.setblocking(False)
+        self._selector.register(self._socket, selectors.EVENT_READ)
+
+    def _shut(self):
+        self._socket.close()
+
+    def _serve(self):
+        while self._running.is_set():
+            # Wakes up in time to release a quiet device's samples, but not so often it spins
+            if self._selector.select(timeout=min(max(self.reorder_window, 5), 100) / 1000):
+                batch = []
+                while True:
+                    try:
+                        batch.append(self._socket.recvfrom(65535))
+                    except BlockingIOError:
+                        break
+                self.receive(batch)
+            self.release_quiet()
+
+    def receive(self, datagrams: List[Tuple[bytes, tuple]]):
+        """Routes a batch of datagrams, as drained from the socket in one wakeup."""
+        start = self.instrumentation.clock()
+        touched = set()
+        for packet, sender in datagrams:
+            try:
+                self._route(packet, sender, touched)
+            except Exception:
+                self.errors += 1
+                self.instrumentation.count("server_errors")
+        self.instrumentation.record("parse", start)
+        now = time.monotonic()
+        for device_id in touched:
+            self._heard[device_id] = now
+            self._release(device_id)
+
+    def release_quiet(self, now: Optional[float] = None):
+        """Releases everything held for devices silent for ``reorder_window`` ms of wall-clock time.
+
+        A held sample only leaves by the device's clock when a newer one
+        arrives, so without this the last samples of a device that stops
+        sending would never be read.
+        """
+        now = time.monotonic() if now is None else now
+        for device_id, pending in self._pending.items():
+            if pending and now - self._heard[device_id] >= self.reorder_window / 1000:
+                self._release(device_id, flush=True)
+
+    def _route(self, packet: bytes, sender: tuple, touched: set):
+        try:
+            messages = decode_packet(packet)
+        except ValueError:
+            self.malformed += 1
+            return
+        for address, arguments in messages:
+            parts = address.strip("/").split("/")
+            if len(parts) != 3 or parts[0] != "spirit" or parts[2] != "quaternion" or len(arguments) != 5:
+                self.malformed += 1
+                continue
+            device_id = parts[1]
+            timestamp, *components = arguments
+            if not isinstance(timestamp, int) or not all(
+                    isinstance(component, (int, float)) and -1 <= component <= 1 for component in components):
+                self.malformed += 1
+                continue
+            self._addresses[device_id] = sender
+            released = self._released.get(device_id)
+            if released is not None and timestamp <= released:
+                if released - timestamp <= self.restart_gap:
+                    self.late += 1
+                    continue
+                self._restart(device_id)
+            self._received += 1
+            heapq.heappush(
+                self._pending.setdefault(device_id, []),
+                (timestamp, self._received, Measurement.trusted(timestamp, *components)),
+            )
+            touched.add(device_id)
+
+    def _restart(self, device_id: str):
+        self.restarts += 1
+        self.instrumentation.count("clock_restarts")
+        if self._pending.get(device_id):
+            self._release(device_id, flush=True)
+        del self._released[device_id]
+
+    def _release(self, device_id: str, flush: bool = False):
+        pending = self._pending[device_id]
+        horizon = max(timestamp for timestamp, _, _ in pending) - (0 if flush else self.reorder_window)
+        released = []
+        while pending and pending[0][0] <= horizon:
+            timestamp, _, measurement = heapq.heappop(pending)
+            released.append(measurement)
+            self._released[device_id] = timestamp
+        conduit = self._conduits.get(device_id)
+        if conduit is not None and released:
+            conduit.deliver(released)
+
+    def notify_state(self, device_id: str, state: SpiritState):
+        address = self._addresses.get(device_id)
+        if address is None:
+            raise Exception("No client connected")
+        self._socket.sendto(encode_message(f"/spirit/{device_id}/state", "s", state.value), address)
+
+    def request_rate(self, device_id: str, rate_hz: int):
+        address = self._addresses.get(device_id)
+        if address is None:
+            raise Exception("No client connected")
+        self._socket.sendto(encode_message(f"/spirit/{device_id}/rate", "i", rate_hz), address)
+
@@ -0,0 +1,221 @@
+import asyncio
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Optional
+
+from .instrumentation import Instrumentation, NullInstrumentation
+
+if TYPE_CHECKING:
+    from .entities import SpiritCommunication, SpiritState
+
+
+class StateNotifier:
+    """Sends a conduit's state notifications from a writer thread.
+
+    ``submit`` only records the latest state and wakes the writer, so a slow
+    BLE write, serial write or socket send never holds up the measurement
+    thread. States are coalesced: a state submitted while an earlier one is
+    still waiting replaces it, and only the latest is ever written. With a
+    ``debounce`` (seconds) a state is written once it has been the latest for
+    that long, and a spirit flapping back to the state last written before
+    then writes nothing at all.
+
+    Write latencies are recorded under the ``notify`` stage of the
+    instrumentation; replaced states count as ``notify_coalesced`` and
+    failed writes as ``notify_failed``. The error of a failed write is
+    raised by the next ``submit``, so a dance still ends when its conduit
+    breaks. ``stop`` writes whatever is still pending before returning.
+
+    With ``rates``, which maps a state to the output rate (Hz) the device
+    should send at, a written state that changes the rate is followed by
+    the conduit's ``request_rate``. Conduits without one are left at their
+    own rate.
+
+    ``reconnected`` forgets what a device showed before it reconnected,
+    along with any write that failed while it was gone, and writes the
+    current state again.
+    """
+
+    def __init__(self, conduit: "SpiritCommunication", debounce: float = 0.0,
+                 instrumentation: Optional[Instrumentation] = None,
+                 rates: Optional[Callable[["SpiritState"], Optional[int]]] = None):
+        self.conduit = conduit
+        self.debounce = debounce
+        self.rates = rates if getattr(conduit, "request_rate", None) is not None else None
+        self.rate: Optional[int] = None
+        self.instrumentation = instrumentation or NullInstrumentation()
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.error: Optional[BaseException] = None
+        self._condition = threading.Condition()
+        self._pending: Optional["SpiritState"] = None
+        self._since = 0.0
+        self._last: Optional["SpiritState"] = None
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def pending(self) -> Optional["SpiritState"]:
+        return self._pending
+
+    def submit(self, state: "SpiritState"):
+        """Queues ``state`` for writing; never blocks on the conduit."""
+        self.check()
+        with self._condition:
+            latest = self._pending if self._pending is not None else self._last
+            if state == latest:
+                return
+            if self._pending is not None:
+                self.coalesced += 1
+                self.instrumentation.count("notify_coalesced")
+            if state == self._last:
+                # Back to what the device already shows before anything was written
+                self._pending = None
+            else:
+                self._pending = state
+                self._since = time.monotonic()
+            self._wake()
+
+    def reconnected(self, state: "SpiritState"):
+        with self._condition:
+            self.error = None
+            self._last = None
+            self.rate = None
+        self.submit(state)
+
+    def check(self):
+        """Raises the error of the last failed write, once."""
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def _wake(self):
+        self._condition.notify()
+
+    def _take(self, flush: bool = False):
+        """The state due for writing, or ``None`` and how long until one may be."""
+        if self._pending is None:
+            return None, None
+        wait = self._since + self.debounce - time.monotonic()
+        if wait > 0 and not flush:
+            return None, wait
+        state, self._pending = self._pending, None
+        self._last = state
+        return state, 0.0
+
+    def _rate_change(self, state: "SpiritState") -> Optional[int]:
+        rate = self.rates(state) if self.rates is not None else None
+        return rate if rate != self.rate else None
+
+    def _failed(self, state: "SpiritState", error: BaseException):
+        self.failed += 1
+        self.instrumentation.count("notify_failed")
+        self.error = error
+        with self._condition:
+            # Not shown on the device, so submitting it again writes it again
+            if self._last == state:
+                self._last = None
+
+    def _write(self, state: "SpiritState"):
+        start = self.instrumentation.clock()
+        try:
+            self.conduit.notify_state(state)
+            rate = self._rate_change(state)
+            if rate is not None:
+                self.conduit.request_rate(rate)
+                self.rate = rate
+        except Exception as error:
+            self._failed(state, error)
+        else:
+            self.sent += 1
+        self.instrumentation.record("notify", start)
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="notify", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    state, wait = self._take(flush=not self._running)
+                    if state is not None or not self._running:
+                        break
+                    self._condition.wait(wait)
+            if state is None:
+                return
+            self._write(state)
+
+
+class AsyncStateNotifier(StateNotifier):
+    """``StateNotifier`` for the Portal, writing from a task on its event loop.
+
+    The conduit's ``notify_state`` is a coroutine, as the Portal's conduits
+    are. ``submit`` must be called from the loop the notifier was started on.
+    """
+
+    def __init__(self, conduit, debounce: float = 0.0, instrumentation: Optional[Instrumentation] = None,
+                 rates: Optional[Callable[["SpiritState"], Optional[int]]] = None):
+        super().__init__(conduit, debounce, instrumentation, rates)
+        self._event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _wake(self):
+        if self._event is not None:
+            self._event.set()
+
+    async def _write(self, state: "SpiritState"):
+        start = self.instrumentation.clock()
+        try:
+            await self.conduit.notify_state(state)
+            rate = self._rate_change(state)
+            if rate is not None:
+                await self.conduit.request_rate(rate)
+                self.rate = rate
+        except Exception as error:
+            self._failed(state, error)
+        else:
+            self.sent += 1
+        self.instrumentation.record("notify", start)
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._running = True
+        self._event = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, timeout: Optional[float] = None):
+        self._running = False
+        if self._task is not None:
+            self._wake()
+            task, self._task = self._task, None
+            await asyncio.wait_for(task, timeout)
+
+    async def _run(self):
+        while True:
+            self._event.clear()
+            with self._condition:
+                state, wait = self._take(flush=not self._running)
+            if state is not None:
+                await self._write(state)
+                continue
+            if not self._running:
+                return
+            try:
+                await asyncio.wait_for(self._event.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,74 @@
+import struct
+from typing import List, Tuple
+
+# Minimal Open Sound Control 1.0 codec: messages and bundles with int32 (i),
+# int64 (h), float32 (f), float64 (d) and string (s) arguments
+BUNDLE_TAG = b"#bundle\x00"
+
+_ARGUMENTS = {
+    "i": struct.Struct(">i"),
+    "h": struct.Struct(">q"),
+    "f": struct.Struct(">f"),
+    "d": struct.Struct(">d"),
+}
+
+OscMessage = Tuple[str, list]
+
+
+def _read_string(packet: bytes, offset: int) -> Tuple[str, int]:
+    end = packet.index(b"\x00", offset)
+    # Strings are null terminated and padded to a multiple of four bytes
+    return packet[offset:end].decode("utf-8"), (end + 4) & ~3
+
+
+def _pad_string(value: str) -> bytes:
+    data = value.encode("utf-8") + b"\x00"
+    return data + b"\x00" * (-len(data) % 4)
+
+
+def decode_message(packet: bytes) -> OscMessage:
+    address, offset = _read_string(packet, 0)
+    tags, offset = _read_string(packet, offset)
+    if not tags.startswith(","):
+        raise ValueError(f"Malformed OSC type tags {tags!r}")
+    arguments = []
+    for tag in tags[1:]:
+        if tag == "s":
+            value, offset = _read_string(packet, offset)
+        elif tag in _ARGUMENTS:
+            argument = _ARGUMENTS[tag]
+            value = argument.unpack_from(packet, offset)[0]
+            offset += argument.size
+        else:
+            raise ValueError(f"Unsupported OSC type tag {tag!r}")
+        arguments.append(value)
+    return address, arguments
+
+
+def decode_packet(packet: bytes) -> List[OscMessage]:
+    """Decodes a datagram into its messages, flattening (nested) bundles."""
+    try:
+        if not packet.startswith(BUNDLE_TAG):
+            return [decode_message(packet)]
+        messages = []
+        offset = len(BUNDLE_TAG) + 8  # skip the time tag
+        while offset < len(packet):
+            size = struct.unpack_from(">i", packet, offset)[0]
+            offset += 4
+            messages.extend(decode_packet(packet[offset:offset + size]))
+            offset += size
+        return messages
+    except (struct.error, IndexError, UnicodeDecodeError) as error:
+        raise ValueError(f"Malformed OSC packet: {error}") from error
+
+
+def encode_message(address: str, tags: str, *arguments) -> bytes:
+    data = [_pad_string(address), _pad_string("," + tags)]
+    for tag, value in zip(tags, arguments):
+        data.append(_pad_string(value) if tag == "s" else _ARGUMENTS[tag].pack(value))
+    return b"".join(data)
+
+
+def encode_bundle(*messages: bytes) -> bytes:
+    immediately = struct.pack(">Q", 1)
+    return BUNDLE_TAG + immediately + b"".join(struct.pack(">i", len(m)) + m for m in messages)
@@ -0,0 +1,223 @@
+import asyncio
+import inspect
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Protocol, Tuple
+
+from .entities import Measurement, Spirit, SpiritCommunication, SpiritState
+from .ingest import AsyncIngestQueue
+from .notifier import AsyncStateNotifier
+from .scoring import BatchScorer
+from .supervisor import AsyncConnectionSupervisor
+
+
+class AsyncSpiritCommunication(Protocol):
+    async def measure(self) -> Measurement:
+        ...
+
+    async def connect(self):
+        ...
+
+    async def disconnect(self):
+        ...
+
+    async def notify_state(self, state: SpiritState):
+        ...
+
+
+class ExecutorSpiritCommunication:
+    """Runs a blocking ``SpiritCommunication`` in an executor for the Portal.
+
+    Every call goes to a worker thread, so a serial busy-wait, a BLE ``read()``
+    or a socket ``recv`` only holds that thread, never the event loop. Any
+    existing conduit can be plugged in this way::
+
+        portal = Portal([Spirit(..., conduit=SerialSpiritCommunication(...))])
+
+    wraps it automatically, or explicitly with a dedicated executor::
+
+        ExecutorSpiritCommunication(conduit, executor=ThreadPoolExecutor(1))
+
+    A cancelled ``measure`` cannot interrupt the worker thread; it returns
+    once the underlying read does.
+    """
+
+    def __init__(self, conduit: SpiritCommunication, executor: Optional[Executor] = None):
+        self.conduit = conduit
+        self.executor = executor
+
+    async def _call(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, method, *args)
+
+    async def measure(self) -> Measurement:
+        return await self._call(self.conduit.measure)
+
+    async def connect(self):
+        await self._call(self.conduit.connect)
+
+    async def disconnect(self):
+        await self._call(self.conduit.disconnect)
+
+    async def notify_state(self, state: SpiritState):
+        await self._call(self.conduit.notify_state, state)
+
+    async def request_rate(self, rate_hz: int):
+        # Conduits without rate control keep the device at its own rate
+        request_rate = getattr(self.conduit, "request_rate", None)
+        if request_rate is not None:
+            await self._call(request_rate, rate_hz)
+
+
+class Portal:
+    """Channels many spirits at once on a single asyncio event loop.
+
+    Each spirit gets its own task that scores the samples an
+    ``AsyncIngestQueue`` reads from its conduit, so a slow or silent device
+    only delays its own spirit, and the spirit's ingest policy decides what
+    is dropped when scoring falls behind; ``ingests`` has the queues. State
+    changes go to a coalescing ``AsyncStateNotifier`` task per spirit, so a
+    slow write never delays the next read either. Conduits with coroutine
+    methods are awaited directly and blocking ones are wrapped in
+    ``ExecutorSpiritCommunication``, sharing two threads per spirit by
+    default, one reading and one writing.
+
+    With a ``scorer`` the spirits' DTWs run together in its worker
+    processes instead: each task hands its sample to a scoring task, which
+    scores every sample waiting as one ``BatchScorer`` tick off the event
+    loop, while the next tick's samples arrive. A spirit waits for its
+    sample's tick before reading the next one, so its samples are still
+    scored in order.
+
+    A spirit with ``reconnect`` reads through an
+    ``AsyncConnectionSupervisor``, which reconnects its conduit with backoff
+    after a dropout while the other spirits keep dancing; ``supervisors``
+    has their reconnect counts and downtime.
+
+    Conduits are keyed by spirit name, so every spirit needs its own. The
+    executor the portal creates is shut down once ``run`` returns; one
+    passed in is left to its owner.
+    """
+
+    def __init__(self, spirits: Iterable[Spirit], executor: Optional[Executor] = None,
+                 scorer: Optional[BatchScorer] = None):
+        self.spirits: List[Spirit] = list(spirits)
+        names = [spirit.name for spirit in self.spirits]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Spirit names must be unique, got duplicates {duplicates}")
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=max(2 * len(self.spirits), 1), thread_name_prefix="conduit")
+        self.conduits: Dict[str, AsyncSpiritCommunication] = {
+            spirit.name: self.adapt(spirit.conduit) for spirit in self.spirits
+        }
+        self.scorer = scorer
+        self.ingests: Dict[str, AsyncIngestQueue] = {}
+        self.supervisors: Dict[str, AsyncConnectionSupervisor] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._ready: List[Tuple[Spirit, Measurement, asyncio.Future]] = []
+        self._tick: Optional[asyncio.Event] = None
+        self._scoring: Optional[asyncio.Task] = None
+
+    def adapt(self, conduit) -> AsyncSpiritCommunication:
+        if inspect.iscoroutinefunction(conduit.measure):
+            return conduit
+        return ExecutorSpiritCommunication(conduit, self.executor)
+
+    async def dance(self, spirit: Spirit):
+        conduit = self.conduits[spirit.name]
+        instrumentation = spirit.instrumentation
+        ingest = AsyncIngestQueue(spirit.ingest_queue_size, spirit.ingest_policy, spirit.ingest_stride,
+                                  instrumentation)
+        self.ingests[spirit.name] = ingest
+        notifier = AsyncStateNotifier(conduit, spirit.notify_debounce, instrumentation, spirit.output_rate)
+        if spirit.reconnect:
+            supervisor = AsyncConnectionSupervisor(conduit, spirit.reconnect_delay, spirit.reconnect_max_delay,
+                                                   instrumentation, ingest.restart)
+            self.supervisors[spirit.name] = supervisor
+            ingest.start(supervisor.measure)
+        else:
+            supervisor = None
+            await conduit.connect()
+            ingest.start(conduit.measure)
+        notifier.start()
+        connection = 0
+        try:
+            while True:
+                measurement = await ingest.get()
+                if ingest.connection != connection:
+                    connection = ingest.connection
+                    spirit.reconnected()
+                    spirit.update_state()
+                    notifier.reconnected(spirit.state)
+                if self.scorer is None:
+                    spirit.process(measurement)
+                else:
+                    await self.score(spirit, measurement)
+                if spirit.update_state():
+                    notifier.submit(spirit.state)
+        finally:
+            try:
+                await ingest.stop()
+                await notifier.stop()
+            finally:
+                if supervisor is not None:
+                    await supervisor.disconnect()
+                else:
+                    await conduit.disconnect()
+                instrumentation.dump()
+
+    def score(self, spirit: Spirit, measurement: Measurement) -> asyncio.Future:
+        """Queues a sample for the next scoring tick; the future is done once it is processed."""
+        if self._scoring is None:
+            self._tick = asyncio.Event()
+            self._scoring = asyncio.create_task(self._score_ticks(), name="scoring")
+        future = asyncio.get_running_loop().create_future()
+        self._ready.append((spirit, measurement, future))
+        self._tick.set()
+        return future
+
+    async def _score_ticks(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._tick.wait()
+            self._tick.clear()
+            batch, self._ready = self._ready, []
+            try:
+                await loop.run_in_executor(
+                    None, self.scorer.score, [(spirit, measurement) for spirit, measurement, _ in batch])
+            except Exception as error:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+
+    async def run(self) -> Dict[str, BaseException]:
+        """Dances every spirit until stopped; returns the errors that ended any of them."""
+        self._tasks = [asyncio.create_task(self.dance(spirit), name=spirit.name) for spirit in self.spirits]
+        try:
+            results = await asyncio.gather(*self._tasks, return_exceptions=True)
+        finally:
+            self.stop()
+            # Cancelled dances still disconnect their conduits through the executor
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self.shutdown()
+        return {
+            spirit.name: result
+            for spirit, result in zip(self.spirits, results)
+            if isinstance(result, BaseException) and not isinstance(result, asyncio.CancelledError)
+        }
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._scoring is not None:
+            self._scoring.cancel()
+            self._scoring = None
+
+    def shutdown(self):
+        """Shuts down the executor the portal created, without waiting for reads still blocked in it."""
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,33 @@
+import queue
+
+
+def put_dropping_oldest(bounded: queue.Queue, item) -> int:
+    """Puts without blocking, evicting the oldest items of a full queue; returns how many."""
+    dropped = 0
+    while True:
+        try:
+            bounded.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                bounded.get_nowait()
+                dropped += 1
+            except queue.Empty:
+                pass
+
+
+def take_queued(measurements: queue.Queue, batch: list) -> list:
+    """Extends ``batch`` with everything already queued, up to a ``None`` disconnect marker.
+
+    The marker is put back, so the next blocking read raises after what
+    arrived before it.
+    """
+    while True:
+        try:
+            item = measurements.get_nowait()
+        except queue.Empty:
+            return batch
+        if item is None:
+            put_dropping_oldest(measurements, None)
+            return batch
+        batch.append(item)
@@ -0,0 +1,157 @@
+import os
+import time
+from typing import List, Optional
+
+import numpy as np
+from pydantic import BaseModel, PrivateAttr
+
+from .entities import Measurement, SpiritCommunication, SpiritState
+
+MAGIC = b"SPIRITS\x01"
+# Quaternions are kept as float64 so a replay reproduces live decisions exactly,
+# and the host arrival time lets a replay reproduce bursts and stalls too
+RECORD_DTYPE = np.dtype([
+    ("received_ns", "<i8"),
+    ("timestamp", "<i8"),
+    ("quaternion", "<f8", (4,)),
+])
+
+
+class SessionRecorder:
+    """Appends every measurement to a binary session file.
+
+    The file is an 8 byte magic followed by fixed-size little endian records,
+    so a crash loses at most the record being written, and ``load_session``
+    maps it back as timestamp and quaternion columns without reading it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        new = not os.path.exists(path) or not os.path.getsize(path)
+        self._file = open(path, "ab")
+        if new:
+            self._file.write(MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, measurement: Measurement, received_ns: Optional[int] = None):
+        quaternion = measurement.quaternion
+        if received_ns is None:
+            received_ns = time.monotonic_ns()
+        record = np.array(
+            [(received_ns, measurement.timestamp,
+              (quaternion.qw, quaternion.qx, quaternion.qy, quaternion.qz))],
+            dtype=RECORD_DTYPE,
+        )
+        self._file.write(record.tobytes())
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def load_session(path: str) -> np.ndarray:
+    """Memory-maps a session file as a structured array of its records."""
+    with open(path, "rb") as session:
+        if session.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a spirit session recording")
+    count = (os.path.getsize(path) - len(MAGIC)) // RECORD_DTYPE.itemsize
+    if not count:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=len(MAGIC), shape=(count,))
+
+
+class RecordingSpiritCommunication(BaseModel):
+    """Passes a conduit through unchanged while recording what it measures."""
+
+    conduit: SpiritCommunication
+    recorder: SessionRecorder
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def measure(self) -> Measurement:
+        measurement = self.conduit.measure()
+        self.recorder.record(measurement)
+        return measurement
+
+    def connect(self):
+        self.conduit.connect()
+
+    def disconnect(self):
+        try:
+            self.conduit.disconnect()
+        finally:
+            self.recorder.flush()
+
+    def notify_state(self, state: SpiritState):
+        self.conduit.notify_state(state)
+
+    def request_rate(self, rate_hz: int):
+        request_rate = getattr(self.conduit, "request_rate", None)
+        if request_rate is not None:
+            request_rate(rate_hz)
+
+
+class ReplaySpiritCommunication(BaseModel):
+    """Plays a recorded session back as a conduit.
+
+    ``speed`` 1 replays with the recorded arrival timing, ``n`` replays n
+    times faster and ``None`` as fast as possible, which makes a replay the
+    scoring path's throughput benchmark. After the last record ``measure``
+    raises ``EOFError``, unless ``loop`` starts the session over. The states
+    the spirit notifies are kept in ``states`` and the output rates it
+    requests in ``rates``.
+    """
+
+    path: str
+    speed: Optional[float] = 1.0
+    loop: bool = False
+    states: List[SpiritState] = []
+    rates: List[int] = []
+    _records: Optional[np.ndarray] = PrivateAttr(default=None)
+    _position: int = PrivateAttr(default=0)
+    _started_ns: int = PrivateAttr(default=0)
+    _offset_ns: int = PrivateAttr(default=0)
+
+    def connect(self):
+        self._records = load_session(self.path)
+        self._position = 0
+        self._restart()
+
+    def _restart(self):
+        self._started_ns = time.monotonic_ns()
+        self._offset_ns = int(self._records["received_ns"][self._position]) if len(self._records) else 0
+
+    def disconnect(self):
+        self._records = None
+
+    def measure(self) -> Measurement:
+        if self._records is None:
+            raise Exception("Replay not connected")
+        if self._position == len(self._records):
+            if not self.loop or not len(self._records):
+                raise EOFError("End of recorded session")
+            self._position = 0
+            self._restart()
+
+        record = self._records[self._position]
+        self._position += 1
+        if self.speed:
+            due_ns = self._started_ns + (int(record["received_ns"]) - self._offset_ns) / self.speed
+            delay = (due_ns - time.monotonic_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+        return Measurement.trusted(int(record["timestamp"]), *record["quaternion"].tolist())
+
+    def notify_state(self, state: SpiritState):
+        self.states.append(state)
+
+    def request_rate(self, rate_hz: int):
+        self.rates.append(rate_hz)
@@ -0,0 +1,260 @@
+import enum
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from dtaidistance import dtw
+
+if TYPE_CHECKING:
+    from .entities import Measurement, Spirit
+
+
+def lb_kim(reference, values) -> float:
+    """Lower bound of the DTW distance from the first and last points alone.
+
+    Every warping path starts by matching both first points and ends by
+    matching both last points.
+    """
+    first = (reference[0] - values[0]) ** 2
+    if len(reference) == 1 and len(values) == 1:
+        return float(np.sqrt(first))
+    return float(np.sqrt(first + (reference[-1] - values[-1]) ** 2))
+
+
+def _envelope(series: np.ndarray, window: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+    # dtaidistance's window allows |i - j| < window, so each point can be
+    # matched within window - 1 positions of the other series
+    radius = window - 1 if window else len(series)
+    if radius >= len(series) - 1:
+        return series.min(), series.max()
+    padded = np.pad(series, radius, mode="edge")
+    neighbourhoods = np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1)
+    return neighbourhoods.min(axis=1), neighbourhoods.max(axis=1)
+
+
+def lb_keogh(reference, values, window: Optional[int] = None) -> float:
+    """LB_Keogh lower bound of the DTW distance of two equally long series.
+
+    Every point of one series is matched to at least one point of the other
+    within the warping window, so its squared distance to the envelope of
+    those points adds up to a lower bound. Without a window the envelope is
+    the series' whole range. The tighter of the two directions is returned.
+    """
+    lower, upper = _envelope(reference, window)
+    reference_excess = values - np.clip(values, lower, upper)
+    lower, upper = _envelope(values, window)
+    values_excess = reference - np.clip(reference, lower, upper)
+    return float(np.sqrt(max(np.dot(reference_excess, reference_excess), np.dot(values_excess, values_excess))))
+
+
+def resample(times: np.ndarray, values: np.ndarray, period: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Linearly interpolates irregularly timed values onto a uniform grid of ``period`` ms."""
+    if not len(times):
+        return times, values
+    grid = times[0] + np.arange((times[-1] - times[0]) // period + 1) * period
+    return grid, np.interp(grid, times, values)
+
+
+def paa(series: np.ndarray, factor: int) -> np.ndarray:
+    """Piecewise aggregate approximation: the mean of every ``factor`` consecutive points."""
+    if factor <= 1 or not len(series):
+        return series
+    starts = np.arange(0, len(series), factor)
+    return np.add.reduceat(series, starts) / np.diff(np.append(starts, len(series)))
+
+
+class ScoringEngine(str, enum.Enum):
+    # Full-window DTW against the summoning template
+    dtw = "dtw"
+    # Only the O(1) slope check of every sample
+    derivative = "derivative"
+    # The slope check rejects, DTW decides what it lets through
+    prefiltered = "prefiltered"
+
+
+class ComputeTier(str, enum.Enum):
+    # Every sample, at full resolution
+    full = "full"
+    # Every few samples, downsampled, repeating the last decision in between
+    coarse = "coarse"
+    # Not scored: nothing is moving
+    idle = "idle"
+
+
+class DerivativeDetector:
+    """Checks each sample's rate of change against the summoning function's.
+
+    The streaming detector the README describes: the slope between two
+    consecutive samples must be within a tolerance of the slope of the
+    summoning function between the same times. Only the previous sample is
+    kept, so a check is O(1). ``misses`` counts the consecutive samples out
+    of tolerance; once it reaches the limit the caller resets the origin
+    and, with ``reset``, the count.
+    """
+
+    def __init__(self):
+        self.misses = 0
+        self._previous: Optional[Tuple[int, float]] = None
+
+    def reset(self):
+        self.misses = 0
+
+    def update(self, timestamp: int, value: float, expected: Callable[[int], float], tolerance: float) -> bool:
+        """Feeds a sample; whether its slope is within ``tolerance`` rad/s of the expected one.
+
+        ``expected`` maps a device timestamp to the summoning function's
+        value there, under the current origin.
+        """
+        previous, self._previous = self._previous, (timestamp, value)
+        if previous is None:
+            return True
+        previous_timestamp, previous_value = previous
+        elapsed = (timestamp - previous_timestamp) / 1000
+        expected_change = expected(timestamp) - expected(previous_timestamp)
+        within = elapsed > 0 and abs(value - previous_value - expected_change) <= tolerance * elapsed
+        self.misses = 0 if within else self.misses + 1
+        return within
+
+
+def phase_search(query: np.ndarray, series: np.ndarray) -> Tuple[int, float]:
+    """Where in ``series`` the best DTW alignment of ``query`` ends, and its distance.
+
+    Subsequence DTW: the query is aligned whole while the alignment may
+    begin and end anywhere in the series, so every offset is tried in a
+    single C pass over the cost matrix instead of one DTW per offset.
+    """
+    psi = [0, 0, len(series), len(series)]
+    _, paths = dtw.warping_paths_fast(query, series, psi=psi, compact=False, psi_neg=False)
+    end = int(np.argmin(paths[-1, 1:]))
+    return end, float(paths[-1, end + 1])
+
+
+class ThresholdCascade:
+    """Decides whether the DTW distance of two series is below a threshold.
+
+    Cheap lower bounds reject first (LB_Kim, then LB_Keogh). The C DTW only
+    runs on windows they cannot rule out, within the same Sakoe-Chiba
+    ``window`` if one is given, and abandons as soon as every alignment
+    exceeds the threshold. The decision is the same as comparing
+    the exact ``dtw.distance_fast`` with the threshold: bounds only reject
+    with a relative margin of ``1e-9`` above it, so rounding never flips one.
+    How each decision was reached is counted in ``kim``, ``keogh``,
+    ``abandoned`` and ``exact``.
+    """
+
+    def __init__(self):
+        self.kim = 0
+        self.keogh = 0
+        self.abandoned = 0
+        self.exact = 0
+
+    @staticmethod
+    def margin(threshold: float) -> float:
+        return threshold * (1 + 1e-9)
+
+    def screen(self, reference: np.ndarray, values: np.ndarray, threshold: float,
+               window: Optional[int] = None) -> Optional[bool]:
+        """The decision if the lower bounds make it, ``None`` when the DTW has to."""
+        if not len(values):
+            return False
+        margin = self.margin(threshold)
+        if lb_kim(reference, values) > margin:
+            self.kim += 1
+            return False
+        if lb_keogh(reference, values, window) > margin:
+            self.keogh += 1
+            return False
+        return None
+
+    def decide(self, distance: float, threshold: float) -> bool:
+        """The decision from the early abandoned DTW of a window ``screen`` let through."""
+        if distance == np.inf:
+            self.abandoned += 1
+            return False
+        self.exact += 1
+        return distance < threshold
+
+    def below(self, reference: np.ndarray, values: np.ndarray, threshold: float,
+              window: Optional[int] = None) -> bool:
+        decision = self.screen(reference, values, threshold, window)
+        if decision is not None:
+            return decision
+        return self.decide(DTWJob(reference, values, window, self.margin(threshold)).run(), threshold)
+
+
+class DTWJob(NamedTuple):
+    """One exact DTW, abandoned once it exceeds ``max_dist``."""
+
+    reference: np.ndarray
+    values: np.ndarray
+    window: Optional[int] = None
+    max_dist: Optional[float] = None
+
+    def run(self) -> float:
+        # Euclidean pruning is off: its bound rounds exactly diagonal
+        # alignments to inf now and then, even below max_dist
+        return dtw.distance_fast(self.reference, self.values, window=self.window, max_dist=self.max_dist,
+                                 use_pruning=False)
+
+
+def _run_jobs(jobs: Sequence[DTWJob]) -> List[float]:
+    return [job.run() for job in jobs]
+
+
+class BatchScorer:
+    """Scores one sample of each of many spirits together.
+
+    ``score`` runs every spirit's cheap checks, serially, and gathers the
+    windows left for the exact DTW. Those are split into one chunk per
+    worker and run in a pool of worker processes, as dtaidistance's C DTW
+    holds the GIL. Each distance then goes back to its spirit, which
+    finishes the sample as ``process`` would, so a batch decides exactly
+    what scoring every spirit on its own does.
+
+    Every chunk costs a round trip to its process, so a tick only gets
+    faster when its DTWs take longer than that: many spirits or long
+    windows. With one worker, or a single DTW, the jobs run inline. The
+    workers are spawned rather than forked, as the Portal scores while its
+    conduit threads run, so a script using several needs the usual
+    ``if __name__ == "__main__"`` guard.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor: Optional[ProcessPoolExecutor] = None
+        if self.workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+            # Start the workers now rather than on the first tick
+            for _ in range(self.workers):
+                self.executor.submit(int)
+
+    def distances(self, jobs: Sequence[DTWJob]) -> List[float]:
+        if len(jobs) <= 1 or self.executor is None:
+            return _run_jobs(jobs)
+        size = -(-len(jobs) // self.workers)
+        chunks = [jobs[start:start + size] for start in range(0, len(jobs), size)]
+        return [distance for distances in self.executor.map(_run_jobs, chunks) for distance in distances]
+
+    def score(self, batch: Sequence[Tuple["Spirit", "Measurement"]]):
+        """Processes each measurement with its spirit; every spirit at most once per batch."""
+        pending = []
+        for spirit, measurement in batch:
+            job = spirit.screen(measurement)
+            if job is not None:
+                pending.append((spirit, measurement, job))
+        if not pending:
+            return
+        start = time.perf_counter_ns()
+        distances = self.distances([job for _, _, job in pending])
+        for (spirit, measurement, _), distance in zip(pending, distances):
+            # Every sample of the tick waited for the whole batch
+            spirit.instrumentation.record("dtw", start)
+            spirit.conclude(measurement, distance)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
@@ -0,0 +1,196 @@
+import abc
+import math
+from collections import OrderedDict
+from typing import Dict, Optional, Type
+
+import numpy as np
+
+# Axes a summoning function can trace: rotation about x (roll), y (pitch) or z (yaw)
+AXES = ("x", "y", "z")
+
+
+def rotation_function_ms(times, rotation_duration=1000, pause_duration=100):
+    times = np.asarray(times, dtype=float)
+
+    # Calculate cycle length in milliseconds directly
+    cycle_length_ms = 2 * rotation_duration + 2 * pause_duration
+
+    # Compute the ends of each phase within the cycle
+    left_rotation_end_ms = rotation_duration
+    first_pause_end_ms = left_rotation_end_ms + pause_duration
+    right_rotation_end_ms = first_pause_end_ms + rotation_duration
+
+    # Rates of rotation per millisecond
+    left_rate = np.radians(180) / rotation_duration  # Positive rate for left rotation
+    right_rate = -np.radians(180) / rotation_duration  # Negative rate for right rotation
+
+    # Normalize every time to its position in the cycle in one pass
+    cycle_time_ms = np.mod(times, cycle_length_ms)
+
+    phases = [
+        cycle_time_ms <= left_rotation_end_ms,
+        cycle_time_ms <= first_pause_end_ms,
+        cycle_time_ms <= right_rotation_end_ms,
+    ]
+    values = [
+        # Left rotation
+        left_rate * cycle_time_ms,
+        # First pause - keep the angle constant at 180 degrees (in radians)
+        np.radians(180),
+        # Right rotation
+        np.radians(180) + right_rate * (cycle_time_ms - first_pause_end_ms),
+    ]
+    # Second pause - angle goes back to 0
+    return np.select(phases, values, default=0.0)
+
+
+class TemplateCache:
+    """Memoizes a summoning function's templates for the relative timestamps of a window.
+
+    When the function is periodic the key is the window shifted back by
+    whole periods: a steady-rate stream hits the same entry once per cycle
+    instead of once per origin reset. Templates are shared between callers
+    and must not be modified in place.
+    """
+
+    def __init__(self, function: "SummoningFunction", maxsize=256):
+        self.function = function
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._templates = OrderedDict()
+
+    def __len__(self):
+        return len(self._templates)
+
+    def clear(self):
+        self._templates.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def template(self, times):
+        times = np.asarray(times, dtype=float)
+        period = self.function.period
+        if period and len(times):
+            times = times - (times[0] // period) * period
+
+        key = times.tobytes()
+        template = self._templates.get(key)
+        if template is not None:
+            self._templates.move_to_end(key)
+            self.hits += 1
+            return template
+
+        self.misses += 1
+        template = self.function(times)
+        self._templates[key] = template
+        if len(self._templates) > self.maxsize:
+            self._templates.popitem(last=False)
+        return template
+
+
+class SummoningFunction(abc.ABC):
+    """The movement a spirit is summoned with: the angle one axis traces over time.
+
+    A function carries its own parameters, the DTW ``threshold`` a window
+    must stay under and the ``axis`` it is measured on. It owns its
+    templates: ``template`` serves any relative times from an LRU cache and
+    ``grid_template`` serves uniform grids from one precomputed table per
+    sample period, so only new windows ever evaluate the function.
+
+    The derivative engines check each sample's rate of change instead:
+    ``slope_tolerance`` (rad/s) is how far it may be off the function's, and
+    ``max_misses`` how many samples in a row may miss before the origin is
+    reset.
+    Subclasses implement ``__call__`` for times in ms relative to the
+    spirit's origin and set ``period`` when the movement repeats.
+    """
+
+    name: str = ""
+    period: Optional[float] = None
+
+    def __init__(self, threshold: float = 0.1, axis: str = "y", slope_tolerance: float = 1.5, max_misses: int = 3,
+                 cache_size: int = 256):
+        if axis not in AXES:
+            raise ValueError(f"Unknown axis {axis!r}, expected one of {AXES}")
+        self.threshold = threshold
+        self.axis = axis
+        self.slope_tolerance = slope_tolerance
+        self.max_misses = max_misses
+        self.cache = TemplateCache(self, maxsize=cache_size)
+        self._grids: Dict[float, np.ndarray] = {}
+
+    @abc.abstractmethod
+    def __call__(self, times) -> np.ndarray:
+        """The angle, in radians, at each of ``times``."""
+
+    def value(self, time: float) -> float:
+        """The function at a single relative time; subclasses may override it with scalar math."""
+        return float(self([time])[0])
+
+    def template(self, times) -> np.ndarray:
+        return self.cache.template(times)
+
+    def grid_template(self, start: float, count: int, step: float) -> np.ndarray:
+        """The template at ``start``, ``start + step``, ... for ``count`` points.
+
+        For a periodic function on a grid that divides its period, this is a
+        slice of a table holding one cycle plus the longest window requested.
+        """
+        period = self.period
+        if not period or period % step or start % step:
+            return self.template(start + np.arange(count) * step)
+        steps_per_cycle = int(period // step)
+        table = self._grids.get(step)
+        if table is None or len(table) < steps_per_cycle + count:
+            table = self._grids[step] = self(np.arange(steps_per_cycle + count) * step)
+        offset = int(start % period // step)
+        return table[offset:offset + count]
+
+
+summoning_functions: Dict[str, Type[SummoningFunction]] = {}
+_instances: Dict[tuple, SummoningFunction] = {}
+
+
+def register_summoning(cls: Type[SummoningFunction]) -> Type[SummoningFunction]:
+    summoning_functions[cls.name] = cls
+    return cls
+
+
+def summoning_function(name: str, **parameters) -> SummoningFunction:
+    """The registered summoning function ``name`` with the given parameters.
+
+    Spirits configured alike get the same instance, and so share templates.
+    """
+    key = (name, tuple(sorted(parameters.items())))
+    if key not in _instances:
+        if name not in summoning_functions:
+            raise ValueError(f"Unknown summoning function {name!r}")
+        _instances[key] = summoning_functions[name](**parameters)
+    return _instances[key]
+
+
+@register_summoning
+class RotationSummoning(SummoningFunction):
+    """Rotate half a turn one way, pause, rotate back and pause again."""
+
+    name = "rotation"
+
+    def __init__(self, rotation_duration: float = 1000, pause_duration: float = 100, **kwargs):
+        super().__init__(**kwargs)
+        self.rotation_duration = rotation_duration
+        self.pause_duration = pause_duration
+        self.period = 2 * rotation_duration + 2 * pause_duration
+
+    def __call__(self, times) -> np.ndarray:
+        return rotation_function_ms(times, self.rotation_duration, self.pause_duration)
+
+    def value(self, time: float) -> float:
+        cycle_time_ms = time % self.period
+        if cycle_time_ms <= self.rotation_duration:
+            return math.pi * cycle_time_ms / self.rotation_duration
+        if cycle_time_ms <= self.rotation_duration + self.pause_duration:
+            return math.pi
+        if cycle_time_ms <= 2 * self.rotation_duration + self.pause_duration:
+            return math.pi - math.pi * (cycle_time_ms - self.rotation_duration - self.pause_duration) / self.rotation_duration
+        return 0.0
@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Optional
+
+import numpy as np
+
+from .instrumentation import Instrumentation, NullInstrumentation
+
+if TYPE_CHECKING:
+    from .entities import Measurement, SpiritCommunication
+
+
+class ConnectionSupervisor:
+    """Keeps a conduit connected, reconnecting it with exponential backoff.
+
+    ``measure`` connects on first use and, when the conduit raises, drops
+    the connection and reconnects, waiting ``initial_delay`` seconds after
+    the first failed attempt and doubling up to ``max_delay`` after each
+    further one. A failed attempt is disconnected before the next, so it
+    leaves nothing behind. ``measure`` only returns with a measurement, so
+    a dropout holds up just the thread reading this conduit; other spirits
+    keep running. ``EOFError``, the end of a replayed session, is not a
+    dropout and is raised as is, as is anything after ``stop``.
+
+    A dropout is only noticed when the conduit's ``measure`` raises, so a
+    conduit that may wait forever on a vanished device needs a liveness
+    signal of its own, such as the ``silence_timeout`` of the notification
+    and multi-device conduits.
+
+    ``reconnects`` counts the outages recovered from, ``failures`` the
+    connect attempts that failed and ``downtime`` the seconds from each
+    dropout to the first sample after it, however many connects that took.
+    They are also counted in the instrumentation, with each outage's length
+    under the ``downtime`` stage. ``on_reconnect`` is called before the
+    first sample after every outage is returned.
+    """
+
+    def __init__(self, conduit: "SpiritCommunication", initial_delay: float = 0.5, max_delay: float = 30.0,
+                 instrumentation: Optional[Instrumentation] = None,
+                 on_reconnect: Optional[Callable[[], None]] = None):
+        self.conduit = conduit
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.instrumentation = instrumentation or NullInstrumentation()
+        self.on_reconnect = on_reconnect
+        self.connected = False
+        self.reconnects = 0
+        self.failures = 0
+        self.downtime = 0.0
+        self.error: Optional[BaseException] = None
+        self._down_since: Optional[float] = None
+        self._down_clock = 0
+        self._stopping = threading.Event()
+
+    def _dropped(self, error: BaseException):
+        self.connected = False
+        self.error = error
+        if self._down_since is None:
+            self._down_since = time.monotonic()
+            self._down_clock = self.instrumentation.clock()
+            self.instrumentation.count("disconnects")
+
+    def _failed(self, error: BaseException, attempt: int) -> float:
+        """Counts the ``attempt``-th failed connect in a row; the delay before the next."""
+        self.failures += 1
+        self.error = error
+        self.instrumentation.count("connect_failed")
+        return min(self.initial_delay * 2 ** min(attempt, 32), self.max_delay)
+
+    def _recovered(self):
+        self.downtime += time.monotonic() - self._down_since
+        self.instrumentation.record("downtime", self._down_clock)
+        self._down_since = None
+        self.reconnects += 1
+        self.instrumentation.count("reconnects")
+        if self.on_reconnect is not None:
+            self.on_reconnect()
+
+    def _check_stopping(self):
+        if self._stopping.is_set():
+            raise EOFError("Connection supervisor stopped")
+
+    def connect(self):
+        """Connects, retrying with backoff until it succeeds or ``stop`` is called."""
+        attempt = 0
+        while not self.connected:
+            self._check_stopping()
+            try:
+                self.conduit.connect()
+            except Exception as error:
+                self._release()
+                self._stopping.wait(self._failed(error, attempt))
+                attempt += 1
+            else:
+                self.connected = True
+
+    def _release(self):
+        try:
+            self.conduit.disconnect()
+        except Exception:
+            pass
+
+    def measure(self) -> "Measurement":
+        return self._read(self.conduit.measure)
+
+    def measure_samples(self) -> np.ndarray:
+        """The conduit's ``measure_samples``, supervised as ``measure`` is."""
+        return self._read(self.conduit.measure_samples)
+
+    def _read(self, read: Callable):
+        while True:
+            if not self.connected:
+                self.connect()
+            try:
+                measurement = read()
+            except EOFError:
+                raise
+            except Exception as error:
+                self._check_stopping()
+                self._dropped(error)
+                self._release()
+            else:
+                if self._down_since is not None:
+                    self._recovered()
+                return measurement
+
+    def stop(self):
+        """Ends reconnecting; a ``measure`` waiting to reconnect raises ``EOFError``."""
+        self._stopping.set()
+
+    def disconnect(self):
+        self.stop()
+        if self.connected:
+            self.connected = False
+            self.conduit.disconnect()
+
+
+class AsyncConnectionSupervisor(ConnectionSupervisor):
+    """``ConnectionSupervisor`` for the Portal's conduits, whose methods are coroutines."""
+
+    def __init__(self, conduit, initial_delay: float = 0.5, max_delay: float = 30.0,
+                 instrumentation: Optional[Instrumentation] = None,
+                 on_reconnect: Optional[Callable[[], None]] = None):
+        super().__init__(conduit, initial_delay, max_delay, instrumentation, on_reconnect)
+        self._stopped = False
+
+    def _check_stopping(self):
+        if self._stopped:
+            raise EOFError("Connection supervisor stopped")
+
+    async def connect(self):
+        attempt = 0
+        while not self.connected:
+            self._check_stopping()
+            try:
+                await self.conduit.connect()
+            except Exception as error:
+                await self._release()
+                await asyncio.sleep(self._failed(error, attempt))
+                attempt += 1
+            else:
+                self.connected = True
+
+    async def _release(self):
+        try:
+            await self.conduit.disconnect()
+        except Exception:
+            pass
+
+    async def measure(self) -> "Measurement":
+        while True:
+            if not self.connected:
+                await self.connect()
+            try:
+                measurement = await self.conduit.measure()
+            except EOFError:
+                raise
+            except Exception as error:
+                self._check_stopping()
+                self._dropped(error)
+                await self._release()
+            else:
+                if self._down_since is not None:
+                    self._recovered()
+                return measurement
+
+    def stop(self):
+        self._stopped = True
+
+    async def disconnect(self):
+        self.stop()
+        if self.connected:
+            self.connected = False
+            await self.conduit.disconnect()
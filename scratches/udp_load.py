@@ -0,0 +1,53 @@
+import socket
+import threading
+import time
+
+import numpy as np
+
+from channelling_portal.network import UDPSpiritServer
+from channelling_portal.osc import encode_bundle, encode_message
+
+# Synthetic spirits streaming OSC over UDP to a local portal
+DEVICES = 16
+RATE_HZ = 200
+SAMPLES_PER_DATAGRAM = 2
+DURATION_S = 5
+
+server = UDPSpiritServer(ip_address="127.0.0.1", port=0)
+conduits = [server.conduit(f"spirit{i}") for i in range(DEVICES)]
+for conduit in conduits:
+    conduit.connect()
+
+received = [0] * DEVICES
+
+
+def consume(index):
+    while True:
+        received[index] += len(conduits[index].measure_batch())
+
+
+for index in range(DEVICES):
+    threading.Thread(target=consume, args=(index,), daemon=True).start()
+
+sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+interval = SAMPLES_PER_DATAGRAM / RATE_HZ
+sent = 0
+start = time.perf_counter()
+tick = 0
+while time.perf_counter() - start < DURATION_S:
+    for index in range(DEVICES):
+        timestamps = tick * SAMPLES_PER_DATAGRAM * 1000 // RATE_HZ + np.arange(SAMPLES_PER_DATAGRAM) * 1000 // RATE_HZ
+        messages = [
+            encode_message(f"/spirit/spirit{index}/quaternion", "iffff", int(t), 1.0, 0.0, np.sin(t / 500), 0.0)
+            for t in timestamps
+        ]
+        sender.sendto(encode_bundle(*messages), server.address)
+        sent += SAMPLES_PER_DATAGRAM
+    tick += 1
+    time.sleep(max(0.0, start + tick * interval - time.perf_counter()))
+
+time.sleep(0.5)
+elapsed = time.perf_counter() - start
+print(f"Sent {sent} samples from {DEVICES} devices in {elapsed:.1f} s ({sent / elapsed:.0f} samples/s)")
+print(f"Received {sum(received)} ({sum(received) / sent:.1%}), late {server.late}, malformed {server.malformed}")
+server.stop(force=True)
@@ -28,6 +28,22 @@ Adafruit_NXPSensorFusion filter; // slowest
 
 uint32_t timestamp;
 
+// The filter always runs at FILTER_UPDATE_RATE_HZ; a sample is sent every
+// updatesPerOutput updates. The host lowers the output rate while its spirit
+// is idle and raises it again with "rate:<hz>", up to the filter rate.
+// Until then it keeps the original rate: "counter++ <= PRINT_EVERY_N_UPDATES"
+// sent one sample every PRINT_EVERY_N_UPDATES + 2 updates
+#define DEFAULT_UPDATES_PER_OUTPUT (PRINT_EVERY_N_UPDATES + 2)
+uint16_t updatesPerOutput = DEFAULT_UPDATES_PER_OUTPUT;
+
+// Binary measurement frame, little endian, negotiated by the host with "format:binary"
+//   sync (0xA5 0x5A) | timestamp ms (uint32) | qw qx qy qz (int16, q * 32767) | CRC-8 (poly 0x07)
+#define FRAME_SYNC_0 0xA5
+#define FRAME_SYNC_1 0x5A
+#define FRAME_SIZE 15
+#define QUATERNION_SCALE 32767.0f
+bool binaryFrames = false;
+
 #define NEOPIXEL_PIN 8
 #define NUMPIXELS    1
 
@@ -119,8 +135,8 @@ void sendSensorData() {
   filter.update(gx, gy, gz,
                 accel.acceleration.x, accel.acceleration.y, accel.acceleration.z,
                 mag.magnetic.x, mag.magnetic.y, mag.magnetic.z);
-  // only print the calculated output once in a while
-  if (counter++ <= PRINT_EVERY_N_UPDATES) {
+  // only send the calculated output at the requested rate
+  if (++counter < updatesPerOutput) {
     return;
   }
   // reset the counter
@@ -128,6 +144,10 @@ void sendSensorData() {
 
   float qw, qx, qy, qz;
   filter.getQuaternion(&qw, &qx, &qy, &qz);
+  if (binaryFrames) {
+    sendFrame(millis(), qw, qx, qy, qz);
+    return;
+  }
   bleuart.print("Quaternion: ");
   bleuart.print(qw, 4);
   bleuart.print(", ");
@@ -138,6 +158,38 @@ void sendSensorData() {
   bleuart.println(qz, 4);
 }
 
+uint8_t crc8(const uint8_t *data, size_t length) {
+  uint8_t crc = 0;
+  for (size_t i = 0; i < length; i++) {
+    crc ^= data[i];
+    for (int bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+void putInt16(uint8_t *frame, float component) {
+  int16_t quantized = (int16_t)lroundf(constrain(component, -1.0f, 1.0f) * QUATERNION_SCALE);
+  frame[0] = quantized & 0xFF;
+  frame[1] = (quantized >> 8) & 0xFF;
+}
+
+void sendFrame(uint32_t now, float qw, float qx, float qy, float qz) {
+  uint8_t frame[FRAME_SIZE];
+  frame[0] = FRAME_SYNC_0;
+  frame[1] = FRAME_SYNC_1;
+  for (int i = 0; i < 4; i++) {
+    frame[2 + i] = (now >> (8 * i)) & 0xFF;
+  }
+  putInt16(frame + 6, qw);
+  putInt16(frame + 8, qx);
+  putInt16(frame + 10, qy);
+  putInt16(frame + 12, qz);
+  frame[14] = crc8(frame + 2, FRAME_SIZE - 3);
+  bleuart.write(frame, FRAME_SIZE);
+}
+
 void blinkNeopixel(State state, uint32_t color) {
   unsigned long currentMillis = millis();
   static long interval = 0;
@@ -216,8 +268,35 @@ uint32_t mixColors(uint32_t color1, uint32_t color2, int weight) {
     return pixels.Color(redMix, greenMix, blueMix);
 }
 
+void setOutputRate(long hz) {
+    hz = constrain(hz, 1, FILTER_UPDATE_RATE_HZ);
+    updatesPerOutput = FILTER_UPDATE_RATE_HZ / hz;
+}
+
 void handleIncomingData(String data) {
-    if (data.startsWith("state:")) {
+    // Commands end in a newline, and one read may hold several of them,
+    // such as a state and the output rate that follows it
+    int start = 0;
+    while (start < (int) data.length()) {
+        int end = data.indexOf('\n', start);
+        if (end == -1) {
+            end = data.length();
+        }
+        handleCommand(data.substring(start, end));
+        start = end + 1;
+    }
+}
+
+void handleCommand(String data) {
+    data.trim();
+    if (data.startsWith("format:")) {
+        binaryFrames = data.substring(7) == "binary";
+    } else if (data.startsWith("rate:")) {
+        long hz = data.substring(5).toInt();
+        if (hz > 0) {
+          setOutputRate(hz);
+        }
+    } else if (data.startsWith("state:")) {
         String newState = data.substring(6);
 
         if (newState == "inert") {
@@ -257,5 +336,7 @@ void disconnect_callback(uint16_t conn_handle, uint8_t reason) {
     // Connection disconnected
     Bluefruit.Advertising.start(0); // Restart advertising indefinitely
     state = INERT; // Reset the state to inert
+    updatesPerOutput = DEFAULT_UPDATES_PER_OUTPUT; // and the output rate
+    binaryFrames = false; // and text lines, until the next host asks otherwise
 }
 
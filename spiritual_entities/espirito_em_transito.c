@@ -209,6 +209,20 @@ uint32_t mixColors(uint32_t color1, uint32_t color2, int weight) {
 }
 
 void handleIncomingData(String data) {
+    // Commands end in a newline, and one read may hold several of them
+    int start = 0;
+    while (start < (int) data.length()) {
+        int end = data.indexOf('\n', start);
+        if (end == -1) {
+            end = data.length();
+        }
+        handleCommand(data.substring(start, end));
+        start = end + 1;
+    }
+}
+
+void handleCommand(String data) {
+    data.trim();
     if (data.startsWith("state:")) {
         String newState = data.substring(6);
 
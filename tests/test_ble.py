@@ -0,0 +1,159 @@
+import threading
+
+import pytest
+from channelling_portal.ble import UART_RX_CHAR_UUID, UART_TX_CHAR_UUID, BLENotifySpiritCommunication
+from channelling_portal.entities import SpiritState
+from channelling_portal.instrumentation import Instrumentation
+
+
+class FakeBleakClient:
+    def __init__(self, address, disconnected_callback=None):
+        self.address = address
+        self.disconnected_callback = disconnected_callback
+        self.mtu_size = 247
+        self.callbacks = {}
+        self.writes = []
+        self.connected = threading.Event()
+
+    async def connect(self):
+        self.connected.set()
+
+    async def disconnect(self):
+        self.connected.clear()
+
+    async def start_notify(self, uuid, callback):
+        self.callbacks[uuid] = callback
+
+    async def write_gatt_char(self, uuid, data, response=False):
+        self.writes.append((uuid, data))
+
+    def notify(self, data):
+        self.callbacks[UART_TX_CHAR_UUID](None, bytearray(data))
+
+    def drop(self):
+        self.connected.clear()
+        self.disconnected_callback(self)
+
+
+class BleakClientBlueZDBus:
+    def __init__(self, client, mtu_size):
+        self.client = client
+        self.mtu_size = mtu_size
+
+    async def _acquire_mtu(self):
+        if self.mtu_size is None:
+            raise RuntimeError("AcquireNotify is not supported")
+        self.client.mtu_size = self.mtu_size
+
+
+class BlueZBleakClient(FakeBleakClient):
+    """Reports the default MTU until it is acquired from the backend, as bleak does on BlueZ."""
+
+    negotiated_mtu = 247
+
+    def __init__(self, address, disconnected_callback=None):
+        super().__init__(address, disconnected_callback)
+        self.mtu_size = 23
+        self._backend = BleakClientBlueZDBus(self, self.negotiated_mtu)
+
+
+class UnacquirableBleakClient(BlueZBleakClient):
+    negotiated_mtu = None
+
+
+class RefusingBleakClient(FakeBleakClient):
+    async def connect(self):
+        raise ConnectionError("device not found")
+
+
+class TestBLENotifySpiritCommunication:
+    @pytest.fixture
+    def comm(self):
+        comm = BLENotifySpiritCommunication(mac_address="00:00:00:00:00:00", client_factory=FakeBleakClient,
+                                            queue_size=3)
+        comm.connect()
+        yield comm
+        comm.disconnect()
+
+    def test_connect_subscribes_to_notifications(self, comm):
+        assert comm._client.connected.is_set()
+        assert UART_TX_CHAR_UUID in comm._client.callbacks
+        assert comm.mtu_size == 247
+
+    def test_mtu_is_acquired_on_bluez(self):
+        comm = BLENotifySpiritCommunication(mac_address="00:00:00:00:00:00", client_factory=BlueZBleakClient)
+        comm.connect()
+        comm.disconnect()
+        assert comm.mtu_size == 247
+
+    def test_connects_with_the_default_mtu_when_bluez_cannot_acquire_it(self):
+        comm = BLENotifySpiritCommunication(mac_address="00:00:00:00:00:00", client_factory=UnacquirableBleakClient,
+                                            instrumentation=Instrumentation())
+        comm.connect()
+        comm.disconnect()
+        assert comm.mtu_size == 23
+        assert comm.instrumentation.counters == {"mtu_unavailable": 1}
+
+    def test_connect_selects_text_frames(self, comm):
+        # A device left sending binary frames by an earlier session switches back
+        assert comm._client.writes == [(UART_RX_CHAR_UUID, b"format:text\n")]
+
+    def test_reassembles_frames_split_across_notifications(self, comm):
+        comm._client.notify(b"10,1.0,0.0,")
+        comm._client.notify(b"0.0,0.0\n20,0.5,0.5,0.5,0.5\n30,1.0")
+        assert [m.timestamp for m in comm.measure_batch()] == [10, 20]
+
+    def test_bounded_queue_drops_oldest(self, comm):
+        comm._client.notify(b"".join(b"%d,1.0,0.0,0.0,0.0\n" % t for t in range(5)))
+        assert [m.timestamp for m in comm.measure_batch()] == [2, 3, 4]
+        assert comm.dropped == 2
+
+    def test_skips_garbled_lines(self, comm):
+        comm._client.notify(b"10,1.0,0.0,0.0,0.0\nQuaternion: 1.0\n20,1.0,0.0,0.0,0.0\n")
+        assert [m.timestamp for m in comm.measure_batch()] == [10, 20]
+        assert comm.malformed == 1
+
+    def test_notify_state_writes_to_rx_characteristic(self, comm):
+        comm.notify_state(SpiritState.awakened)
+        assert comm._client.writes[-1] == (UART_RX_CHAR_UUID, b"state:awakened\n")
+
+    def test_request_rate_writes_to_rx_characteristic(self, comm):
+        comm.request_rate(20)
+        assert comm._client.writes[-1] == (UART_RX_CHAR_UUID, b"rate:20\n")
+
+    def test_disconnect_stops_the_client(self):
+        comm = BLENotifySpiritCommunication(mac_address="00:00:00:00:00:00", client_factory=FakeBleakClient)
+        comm.connect()
+        client = comm._client
+        comm.disconnect()
+        assert not client.connected.is_set()
+
+    def test_dropout_ends_a_waiting_measure(self, comm):
+        comm._client.notify(b"10,1.0,0.0,0.0,0.0\n")
+        assert comm.measure().timestamp == 10
+        errors = []
+
+        def read():
+            try:
+                comm.measure()
+            except ConnectionError as error:
+                errors.append(error)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        comm._client.drop()
+        reader.join(1)
+        assert not reader.is_alive() and len(errors) == 1
+        # Every later read raises as well
+        with pytest.raises(ConnectionError):
+            comm.measure_batch()
+
+    def test_failed_connect_leaves_nothing_running(self):
+        comm = BLENotifySpiritCommunication(mac_address="00:00:00:00:00:00", client_factory=RefusingBleakClient,
+                                            timeout=1.0)
+        threads = threading.active_count()
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                comm.connect()
+        assert threading.active_count() == threads
+        assert comm._loop is None
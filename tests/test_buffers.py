@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from channelling_portal.buffers import MeasurementBuffer, euler_angles, y_rotations
+from channelling_portal.entities import Measurement, Quaternion
+
+
+class TestMeasurementBuffer:
+    @pytest.fixture
+    def buffer(self):
+        return MeasurementBuffer(maxlen=4)
+
+    def test_fills_up_to_maxlen(self, buffer):
+        for t in range(3):
+            buffer.append_values(t, 1.0, 0.0, 0.0, 0.0)
+        assert len(buffer) == 3 and not buffer.full
+        buffer.append_values(3, 1.0, 0.0, 0.0, 0.0)
+        assert buffer.full
+
+    def test_window_slides_in_order(self, buffer):
+        for t in range(11):
+            buffer.append_values(t, 1.0, 0.0, 0.1 * t, 0.0)
+        np.testing.assert_array_equal(buffer.timestamps, [7, 8, 9, 10])
+        np.testing.assert_allclose(buffer.quaternions[:, 2], [0.7, 0.8, 0.9, 1.0])
+
+    def test_window_is_a_contiguous_view(self, buffer):
+        for t in range(6):
+            buffer.append_values(t, 1.0, 0.0, 0.0, 0.0)
+        assert buffer.timestamps.base is not None
+        assert buffer.quaternions.flags.c_contiguous
+
+    def test_extend_matches_appending_one_by_one(self, buffer):
+        rng = np.random.default_rng(0)
+        quaternions = rng.uniform(-1, 1, (6, 4))
+        buffer.append_values(0, 1.0, 0.0, 0.0, 0.0)
+        buffer.extend(np.arange(1, 7), quaternions)
+        np.testing.assert_array_equal(buffer.timestamps, [3, 4, 5, 6])
+        np.testing.assert_array_equal(buffer.quaternions, quaternions[-4:])
+        np.testing.assert_allclose(buffer.y_rotations, y_rotations(quaternions[-4:]))
+
+    def test_drop_before_keeps_the_newest_samples(self, buffer):
+        for t in range(6):
+            buffer.append_values(10 * t, 1.0, 0.0, 0.0, 0.0)
+        buffer.drop_before(35)
+        np.testing.assert_array_equal(buffer.timestamps, [40, 50])
+        buffer.append_values(60, 1.0, 0.0, 0.0, 0.0)
+        np.testing.assert_array_equal(buffer.timestamps, [40, 50, 60])
+        buffer.drop_before(100)
+        assert not buffer
+
+    def test_append_measurement(self, buffer):
+        buffer.append(Measurement(timestamp=5, quaternion=Quaternion(qw=0.5, qx=0.5, qy=0.5, qz=0.5)))
+        np.testing.assert_array_equal(buffer.quaternions, [[0.5, 0.5, 0.5, 0.5]])
+
+    def test_y_rotation_is_derived_at_append(self, buffer):
+        for t in range(6):
+            buffer.append_values(t, 0.9, 0.1, 0.03 * t, -0.2)
+        np.testing.assert_allclose(buffer.y_rotations, y_rotations(buffer.quaternions))
+
+    def test_stored_euler_angles_match_vectorized(self):
+        buffer = MeasurementBuffer(maxlen=3, euler=True)
+        for t in range(5):
+            buffer.append_values(t, 0.8, 0.1 * t, 0.3, -0.1)
+        np.testing.assert_allclose(buffer.euler_angles, euler_angles(buffer.quaternions))
+        np.testing.assert_allclose(buffer.euler_angles[:, 1], buffer.y_rotations)
+
+
+def test_y_rotations_match_quaternion_model():
+    quaternion = Quaternion(qw=0.9, qx=0.1, qy=0.3, qz=-0.2)
+    components = np.array([[quaternion.qw, quaternion.qx, quaternion.qy, quaternion.qz]])
+    assert y_rotations(components)[0] == pytest.approx(quaternion.y_rotation())
@@ -1,12 +1,30 @@
+import os
+import time
+
+import numpy as np
 import pytest
 from unittest.mock import Mock, patch
-from channelling_portal.entities import Spirit, SpiritState, Measurement, Quaternion, SerialSpiritCommunication, BLESpiritCommunication, WifiSpiritCommunication
+from channelling_portal.entities import Spirit, SpiritState, Measurement, Quaternion, SerialSpiritCommunication, BLESpiritCommunication, WifiSpiritCommunication, parse_measurements, take_measurements
+from channelling_portal.frames import FrameFormat, encode_frames
+from channelling_portal.instrumentation import Instrumentation
+from channelling_portal.scoring import BatchScorer, ScoringEngine
+from channelling_portal.summoning import RotationSummoning, SummoningFunction
+
+
+class Sway(SummoningFunction):
+    name = "sway"
+    period = 1000.0
+
+    def __call__(self, times):
+        return 0.5 * np.sin(2 * np.pi * np.asarray(times, dtype=float) / self.period)
 
 
 class TestSpirit:
     @pytest.fixture
     def spirit(self):
         conduit_mock = Mock()
+        conduit_mock.measure.return_value = Measurement(
+            timestamp=0, quaternion=Quaternion(qw=1.0, qx=0.0, qy=0.0, qz=0.0))
         return Spirit(name="Test", color="Blue", conduit=conduit_mock, measurement_count=10)
 
     def test_measure_invokes_conduit_measure(self, spirit):
@@ -25,6 +43,261 @@ class TestSpirit:
         spirit.notify_state()
         spirit.conduit.notify_state.assert_called_once_with(spirit.state)
 
+    def test_state_is_inert_until_the_window_is_full(self, spirit):
+        for _ in range(9):
+            spirit.measure()
+        assert spirit.determine_state() == SpiritState.inert
+        spirit.measure()
+        assert spirit.determine_state() == SpiritState.dormant
+
+    def test_idle_rate_keeps_the_window_and_thresholds_in_time(self):
+        def awakened_after(period):
+            spirit = Spirit(name="Rated", color="Blue", conduit=Mock(), measurement_count=50, idle_rate=10)
+            times = np.arange(0, 3000, period)
+            for t, a in zip(times.tolist(), RotationSummoning()(times).tolist()):
+                spirit.process(Measurement.trusted(t, float(np.cos(a / 2)), 0.0, float(np.sin(a / 2)), 0.0))
+                if spirit.determine_state() == SpiritState.awakened:
+                    return t, len(spirit.measurements)
+
+        idle, full = awakened_after(100), awakened_after(10)
+        # The window spans the same half second, in 5 samples at 10 Hz or about 50 at 100 Hz
+        assert idle[1] == 5 and full[1] >= 49
+        assert abs(idle[0] - full[0]) <= 100
+
+    @pytest.mark.parametrize("scoring", [{}, {"window": 2}, {"downsample": 2}, {"resample_period": 15.0}])
+    def test_accepts_matches_the_exact_distance(self, scoring):
+        rng = np.random.default_rng(1)
+        spirit = Spirit(name="Cascade", color="Blue", conduit=Mock(), measurement_count=3, **scoring)
+        spirit.conduit.measure.side_effect = [
+            Measurement(timestamp=10 * i, quaternion=Quaternion(
+                qw=1.0, qx=0.0, qy=float(rng.choice([0.0, 0.001, 0.3])), qz=0.0))
+            for i in range(200)
+        ]
+        decisions = []
+        for _ in range(200):
+            decisions.append(spirit.accepts())
+            assert decisions[-1] == (spirit.dtw() < spirit.summoning.threshold)
+            spirit.measure()
+        assert any(decisions) and not all(decisions)
+
+    def test_burst_extends_the_window_and_repeats_the_newest_decision(self):
+        # The summoning movement, broken off for a while in the middle
+        times = np.arange(60) * 10
+        angles = RotationSummoning()(times)
+        angles[24:32] = 0.5
+        samples = np.array([[t, np.cos(a / 2), 0.0, np.sin(a / 2), 0.0] for t, a in zip(times, angles)])
+        single = Spirit(name="Single", color="Blue", conduit=Mock(), measurement_count=10)
+        burst = Spirit(name="Burst", color="Blue", conduit=Mock(), measurement_count=10,
+                       instrumentation=Instrumentation())
+        gauges = []
+        for start in range(0, 60, 4):
+            for sample in samples[start:start + 3].tolist():
+                single.measurements.append(Measurement.trusted(*sample))
+            single.process(Measurement.trusted(*samples[start + 3].tolist()))
+            gauge = burst.gauge
+            burst.process_samples(samples[start:start + 4])
+            np.testing.assert_array_equal(burst.measurements.timestamps, single.measurements.timestamps)
+            # The newest sample's decision holds for the whole burst
+            assert burst.gauge == (gauge + 4 if single.gauge else 0)
+            gauges.append(burst.gauge)
+        assert max(gauges) > 0 and burst.instrumentation.counters["samples"] == 60
+
+    def test_dance_reads_bursts_from_conduits_that_decode_them(self):
+        bursts = [np.array([[10 * (4 * b + i), 1.0, 0.0, 0.0, 0.0] for i in range(4)]) for b in range(5)]
+        conduit = Mock(spec=["connect", "disconnect", "notify_state", "measure", "measure_samples"])
+        conduit.measure_samples.side_effect = bursts + [EOFError()]
+        spirit = Spirit(name="Bursting", color="Blue", conduit=conduit, measurement_count=10, bursts=True,
+                        instrumentation=Instrumentation())
+        with pytest.raises(EOFError):
+            spirit.dance()
+        conduit.measure.assert_not_called()
+        assert spirit.instrumentation.counters["samples"] == 20
+        assert spirit.measurements.timestamps[-1] == 190
+
+    def test_downsampling_shortens_the_scored_series(self):
+        spirit = Spirit(name="Sweeping", color="Blue", conduit=Mock(), measurement_count=10,
+                        downsample=4, resample_period=20.0)
+        for i in range(10):
+            spirit.measurements.append(Measurement(
+                timestamp=10 * i, quaternion=Quaternion(qw=1.0, qx=0.0, qy=0.0, qz=0.0)))
+        template, values = spirit.scored_series()
+        # 90 ms on a 20 ms grid is 5 points, averaged in blocks of 4
+        assert len(template) == len(values) == 2
+
+    def test_resampling_a_window_across_a_clock_reset_scores_it_as_sampled(self):
+        spirit = Spirit(name="Rebooted", color="Blue", conduit=Mock(), measurement_count=10,
+                        resample_period=20.0)
+        # The device rebooted halfway through the window and its clock restarted
+        for timestamp in [400, 410, 420, 430, 440, 0, 10, 20, 30, 40]:
+            spirit.measurements.append(Measurement.trusted(timestamp, 1.0, 0.0, 0.0, 0.0))
+        template, values = spirit.scored_series()
+        assert len(template) == len(values) == 10
+        assert np.isfinite(spirit.dtw())
+        spirit.measurements.clear()
+        for _ in range(3):
+            spirit.measurements.append(Measurement.trusted(500, 1.0, 0.0, 0.0, 0.0))
+        assert len(spirit.scored_series()[0]) == 3
+
+    def test_summoning_axis_selects_the_scored_rotation(self):
+        roll = RotationSummoning(axis="x")
+        spirit = Spirit(name="Rolling", color="Blue", conduit=Mock(), measurement_count=5, summoning=roll)
+        for i in range(5):
+            # Half a radian of roll and none of pitch
+            spirit.measurements.append(Measurement(timestamp=10 * i, quaternion=Quaternion(
+                qw=float(np.cos(0.25)), qx=float(np.sin(0.25)), qy=0.0, qz=0.0)))
+        _, values = spirit.scored_series()
+        np.testing.assert_allclose(values, 0.5)
+
+    def test_threshold_comes_from_the_summoning_function(self):
+        lenient = Spirit(name="Lenient", color="Blue", conduit=Mock(), measurement_count=5,
+                         summoning=RotationSummoning(threshold=10.0))
+        for i in range(5):
+            lenient.measurements.append(Measurement(timestamp=10 * i, quaternion=Quaternion(
+                qw=1.0, qx=0.0, qy=0.0, qz=0.0)))
+        assert lenient.accepts() and lenient.dtw() >= 0.1
+
+    @pytest.mark.parametrize("phase_search", [True, False])
+    def test_phase_search_locks_on_early_in_the_cycle(self, phase_search):
+        sway = Sway()
+        spirit = Spirit(name="Sway", color="Blue", conduit=Mock(), measurement_count=30, summoning=sway,
+                        phase_search=phase_search)
+        # A holder already swaying, 370 ms into the cycle when the spirit starts listening
+        angles = sway(np.arange(300) * 10 + 370) + np.random.default_rng(0).normal(0, 0.005, 300)
+        spirit.conduit.measure.side_effect = [
+            Measurement.trusted(5000 + 10 * i, float(np.cos(angle / 2)), 0.0, float(np.sin(angle / 2)), 0.0)
+            for i, angle in enumerate(angles)
+        ]
+        locked = None
+        for i in range(300):
+            spirit.measure()
+            if spirit.gauge and locked is None:
+                locked = i
+        # A cycle is 100 samples; restarting at the window start waits for it to come round
+        if phase_search:
+            assert locked < 20 and spirit.gauge > 250
+        else:
+            assert locked > 50
+
+    def test_phase_search_falls_back_when_the_clock_goes_back(self):
+        spirit = Spirit(name="Rebooted", color="Blue", conduit=Mock(), measurement_count=5)
+        for timestamp in (900, 910, 920, 0, 10):
+            spirit.measurements.append(Measurement(
+                timestamp=timestamp, quaternion=Quaternion(qw=1.0, qx=0.0, qy=0.0, qz=0.0)))
+        assert spirit.search_phase() == 900
+
+    def test_batch_scoring_decides_as_each_spirit_alone(self):
+        sway = Sway()
+        rng = np.random.default_rng(2)
+
+        def spirits():
+            return [Spirit(name=f"Sway{i}", color="Blue", conduit=Mock(), measurement_count=20, summoning=sway,
+                           engine=engine, instrumentation=Instrumentation())
+                    for i, engine in enumerate([ScoringEngine.dtw, ScoringEngine.dtw, ScoringEngine.prefiltered] * 2)]
+
+        # Half the spirits follow the sway, the others see random motion
+        angles = [sway(np.arange(200) * 10 + 130 * i) + rng.normal(0, 0.005, 200) if i % 2
+                  else rng.uniform(-1, 1, 200) for i in range(6)]
+        samples = [[Measurement.trusted(10 * t, float(np.cos(a / 2)), 0.0, float(np.sin(a / 2)), 0.0)
+                    for t, a in enumerate(spirit_angles)] for spirit_angles in angles]
+        alone, batched = spirits(), spirits()
+        scorer = BatchScorer(workers=3)
+        for t in range(200):
+            for spirit, measurements in zip(alone, samples):
+                spirit.process(measurements[t])
+            scorer.score([(spirit, measurements[t]) for spirit, measurements in zip(batched, samples)])
+        scorer.shutdown()
+
+        for one, other in zip(alone, batched):
+            assert (one.gauge, one.time_zero) == (other.gauge, other.time_zero)
+            assert one.instrumentation.counters == other.instrumentation.counters
+        assert sum(spirit._cascade.exact for spirit in batched) > 0
+        assert any(spirit.gauge > 100 for spirit in batched)
+
+    def test_adaptive_spirit_lying_still_is_not_scored(self):
+        spirit = Spirit(name="Still", color="Blue", conduit=Mock(), measurement_count=10, adaptive=True,
+                        summoning=Sway(), instrumentation=Instrumentation())
+        jitter = np.random.default_rng(5).normal(0, 0.005, 100)
+        spirit.conduit.measure.side_effect = [
+            Measurement.trusted(10 * i, float(np.cos(a / 2)), 0.0, float(np.sin(a / 2)), 0.0)
+            for i, a in enumerate(jitter)
+        ]
+        for _ in range(100):
+            spirit.measure()
+            spirit.update_state()
+        counters = spirit.instrumentation.counters
+        assert counters["idle"] >= 90 and counters["rejected"] == 100
+        assert "dtw" not in spirit.instrumentation.stages and "phase" not in spirit.instrumentation.stages
+        assert spirit.state == SpiritState.dormant
+
+    def test_adaptive_spirit_scores_fully_once_interested(self):
+        sway = Sway()
+        spirit = Spirit(name="Sway", color="Blue", conduit=Mock(), measurement_count=20, summoning=sway,
+                        adaptive=True, instrumentation=Instrumentation())
+        angles = sway(np.arange(300) * 10 + 370) + np.random.default_rng(0).normal(0, 0.005, 300)
+        spirit.conduit.measure.side_effect = [
+            Measurement.trusted(10 * i, float(np.cos(a / 2)), 0.0, float(np.sin(a / 2)), 0.0)
+            for i, a in enumerate(angles)
+        ]
+        unscored = []
+        for _ in range(300):
+            spirit.measure()
+            spirit.update_state()
+            unscored.append((spirit.state, spirit.instrumentation.counters.get("unscored", 0)))
+        assert spirit.state == SpiritState.awakened
+        # Until the window fills, three samples in four repeat the last decision; then none do
+        inert = [count for state, count in unscored if state == SpiritState.inert]
+        scored = [count for state, count in unscored if state != SpiritState.inert]
+        assert inert[-1] > 0 and scored[0] == scored[-1]
+
+    def test_derivative_engine_follows_the_slope_and_resets_the_origin(self):
+        sway = Sway()
+        spirit = Spirit(name="Sway", color="Blue", conduit=Mock(), measurement_count=10, summoning=sway,
+                        engine=ScoringEngine.derivative)
+        angles = np.concatenate((sway(np.arange(50) * 10), np.zeros(10)))
+        spirit.conduit.measure.side_effect = [
+            Measurement.trusted(10 * i, float(np.cos(angle / 2)), 0.0, float(np.sin(angle / 2)), 0.0)
+            for i, angle in enumerate(angles)
+        ]
+        for _ in range(50):
+            spirit.measure()
+        assert spirit.gauge == 50 and spirit.time_zero == 0
+        # The holder stops mid-sway: after max_misses samples out of tolerance the origin restarts
+        spirit.measure()
+        assert spirit.gauge == 51
+        for _ in range(3):
+            spirit.measure()
+        assert spirit.gauge == 0 and spirit.time_zero == 530
+
+    def test_prefilter_skips_dtw_for_slope_misses(self):
+        spirit = Spirit(name="Prefiltered", color="Blue", conduit=Mock(), measurement_count=10,
+                        engine=ScoringEngine.prefiltered, summoning=Sway(), instrumentation=Instrumentation())
+        rng = np.random.default_rng(3)
+        spirit.conduit.measure.side_effect = [
+            Measurement.trusted(10 * i, 1.0, 0.0, float(rng.uniform(-0.7, 0.7)), 0.0) for i in range(100)
+        ]
+        for _ in range(100):
+            spirit.measure()
+        counters = spirit.instrumentation.snapshot()["counters"]
+        assert counters["prefiltered"] > 0
+        assert spirit.instrumentation.stages["dtw"].count <= 100 - counters["prefiltered"]
+
+
+class TestParseMeasurements:
+    def test_fast_path_matches_strict_validation(self):
+        lines = ["10,1.0,0.0,0.0,0.0", "20,0.5,-0.5,0.5,-0.5"]
+        assert parse_measurements(lines) == parse_measurements(lines, strict=True)
+
+    def test_strict_validation_rejects_out_of_range(self):
+        with pytest.raises(ValueError):
+            parse_measurements(["10,1.5,0.0,0.0,0.0"], strict=True)
+
+    @pytest.mark.parametrize("strict", [False, True])
+    def test_unusable_timestamps_are_counted_as_malformed(self, strict):
+        buffer = bytearray(b"10,1,0,0,0\ninf,1,0,0,0\n1e30,1,0,0,0\n20,1,0,0,0\n")
+        measurements, malformed = take_measurements(buffer, strict)
+        assert [measurement.timestamp for measurement in measurements] == [10, 20]
+        assert malformed == 2
+
 
 class TestSerialSpiritCommunication:
     @pytest.fixture
@@ -56,6 +329,13 @@ class TestBLESpiritCommunication:
         comm.disconnect()
         comm.peripheral.disconnect.assert_called_once()
 
+    def test_measure_reassembles_chunked_lines(self, comm):
+        comm.characteristic = Mock()
+        comm.characteristic.read.side_effect = [b"10,1.0,0.0,", b"0.0,0.0\n20,0.5,0.5,0.5,0.5\n"]
+        assert comm.measure().timestamp == 10
+        assert comm.measure().quaternion.qw == 0.5
+        assert comm.characteristic.read.call_count == 2
+
 class TestWifiSpiritCommunication:
     @pytest.fixture
     def comm(self):
@@ -70,3 +350,68 @@ class TestWifiSpiritCommunication:
         comm.connect()
         comm.disconnect()
         comm.server_socket.close.assert_called_once()
+
+
+class TestSerialSpiritCommunicationOverPty:
+    @pytest.fixture
+    def pty(self):
+        controller, device = os.openpty()
+        yield controller, os.ttyname(device)
+        os.close(controller)
+        os.close(device)
+
+    @pytest.fixture
+    def comm(self, pty):
+        comm = SerialSpiritCommunication(port=pty[1], baud_rate=115200, timeout=0.05)
+        comm.connect()
+        yield comm
+        comm.disconnect()
+
+    def test_measure_returns_every_line_of_a_burst(self, pty, comm):
+        os.write(pty[0], b"10,1.0,0.0,0.0,0.0\n20,1.0,0.0,0.0,0.0\n30,1.0,0.0")
+        assert comm.measure().timestamp == 10
+        assert comm.measure().timestamp == 20
+        os.write(pty[0], b",0.0,0.0\n")
+        assert comm.measure().timestamp == 30
+
+    def test_measure_batch_drains_the_burst(self, pty, comm):
+        os.write(pty[0], b"".join(b"%d,1.0,0.0,0.0,0.0\n" % t for t in range(50)))
+        time.sleep(0.05)
+        assert [m.timestamp for m in comm.measure_batch()] == list(range(50))
+
+    def test_partial_line_at_start_is_skipped(self, pty, comm):
+        os.write(pty[0], b"0.0,0.0\n10,1.0,0.0,0.0,0.0\n")
+        assert comm.measure().timestamp == 10
+        assert comm.malformed == 1
+
+    def test_notify_state_writes_to_the_device(self, pty, comm):
+        comm.notify_state(SpiritState.dormant)
+        time.sleep(0.05)
+        assert os.read(pty[0], 64) == b"format:text\nstate:dormant\n"
+
+    def test_request_rate_writes_to_the_device(self, pty, comm):
+        comm.request_rate(10)
+        time.sleep(0.05)
+        assert os.read(pty[0], 64) == b"format:text\nrate:10\n"
+
+    def test_binary_frames_are_negotiated_and_decoded(self, pty):
+        comm = SerialSpiritCommunication(port=pty[1], baud_rate=115200, timeout=0.05, frame_format=FrameFormat.binary)
+        comm.connect()
+        try:
+            time.sleep(0.05)
+            assert os.read(pty[0], 64) == b"format:binary\n"
+            os.write(pty[0], b"10,1.0,0.0,0.0,0.0\n" + encode_frames([[20, 1.0, 0.0, 0.0, 0.0], [30, 0.0, 1.0, 0.0, 0.0]]))
+            assert [m.timestamp for m in (comm.measure(), comm.measure())] == [20, 30]
+        finally:
+            comm.disconnect()
+
+    def test_measure_samples_decodes_frames_into_an_array(self, pty):
+        comm = SerialSpiritCommunication(port=pty[1], baud_rate=115200, timeout=0.05, frame_format=FrameFormat.binary)
+        comm.connect()
+        try:
+            samples = [[20, 1.0, 0.0, 0.0, 0.0], [30, 0.0, 1.0, 0.0, 0.0]]
+            os.write(pty[0], encode_frames(samples))
+            time.sleep(0.05)
+            np.testing.assert_allclose(comm.measure_samples(), samples)
+        finally:
+            comm.disconnect()
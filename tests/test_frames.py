@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from channelling_portal.frames import FRAME_SIZE, encode_frames, frame_crc, parse_sample, parse_samples, take_frames
+
+
+class TestParseSamples:
+    def test_parses_a_batch_of_lines(self):
+        samples = parse_samples(["10,1.0,0.0,0.0,0.0\r\n", b"20,0.5,-0.5,0.5,-0.5\n"])
+        np.testing.assert_array_equal(samples, [[10, 1, 0, 0, 0], [20, 0.5, -0.5, 0.5, -0.5]])
+
+    def test_skips_blank_lines(self):
+        assert parse_samples(["", "\n"]).shape == (0, 5)
+
+    def test_rejects_out_of_range_components(self):
+        with pytest.raises(ValueError):
+            parse_samples(["10,1.0,0.0,0.0,0.0", "20,1.5,0.0,0.0,0.0"])
+
+    def test_rejects_incomplete_samples(self):
+        with pytest.raises(ValueError):
+            parse_samples(["10,1.0,0.0,0.0"])
+
+    def test_rejects_a_short_line_next_to_a_long_one(self):
+        with pytest.raises(ValueError):
+            parse_samples(["10,1.0,0.0,0.0", "0.0,20,0.5,0.5,0.5,0.5"])
+
+    @pytest.mark.parametrize("timestamp", ["inf", "nan", "1e30"])
+    def test_rejects_timestamps_outside_int64(self, timestamp):
+        with pytest.raises(ValueError):
+            parse_samples(["10,1.0,0.0,0.0,0.0", f"{timestamp},1.0,0.0,0.0,0.0"])
+
+    def test_rejects_garbage(self):
+        with pytest.raises(ValueError):
+            parse_samples(["Quaternion: 1.0, 0.0, 0.0, 0.0"])
+
+
+class TestParseSample:
+    def test_matches_batch_parsing(self):
+        line = "20,0.5,-0.5,0.5,-0.5\n"
+        assert parse_sample(line) == parse_samples([line])[0].tolist()
+
+    @pytest.mark.parametrize("line", ["10,1.5,0.0,0.0,0.0", "10,1.0,0.0,0.0", "10,nan,0,0,0",
+                                      "inf,1,0,0,0", "1e30,1,0,0,0"])
+    def test_rejects_invalid_samples(self, line):
+        with pytest.raises(ValueError):
+            parse_sample(line)
+
+
+class TestBinaryFrames:
+    @pytest.fixture
+    def samples(self):
+        rng = np.random.default_rng(0)
+        return np.column_stack([np.arange(100) * 10, rng.uniform(-1, 1, (100, 4))])
+
+    def test_round_trip_within_quantization(self, samples):
+        decoded, skipped = take_frames(bytearray(encode_frames(samples)))
+        assert skipped == 0
+        np.testing.assert_allclose(decoded, samples, atol=1 / 32767)
+
+    def test_frames_are_fifteen_bytes(self, samples):
+        assert len(encode_frames(samples)) == 100 * FRAME_SIZE == 1500
+
+    def test_keeps_partial_frame_for_the_next_read(self, samples):
+        data = encode_frames(samples)
+        buffer = bytearray(data[:10 * FRAME_SIZE + 4])
+        assert len(take_frames(buffer)[0]) == 10
+        buffer += data[10 * FRAME_SIZE + 4:]
+        assert len(take_frames(buffer)[0]) == 90
+
+    def test_resynchronizes_after_garbage_and_corruption(self, samples):
+        data = bytearray(b"Quaternion: 1.0\n" + encode_frames(samples))
+        data[16 + 5 * FRAME_SIZE + 7] ^= 0xFF
+        decoded, skipped = take_frames(data)
+        assert len(decoded) == 99
+        assert 5 * 10 not in decoded[:, 0]
+        assert skipped >= 16
+
+    def test_crc_matches_reference(self):
+        # CRC-8/SMBUS check value
+        assert frame_crc(np.frombuffer(b"123456789", dtype=np.uint8)[None, :])[0] == 0xF4
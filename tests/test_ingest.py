@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from channelling_portal.entities import Measurement, Spirit
+from channelling_portal.ingest import AsyncIngestQueue, BackpressurePolicy, IngestQueue
+from channelling_portal.instrumentation import Instrumentation
+
+
+def measurement(timestamp):
+    return Measurement.trusted(timestamp, 1.0, 0.0, 0.0, 0.0)
+
+
+class FastConduit:
+    """A device far faster than scoring, ending after ``count`` samples."""
+
+    def __init__(self, count):
+        self.timestamps = iter(range(0, 10 * count, 10))
+        self.states = []
+
+    def measure(self):
+        try:
+            return measurement(next(self.timestamps))
+        except StopIteration:
+            raise EOFError("End of samples") from None
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def notify_state(self, state):
+        self.states.append(state)
+
+
+class TestIngestQueue:
+    def test_all_holds_the_reader_back(self):
+        ingest = IngestQueue(size=2)
+        ingest.put(measurement(0))
+        ingest.put(measurement(10))
+        blocked = threading.Thread(target=ingest.put, args=(measurement(20),))
+        blocked.start()
+        time.sleep(0.05)
+        assert blocked.is_alive() and ingest.depth == 2
+        assert ingest.get().timestamp == 0
+        blocked.join(1)
+        assert [ingest.get().timestamp for _ in range(2)] == [10, 20]
+        assert ingest.dropped == 0
+
+    def test_newest_drops_the_oldest(self):
+        ingest = IngestQueue(size=3, policy=BackpressurePolicy.newest, instrumentation=Instrumentation())
+        for timestamp in range(0, 100, 10):
+            ingest.put(measurement(timestamp))
+        assert ingest.depth == 3 and ingest.dropped == 7
+        assert [ingest.get().timestamp for _ in range(3)] == [70, 80, 90]
+        assert ingest.instrumentation.counters == {"ingest_dropped": 7}
+        assert ingest.instrumentation.stages["queue"].count == 3
+
+    def test_stride_queues_every_kth_sample(self):
+        ingest = IngestQueue(size=8, policy=BackpressurePolicy.stride, stride=3)
+        for timestamp in range(0, 100, 10):
+            ingest.put(measurement(timestamp))
+        assert ingest.received == 10 and ingest.skipped == 6
+        assert [ingest.get().timestamp for _ in range(ingest.depth)] == [0, 30, 60, 90]
+
+    def test_reader_error_follows_the_samples_read_before_it(self):
+        ingest = IngestQueue(size=16)
+        ingest.start(FastConduit(3).measure)
+        assert [ingest.get().timestamp for _ in range(3)] == [0, 10, 20]
+        with pytest.raises(EOFError):
+            ingest.get()
+        ingest.stop()
+
+    def test_dance_stays_close_to_the_device_under_overload(self):
+        spirit = Spirit(name="Overloaded", color="Blue", conduit=FastConduit(3000), measurement_count=20,
+                        ingest_policy=BackpressurePolicy.newest, ingest_queue_size=8)
+        with pytest.raises(EOFError):
+            spirit.dance()
+        assert spirit.ingest.received == 3000
+        assert spirit.ingest.dropped > 0
+        # What was scored last is at most a queue behind what was read last
+        assert spirit.measurements.timestamps[-1] >= 10 * (3000 - 1 - 8)
+
+
+class TestAsyncIngestQueue:
+    def test_newest_drops_the_oldest_on_the_event_loop(self):
+        conduit = FastConduit(50)
+
+        async def measure():
+            await asyncio.sleep(0)
+            return conduit.measure()
+
+        async def ingest_all():
+            ingest = AsyncIngestQueue(size=4, policy=BackpressurePolicy.newest)
+            ingest.start(measure)
+            await asyncio.sleep(0.05)
+            received = []
+            with pytest.raises(EOFError):
+                while True:
+                    received.append((await ingest.get()).timestamp)
+            await ingest.stop()
+            return ingest, received
+
+        ingest, received = asyncio.run(ingest_all())
+        assert received == [460, 470, 480, 490]
+        assert ingest.dropped == 46
@@ -0,0 +1,86 @@
+import io
+import json
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+from channelling_portal.entities import Measurement, Quaternion, Spirit
+from channelling_portal.instrumentation import Instrumentation, LatencyHistogram, NullInstrumentation
+
+
+class TestLatencyHistogram:
+    def test_percentiles_are_within_a_bucket(self):
+        histogram = LatencyHistogram()
+        latencies = np.random.default_rng(0).integers(1_000, 1_000_000, 5_000)
+        for latency in latencies.tolist():
+            histogram.record(latency)
+        for percent in (50, 90, 99):
+            exact = np.percentile(latencies, percent)
+            assert exact <= histogram.percentile(percent) <= 1.25 * exact
+
+    def test_summarizes_counts_and_extremes(self):
+        histogram = LatencyHistogram()
+        for latency in (0, 3, 2_000):
+            histogram.record(latency)
+        summary = histogram.summary()
+        assert summary["count"] == 3
+        assert summary["max_us"] == 2.0
+        assert histogram.percentile(100) == 2_000
+
+
+class TestInstrumentation:
+    def test_chains_stage_timings(self):
+        instrumentation = Instrumentation()
+        start = instrumentation.clock()
+        start = instrumentation.record("first", start)
+        instrumentation.record("second", start)
+        instrumentation.count("samples", 2)
+        snapshot = instrumentation.snapshot()
+        assert set(snapshot["stages"]) == {"first", "second"}
+        assert snapshot["counters"] == {"samples": 2}
+        assert snapshot["rates_per_s"]["samples"] > 0
+
+    def test_dumps_json(self, tmp_path):
+        path = tmp_path / "stages.json"
+        instrumentation = Instrumentation(path=str(path))
+        instrumentation.count("samples")
+        instrumentation.dump()
+        assert json.loads(path.read_text())["counters"] == {"samples": 1}
+
+    def test_null_instrumentation_records_nothing(self):
+        instrumentation = NullInstrumentation()
+        instrumentation.record("dtw", instrumentation.clock())
+        instrumentation.count("samples")
+        output = io.StringIO()
+        instrumentation.dump(output)
+        assert not instrumentation.stages and not instrumentation.counters and not output.getvalue()
+
+
+class TestSpiritInstrumentation:
+    @pytest.fixture
+    def spirit(self):
+        conduit = Mock()
+        timestamps = iter(range(0, 10_000, 10))
+        conduit.measure.side_effect = lambda: Measurement(
+            timestamp=next(timestamps), quaternion=Quaternion(qw=1.0, qx=0.0, qy=0.0, qz=0.0))
+        return Spirit(name="Spirit", color="Blue", conduit=conduit, measurement_count=5,
+                      instrumentation=Instrumentation())
+
+    def test_records_every_stage(self, spirit):
+        for _ in range(8):
+            spirit.measure()
+            if spirit.update_state():
+                spirit.notify_state()
+        snapshot = spirit.instrumentation.snapshot()
+        assert {"read", "template", "dtw", "process", "notify"} <= set(snapshot["stages"])
+        assert snapshot["stages"]["read"]["count"] == 8
+        counters = snapshot["counters"]
+        assert counters["samples"] == counters["accepted"] + counters["rejected"] == 8
+        assert counters["transitions"] == counters["state:dormant"] == 1
+
+    def test_dance_dumps_at_shutdown(self, spirit, tmp_path):
+        spirit.instrumentation.path = str(tmp_path / "dance.json")
+        spirit.conduit.measure.side_effect = KeyboardInterrupt
+        with pytest.raises(KeyboardInterrupt):
+            spirit.dance()
+        assert json.loads((tmp_path / "dance.json").read_text())["stages"] == {}
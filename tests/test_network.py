@@ -0,0 +1,250 @@
+import socket
+import threading
+import time
+
+import pytest
+from channelling_portal import network
+from channelling_portal.entities import SpiritState
+from channelling_portal.network import UDPSpiritServer, WifiSpiritServer
+from channelling_portal.osc import decode_packet, encode_bundle, encode_message
+
+
+def wait_until(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestWifiSpiritServer:
+    @pytest.fixture
+    def server(self):
+        server = WifiSpiritServer(ip_address="127.0.0.1", port=0)
+        thunder, rain = server.conduit("thunder"), server.conduit("rain")
+        thunder.connect()
+        rain.connect()
+        yield server
+        server.stop(force=True)
+
+    def device(self, server, device_id):
+        sock = socket.create_connection(server.address)
+        sock.sendall(f"spirit:{device_id}\n".encode())
+        assert wait_until(lambda: server.connected(device_id))
+        return sock
+
+    def test_routes_each_device_to_its_conduit(self, server):
+        thunder, rain = self.device(server, "thunder"), self.device(server, "rain")
+        thunder.sendall(b"10,1.0,0.0,0.0,0.0\n")
+        rain.sendall(b"20,0.5,0.5,0.5,0.5\n")
+        assert server.conduit("thunder").measure().timestamp == 10
+        assert server.conduit("rain").measure().timestamp == 20
+
+    def test_frames_split_and_coalesced_records(self, server):
+        thunder = self.device(server, "thunder")
+        thunder.sendall(b"10,1.0,0.0,0.0")
+        time.sleep(0.05)
+        thunder.sendall(b",0.0\n20,1.0,0.0,0.0,0.0\n30,1.0,0.0,0.0,0.0\n")
+        timestamps = [server.conduit("thunder").measure().timestamp for _ in range(3)]
+        assert timestamps == [10, 20, 30]
+
+    def test_notify_state_reaches_the_matching_device(self, server):
+        thunder, rain = self.device(server, "thunder"), self.device(server, "rain")
+        server.conduit("rain").notify_state(SpiritState.awakened)
+        rain.settimeout(1)
+        assert rain.recv(64) == b"state:awakened\n"
+
+    def test_request_rate_reaches_the_matching_device(self, server):
+        thunder = self.device(server, "thunder")
+        server.conduit("thunder").request_rate(25)
+        thunder.settimeout(1)
+        assert thunder.recv(64) == b"rate:25\n"
+
+    def test_device_without_hello_is_known_by_its_address(self, server):
+        conduit = server.conduit("127.0.0.1")
+        device = socket.create_connection(server.address)
+        device.sendall(b"10,1.0,0.0,0.0,0.0\n20,1.0,0.0,0.0,0.0\n")
+        assert [conduit.measure().timestamp for _ in range(2)] == [10, 20]
+        conduit.notify_state(SpiritState.dormant)
+        device.settimeout(1)
+        assert device.recv(64) == b"state:dormant\n"
+
+    def test_writes_are_queued_in_order(self, server):
+        thunder = self.device(server, "thunder")
+        conduit = server.conduit("thunder")
+        for state in (SpiritState.dormant, SpiritState.interested):
+            conduit.notify_state(state)
+        conduit.request_rate(100)
+        thunder.settimeout(1)
+        expected = b"state:dormant\nstate:interested\nrate:100\n"
+        received = b""
+        while len(received) < len(expected):
+            received += thunder.recv(64)
+        assert received == expected
+
+    def test_closed_connection_ends_the_device_read(self, server):
+        thunder = self.device(server, "thunder")
+        thunder.sendall(b"10,1.0,0.0,0.0,0.0\n")
+        conduit = server.conduit("thunder")
+        assert conduit.measure().timestamp == 10
+        thunder.close()
+        with pytest.raises(ConnectionError):
+            conduit.measure()
+
+    def test_a_failing_connection_leaves_the_others_served(self, server, monkeypatch):
+        parse = network.take_measurements
+
+        def take_measurements(buffer, strict):
+            if b"boom" in buffer:
+                raise RuntimeError("parser bug")
+            return parse(buffer, strict)
+
+        monkeypatch.setattr(network, "take_measurements", take_measurements)
+        thunder, rain = self.device(server, "thunder"), self.device(server, "rain")
+        thunder.sendall(b"boom\n")
+        assert wait_until(lambda: not server.connected("thunder"))
+        assert server.errors == 1
+        rain.sendall(b"10,1.0,0.0,0.0,0.0\n")
+        assert server.conduit("rain").measure().timestamp == 10
+        with pytest.raises(ConnectionError):
+            server.conduit("thunder").measure()
+
+    def test_silent_device_times_out(self, server):
+        conduit = server.conduit("rain")
+        conduit.silence_timeout = 0.05
+        with pytest.raises(TimeoutError):
+            conduit.measure()
+
+    def test_server_stops_after_the_last_conduit_disconnects(self, server):
+        server.conduit("thunder").disconnect()
+        assert server._running.is_set()
+        server.conduit("rain").disconnect()
+        assert not server._running.is_set()
+
+    def test_disconnect_and_stop_end_a_waiting_read(self, server):
+        errors = []
+
+        def read(conduit):
+            try:
+                conduit.measure()
+            except ConnectionError as error:
+                errors.append(error)
+
+        readers = [threading.Thread(target=read, args=(server.conduit(device_id),))
+                   for device_id in ("thunder", "rain")]
+        for reader in readers:
+            reader.start()
+        server.conduit("thunder").disconnect()
+        readers[0].join(1)
+        assert len(errors) == 1 and server._running.is_set()
+        server.stop(force=True)
+        readers[1].join(1)
+        assert len(errors) == 2
+
+    def test_reconnecting_forgets_the_earlier_disconnect(self, server):
+        conduit = server.conduit("thunder")
+        conduit.disconnect()
+        conduit.connect()
+        thunder = self.device(server, "thunder")
+        thunder.sendall(b"10,1.0,0.0,0.0,0.0\n")
+        assert conduit.measure().timestamp == 10
+
+
+def sample(device_id, timestamp):
+    return encode_message(f"/spirit/{device_id}/quaternion", "iffff", timestamp, 1.0, 0.0, 0.0, 0.0)
+
+
+class TestUDPSpiritServer:
+    @pytest.fixture
+    def server(self):
+        server = UDPSpiritServer(ip_address="127.0.0.1", port=0, reorder_window=20)
+        server.conduit("thunder").connect()
+        server.conduit("rain").connect()
+        yield server
+        server.stop(force=True)
+
+    @pytest.fixture
+    def unstarted(self):
+        # No selector thread to release quiet devices between the batches fed by hand
+        server = UDPSpiritServer(ip_address="127.0.0.1", port=0, reorder_window=20)
+        server.conduit("thunder")
+        return server
+
+    def test_routes_datagrams_from_many_devices(self, server):
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for timestamp in range(0, 100, 10):
+            sender.sendto(encode_bundle(sample("thunder", timestamp), sample("rain", timestamp + 1)), server.address)
+        thunder = [server.conduit("thunder").measure().timestamp for _ in range(8)]
+        rain = [server.conduit("rain").measure().timestamp for _ in range(8)]
+        assert thunder == list(range(0, 80, 10))
+        assert rain == list(range(1, 81, 10))
+
+    def test_reorders_within_the_window_and_drops_late_samples(self, unstarted):
+        address = ("127.0.0.1", 9)
+        unstarted.receive([(sample("thunder", t), address) for t in (10, 30, 20, 40, 60)])
+        unstarted.receive([(sample("thunder", 5), address), (sample("thunder", 50), address)])
+        assert [m.timestamp for m in unstarted.conduit("thunder").measure_batch()] == [10, 20, 30, 40]
+        assert unstarted.late == 1
+
+    def test_counts_malformed_datagrams(self, unstarted):
+        unstarted.receive([(b"garbage", ("127.0.0.1", 9)), (encode_message("/other", "i", 1), ("127.0.0.1", 9))])
+        assert unstarted.malformed == 2
+
+    def test_wrong_argument_types_are_malformed(self, unstarted):
+        address = ("127.0.0.1", 9)
+        unstarted.receive([
+            (encode_message("/spirit/thunder/quaternion", "sffff", "10", 1.0, 0.0, 0.0, 0.0), address),
+            (encode_message("/spirit/thunder/quaternion", "issss", 10, "1", "0", "0", "0"), address),
+            (encode_message("/spirit/thunder/quaternion", "dffff", 10.0, 1.0, 0.0, 0.0, 0.0), address),
+        ])
+        assert unstarted.malformed == 3
+        # The server goes on routing the next well-formed samples
+        unstarted.receive([(sample("thunder", t), address) for t in (10, 40)])
+        assert unstarted.conduit("thunder").measure().timestamp == 10
+
+    def test_a_datagram_failing_to_route_leaves_the_rest_of_the_batch(self, unstarted, monkeypatch):
+        decode = network.decode_packet
+
+        def decode_packet(packet):
+            if packet == b"boom":
+                raise RuntimeError("decoder bug")
+            return decode(packet)
+
+        monkeypatch.setattr(network, "decode_packet", decode_packet)
+        address = ("127.0.0.1", 9)
+        unstarted.receive([(sample("thunder", 10), address), (b"boom", address), (sample("thunder", 40), address)])
+        assert unstarted.errors == 1
+        assert unstarted.conduit("thunder").measure().timestamp == 10
+
+    def test_clock_restart_is_not_late(self, unstarted):
+        address = ("127.0.0.1", 9)
+        unstarted.receive([(sample("thunder", t), address) for t in range(5000, 5100, 10)])
+        # The device rebooted: its clock starts over, with a straggler from before
+        unstarted.receive([(sample("thunder", 5050), address)])
+        unstarted.receive([(sample("thunder", t), address) for t in range(0, 100, 10)])
+        timestamps = [m.timestamp for m in unstarted.conduit("thunder").measure_batch()]
+        assert timestamps == list(range(5000, 5100, 10)) + list(range(0, 80, 10))
+        assert unstarted.late == 1 and unstarted.restarts == 1
+
+    def test_quiet_device_has_its_held_samples_released(self, unstarted):
+        address = ("127.0.0.1", 9)
+        unstarted.receive([(sample("thunder", t), address) for t in range(10, 70, 10)])
+        assert [m.timestamp for m in unstarted.conduit("thunder").measure_batch()] == [10, 20, 30, 40]
+        unstarted.release_quiet(time.monotonic() + 0.02)
+        assert [m.timestamp for m in unstarted.conduit("thunder").measure_batch()] == [50, 60]
+
+    def test_last_samples_arrive_after_the_device_goes_quiet(self, server):
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sender.sendto(encode_bundle(*(sample("thunder", t) for t in range(0, 100, 10))), server.address)
+        server.conduit("thunder").silence_timeout = 1
+        assert [server.conduit("thunder").measure().timestamp for _ in range(10)] == list(range(0, 100, 10))
+
+    def test_notify_state_answers_the_device_address(self, server):
+        device = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        device.bind(("127.0.0.1", 0))
+        device.settimeout(1)
+        device.sendto(sample("rain", 10), server.address)
+        assert wait_until(lambda: server.connected("rain"))
+        server.conduit("rain").notify_state(SpiritState.interested)
+        assert decode_packet(device.recv(256)) == [("/spirit/rain/state", ["interested"])]
+        server.conduit("rain").request_rate(100)
+        assert decode_packet(device.recv(256)) == [("/spirit/rain/rate", [100])]
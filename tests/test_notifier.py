@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from channelling_portal.entities import SpiritState
+from channelling_portal.instrumentation import Instrumentation
+from channelling_portal.notifier import AsyncStateNotifier, StateNotifier
+
+
+class SlowConduit:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.states = []
+        self.writing = threading.Event()
+        self.fail = False
+
+    def notify_state(self, state):
+        self.writing.set()
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("unplugged")
+        self.states.append(state)
+
+
+class AsyncConduit:
+    def __init__(self):
+        self.states = []
+
+    async def notify_state(self, state):
+        await asyncio.sleep(0.01)
+        self.states.append(state)
+
+
+@pytest.fixture
+def conduit():
+    return SlowConduit(delay=0.1)
+
+
+class TestStateNotifier:
+    def test_submit_does_not_wait_for_the_write(self, conduit):
+        notifier = StateNotifier(conduit, instrumentation=Instrumentation())
+        notifier.start()
+        start = time.perf_counter()
+        notifier.submit(SpiritState.dormant)
+        assert conduit.writing.wait(1)
+        notifier.submit(SpiritState.interested)
+        notifier.submit(SpiritState.awakened)
+        assert time.perf_counter() - start < 0.05
+        notifier.stop()
+
+        # The write in flight finished, the latest state replaced the one waiting behind it
+        assert conduit.states == [SpiritState.dormant, SpiritState.awakened]
+        assert notifier.sent == 2 and notifier.coalesced == 1
+        snapshot = notifier.instrumentation.snapshot()
+        assert snapshot["stages"]["notify"]["count"] == 2
+        assert snapshot["stages"]["notify"]["max_us"] >= 100_000
+        assert snapshot["counters"] == {"notify_coalesced": 1}
+
+    def test_debounce_drops_flapping(self):
+        conduit = SlowConduit()
+        notifier = StateNotifier(conduit, debounce=0.05)
+        notifier.start()
+        notifier.submit(SpiritState.dormant)
+        time.sleep(0.15)
+        assert conduit.states == [SpiritState.dormant]
+        notifier.submit(SpiritState.interested)
+        notifier.submit(SpiritState.dormant)
+        time.sleep(0.15)
+        notifier.stop()
+        assert conduit.states == [SpiritState.dormant]
+        assert notifier.coalesced == 1
+
+    def test_stop_flushes_a_debounced_state(self):
+        conduit = SlowConduit()
+        notifier = StateNotifier(conduit, debounce=10)
+        notifier.start()
+        notifier.submit(SpiritState.awakened)
+        notifier.stop()
+        assert conduit.states == [SpiritState.awakened]
+
+    def test_failed_write_is_raised_by_the_next_submit(self):
+        conduit = SlowConduit()
+        conduit.fail = True
+        notifier = StateNotifier(conduit)
+        notifier.start()
+        notifier.submit(SpiritState.dormant)
+        notifier.stop()
+        assert notifier.failed == 1
+        with pytest.raises(ConnectionError):
+            notifier.submit(SpiritState.dormant)
+        # Raised once, and the state the device never got is written again
+        conduit.fail = False
+        notifier.start()
+        notifier.submit(SpiritState.dormant)
+        notifier.stop()
+        assert conduit.states == [SpiritState.dormant]
+
+
+class TestAsyncStateNotifier:
+    def test_coalesces_on_the_event_loop(self):
+        conduit = AsyncConduit()
+
+        async def notify():
+            notifier = AsyncStateNotifier(conduit)
+            notifier.start()
+            notifier.submit(SpiritState.dormant)
+            await asyncio.sleep(0)
+            notifier.submit(SpiritState.interested)
+            notifier.submit(SpiritState.awakened)
+            await notifier.stop()
+            return notifier
+
+        notifier = asyncio.run(notify())
+        assert conduit.states == [SpiritState.dormant, SpiritState.awakened]
+        assert notifier.coalesced == 1
+
+
+class RateConduit(SlowConduit):
+    def __init__(self):
+        super().__init__()
+        self.rates = []
+
+    def request_rate(self, rate_hz):
+        self.rates.append(rate_hz)
+
+
+class TestRateRequests:
+    @staticmethod
+    def rates(state):
+        return 100 if state in (SpiritState.interested, SpiritState.awakened) else 10
+
+    def test_rate_follows_written_states_only_when_it_changes(self):
+        conduit = RateConduit()
+        notifier = StateNotifier(conduit, rates=self.rates)
+        notifier.start()
+        for state in (SpiritState.dormant, SpiritState.interested, SpiritState.awakened, SpiritState.dormant):
+            notifier.submit(state)
+            time.sleep(0.02)
+        notifier.stop()
+        assert conduit.states == [SpiritState.dormant, SpiritState.interested, SpiritState.awakened,
+                                  SpiritState.dormant]
+        assert conduit.rates == [10, 100, 10]
+
+    def test_conduits_without_rate_control_are_left_alone(self):
+        conduit = SlowConduit()
+        notifier = StateNotifier(conduit, rates=self.rates)
+        notifier.start()
+        notifier.submit(SpiritState.awakened)
+        notifier.stop()
+        assert conduit.states == [SpiritState.awakened] and notifier.failed == 0
@@ -0,0 +1,24 @@
+import pytest
+from channelling_portal.osc import decode_packet, encode_bundle, encode_message
+
+
+class TestOsc:
+    def test_message_round_trip(self):
+        packet = encode_message("/spirit/thunder/quaternion", "idddd", 10, 1.0, 0.0, -0.5, 0.25)
+        assert decode_packet(packet) == [("/spirit/thunder/quaternion", [10, 1.0, 0.0, -0.5, 0.25])]
+
+    def test_strings_are_padded_to_four_bytes(self):
+        packet = encode_message("/abc", "s", "dormant")
+        assert len(packet) % 4 == 0
+        assert decode_packet(packet) == [("/abc", ["dormant"])]
+
+    def test_bundle_flattens_messages(self):
+        first = encode_message("/spirit/a/quaternion", "hffff", 10, 1.0, 0.0, 0.0, 0.0)
+        second = encode_message("/spirit/b/quaternion", "hffff", 20, 1.0, 0.0, 0.0, 0.0)
+        addresses = [address for address, _ in decode_packet(encode_bundle(first, second))]
+        assert addresses == ["/spirit/a/quaternion", "/spirit/b/quaternion"]
+
+    @pytest.mark.parametrize("packet", [b"/spirit", b"/spirit\x00\x00\x00\x00\x00\x00\x00", b"/a\x00\x00,x\x00\x00"])
+    def test_malformed_packets_raise_value_error(self, packet):
+        with pytest.raises(ValueError):
+            decode_packet(packet)
@@ -0,0 +1,103 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from channelling_portal.entities import Measurement, Quaternion, Spirit, SpiritState
+from channelling_portal.portal import ExecutorSpiritCommunication, Portal
+from channelling_portal.scoring import BatchScorer, DTWJob
+
+
+class BlockingConduit:
+    def __init__(self, delay):
+        self.delay = delay
+        self.timestamp = 0
+        self.states = []
+        self.connected = False
+
+    def measure(self):
+        time.sleep(self.delay)
+        self.timestamp += 10
+        return Measurement(timestamp=self.timestamp, quaternion=Quaternion(qw=1.0, qx=0.0, qy=0.0, qz=0.0))
+
+    def connect(self):
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+    def notify_state(self, state):
+        self.states.append(state)
+
+
+class FailingConduit(BlockingConduit):
+    def measure(self):
+        raise ConnectionError("unplugged")
+
+
+async def dance_for(portal, seconds):
+    run = asyncio.create_task(portal.run())
+    await asyncio.sleep(seconds)
+    portal.stop()
+    return await run
+
+
+class TestPortal:
+    def test_wraps_blocking_conduits_in_the_executor(self):
+        portal = Portal([Spirit(name="Test", color="Blue", conduit=BlockingConduit(0), measurement_count=5)])
+        assert isinstance(portal.conduits["Test"], ExecutorSpiritCommunication)
+
+    def test_rejects_spirits_with_the_same_name(self):
+        spirits = [Spirit(name="Twin", color=color, conduit=BlockingConduit(0), measurement_count=5)
+                   for color in ("Blue", "Red")]
+        with pytest.raises(ValueError, match="Twin"):
+            Portal(spirits)
+
+    def test_shuts_down_only_the_executor_it_created(self):
+        spirit = Spirit(name="Test", color="Blue", conduit=BlockingConduit(0.001), measurement_count=5)
+        portal = Portal([spirit])
+        asyncio.run(dance_for(portal, 0.05))
+        assert portal.executor._shutdown
+        assert not spirit.conduit.connected
+
+        executor = ThreadPoolExecutor(2)
+        try:
+            portal = Portal([spirit], executor=executor)
+            asyncio.run(dance_for(portal, 0.05))
+            assert not executor._shutdown
+        finally:
+            executor.shutdown()
+
+    def test_slow_device_does_not_stall_the_rest(self):
+        fast = Spirit(name="Fast", color="Blue", conduit=BlockingConduit(0.001), measurement_count=5)
+        slow = Spirit(name="Slow", color="Red", conduit=BlockingConduit(0.5), measurement_count=5)
+        errors = asyncio.run(dance_for(Portal([fast, slow]), 0.3))
+
+        assert errors == {}
+        assert len(fast.measurements) == 5
+        assert fast.conduit.states[0] == SpiritState.dormant
+        assert len(slow.measurements) == 0
+
+    def test_failing_spirit_is_reported_without_stopping_others(self):
+        healthy = Spirit(name="Healthy", color="Blue", conduit=BlockingConduit(0.001), measurement_count=5)
+        broken = Spirit(name="Broken", color="Red", conduit=FailingConduit(0), measurement_count=5)
+        errors = asyncio.run(dance_for(Portal([healthy, broken]), 0.1))
+
+        assert isinstance(errors["Broken"], ConnectionError)
+        assert not broken.conduit.connected
+        assert len(healthy.measurements) == 5
+
+    def test_batch_scorer_scores_every_spirit(self):
+        spirits = [Spirit(name=f"Batched{i}", color="Blue", conduit=BlockingConduit(0.001), measurement_count=5)
+                   for i in range(4)]
+        scorer = BatchScorer(workers=2)
+        # The workers take longer to spawn than the dance lasts
+        scorer.distances([DTWJob(np.zeros(2), np.zeros(2))] * 2)
+        errors = asyncio.run(dance_for(Portal(spirits, scorer=scorer), 0.3))
+        scorer.shutdown()
+
+        assert errors == {}
+        for spirit in spirits:
+            assert len(spirit.measurements) == 5
+            assert spirit.conduit.states[0] == SpiritState.dormant
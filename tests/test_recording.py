@@ -0,0 +1,88 @@
+import time
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+from channelling_portal.entities import Measurement, Quaternion, Spirit, SpiritState
+from channelling_portal.recording import (
+    RecordingSpiritCommunication, ReplaySpiritCommunication, SessionRecorder, load_session)
+
+
+def measurement(timestamp, qy=0.0):
+    return Measurement(timestamp=timestamp, quaternion=Quaternion(qw=1.0, qx=0.0, qy=qy, qz=0.0))
+
+
+@pytest.fixture
+def session(tmp_path):
+    path = str(tmp_path / "session.spirits")
+    with SessionRecorder(path) as recorder:
+        for i in range(20):
+            recorder.record(measurement(10 * i, 0.01 * i), received_ns=i * 1_000_000)
+    return path
+
+
+class TestSessionRecorder:
+    def test_maps_records_as_columns(self, session):
+        records = load_session(session)
+        np.testing.assert_array_equal(records["timestamp"], np.arange(20) * 10)
+        np.testing.assert_allclose(records["quaternion"][:, 2], np.arange(20) * 0.01)
+
+    def test_appends_to_an_existing_session(self, session):
+        with SessionRecorder(session) as recorder:
+            recorder.record(measurement(200))
+        assert len(load_session(session)) == 21
+
+    def test_rejects_foreign_files(self, tmp_path):
+        path = tmp_path / "other.bin"
+        path.write_bytes(b"not a session")
+        with pytest.raises(ValueError):
+            load_session(str(path))
+
+    def test_recording_conduit_tees_measurements(self, tmp_path):
+        path = str(tmp_path / "live.spirits")
+        conduit = Mock()
+        conduit.measure.return_value = measurement(42)
+        with SessionRecorder(path) as recorder:
+            recording = RecordingSpiritCommunication(conduit=conduit, recorder=recorder)
+            assert recording.measure().timestamp == 42
+        assert load_session(path)["timestamp"].tolist() == [42]
+
+
+class TestReplaySpiritCommunication:
+    def test_replays_every_measurement_then_ends(self, session):
+        replay = ReplaySpiritCommunication(path=session, speed=None)
+        replay.connect()
+        assert [replay.measure().timestamp for _ in range(20)] == list(range(0, 200, 10))
+        with pytest.raises(EOFError):
+            replay.measure()
+
+    def test_loops_when_asked(self, session):
+        replay = ReplaySpiritCommunication(path=session, speed=None, loop=True)
+        replay.connect()
+        assert [replay.measure().timestamp for _ in range(21)][-1] == 0
+
+    def test_paces_by_recorded_arrival_time(self, session):
+        replay = ReplaySpiritCommunication(path=session, speed=2.0)
+        replay.connect()
+        start = time.perf_counter()
+        for _ in range(20):
+            replay.measure()
+        # 19 ms of recorded arrivals at double speed
+        assert 0.009 <= time.perf_counter() - start < 0.1
+
+    def test_spirit_dances_a_replay_to_the_end(self, session):
+        spirit = Spirit(name="Replay", color="Blue", conduit=ReplaySpiritCommunication(path=session, speed=None),
+                        measurement_count=5)
+        with pytest.raises(EOFError):
+            spirit.dance()
+        assert len(spirit.measurements) == 5
+        assert spirit.conduit.states[0] == SpiritState.dormant
+        assert spirit.conduit.rates == []
+
+    def test_spirit_asks_for_its_idle_rate_when_dormant(self, session):
+        spirit = Spirit(name="Replay", color="Blue", conduit=ReplaySpiritCommunication(path=session, speed=None),
+                        measurement_count=5, idle_rate=20)
+        with pytest.raises(EOFError):
+            spirit.dance()
+        assert spirit.conduit.states[0] == SpiritState.dormant
+        assert spirit.conduit.rates == [20]
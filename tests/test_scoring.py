@@ -0,0 +1,139 @@
+import os
+import time
+
+import numpy as np
+import pytest
+from dtaidistance import dtw
+from channelling_portal.scoring import (
+    BatchScorer, DerivativeDetector, DTWJob, ThresholdCascade, lb_keogh, lb_kim, paa, phase_search, resample)
+
+
+def exact_distance(reference, values, window=None):
+    # Euclidean pruning occasionally reports an exactly diagonal alignment as inf
+    return dtw.distance_fast(reference, values, window=window, use_pruning=False)
+
+
+class TestThresholdCascade:
+    @pytest.fixture
+    def pairs(self):
+        rng = np.random.default_rng(1)
+        reference = np.sin(np.linspace(0, 3, 40))
+        # From identical to far off, so every stage of the cascade decides some
+        return [(reference, reference + rng.normal(0, scale, 40)) for scale in np.geomspace(1e-4, 1, 200)]
+
+    def test_bounds_never_exceed_the_distance(self, pairs):
+        for reference, values in pairs:
+            distance = exact_distance(reference, values)
+            assert lb_kim(reference, values) <= distance + 1e-12
+            assert lb_keogh(reference, values) <= distance + 1e-12
+
+    def test_decisions_match_the_exact_distance(self, pairs):
+        cascade = ThresholdCascade()
+        for threshold in (0.01, 0.1, 1.0):
+            for reference, values in pairs:
+                expected = exact_distance(reference, values) < threshold
+                assert cascade.below(reference, values, threshold) == expected
+        assert cascade.kim and cascade.keogh and cascade.exact
+
+    @pytest.mark.parametrize("window", [1, 3, 10])
+    def test_banded_decisions_match_the_exact_distance(self, pairs, window):
+        cascade = ThresholdCascade()
+        for reference, values in pairs:
+            distance = exact_distance(reference, values, window)
+            assert lb_keogh(reference, values, window) <= distance + 1e-12
+            assert cascade.below(reference, values, 0.1, window) == (distance < 0.1)
+
+    def test_threshold_at_the_exact_distance_is_not_below(self, pairs):
+        reference, values = pairs[100]
+        distance = exact_distance(reference, values)
+        assert not ThresholdCascade().below(reference, values, distance)
+
+    def test_empty_window_is_rejected(self):
+        assert not ThresholdCascade().below(np.empty(0), np.empty(0), 0.1)
+
+
+class TestSeriesReduction:
+    def test_resample_interpolates_onto_a_uniform_grid(self):
+        grid, values = resample(np.array([0.0, 7.0, 20.0, 24.0]), np.array([0.0, 7.0, 20.0, 24.0]), 5.0)
+        np.testing.assert_array_equal(grid, [0, 5, 10, 15, 20])
+        np.testing.assert_allclose(values, grid)
+
+    def test_paa_averages_blocks_and_the_tail(self):
+        np.testing.assert_allclose(paa(np.arange(7.0), 3), [1.0, 4.0, 6.0])
+        np.testing.assert_array_equal(paa(np.arange(4.0), 1), np.arange(4.0))
+
+
+class TestPhaseSearch:
+    def test_finds_where_the_query_ends_in_the_series(self):
+        series = np.sin(np.linspace(0, 4 * np.pi, 200))
+        end, distance = phase_search(series[37:77].copy(), series)
+        assert end in (76, 76 + 100) and distance == pytest.approx(0)
+
+    def test_tolerates_a_warped_query(self):
+        series = np.sin(np.linspace(0, 2 * np.pi, 100))
+        # The middle of the stretch at half speed
+        query = np.concatenate((series[10:30], np.repeat(series[30:40], 2), series[40:60]))
+        end, distance = phase_search(query, series)
+        assert end == 59 and distance == pytest.approx(0)
+
+
+class TestDerivativeDetector:
+    @staticmethod
+    def ramp(timestamp):
+        # 2 rad/s
+        return timestamp / 500
+
+    def test_following_the_slope_never_misses(self):
+        detector = DerivativeDetector()
+        rng = np.random.default_rng(0)
+        for timestamp in range(0, 1000, 10):
+            assert detector.update(timestamp, self.ramp(timestamp) + rng.normal(0, 0.002), self.ramp, 1.0)
+        assert detector.misses == 0
+
+    def test_counts_consecutive_misses_and_recovers(self):
+        detector = DerivativeDetector()
+        values = [0.0, 0.02, 0.04, 0.04, 0.04, 0.04, 0.06, 0.08]
+        misses = []
+        for index, value in enumerate(values):
+            detector.update(10 * index, value, self.ramp, 1.0)
+            misses.append(detector.misses)
+        assert misses == [0, 0, 0, 1, 2, 3, 0, 0]
+
+    def test_clock_going_back_is_a_miss(self):
+        detector = DerivativeDetector()
+        detector.update(100, 0.2, self.ramp, 1.0)
+        assert not detector.update(0, 0.0, self.ramp, 1.0)
+
+
+class TestBatchScorer:
+    def test_distances_match_each_job_in_order(self):
+        rng = np.random.default_rng(4)
+        jobs = [DTWJob(rng.random(40), rng.random(40 + n % 3), window=[None, 5][n % 2]) for n in range(11)]
+        scorer = BatchScorer(workers=4)
+        try:
+            distances = scorer.distances(jobs)
+        finally:
+            scorer.shutdown()
+        expected = [dtw.distance(job.reference, job.values, window=job.window) for job in jobs]
+        np.testing.assert_allclose(distances, expected)
+
+    def test_abandons_past_max_dist(self):
+        job = DTWJob(np.zeros(30), np.ones(30), max_dist=1.0)
+        assert BatchScorer(workers=1).distances([job]) == [np.inf]
+
+    @pytest.mark.skipif((os.cpu_count() or 1) < 2, reason="needs more than one core")
+    def test_workers_score_a_tick_in_parallel(self):
+        rng = np.random.default_rng(5)
+        jobs = [DTWJob(rng.random(800), rng.random(800)) for _ in range(8)]
+        scorer = BatchScorer(workers=2)
+        try:
+            # The first tick also spawns the workers
+            scorer.distances(jobs)
+            start = time.perf_counter()
+            scorer.distances(jobs)
+            parallel = time.perf_counter() - start
+        finally:
+            scorer.shutdown()
+        start = time.perf_counter()
+        BatchScorer(workers=1).distances(jobs)
+        assert parallel < 0.8 * (time.perf_counter() - start)
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+from dtaidistance import dtw
+from channelling_portal.summoning import (
+    RotationSummoning, SummoningFunction, TemplateCache, register_summoning, rotation_function_ms,
+    summoning_function, summoning_functions)
+
+
+class TestRotationFunction:
+    def test_phases_of_the_cycle(self):
+        angles = rotation_function_ms([0, 500, 1000, 1050, 1600, 2150, 2200])
+        np.testing.assert_allclose(angles, [0, np.pi / 2, np.pi, np.pi, np.pi / 2, 0, 0])
+
+    def test_accepts_lists_and_arrays(self):
+        times = list(range(0, 5000, 7))
+        np.testing.assert_array_equal(rotation_function_ms(times), rotation_function_ms(np.array(times)))
+
+
+class TestTemplateCache:
+    @pytest.fixture
+    def cache(self):
+        return TemplateCache(RotationSummoning(), maxsize=2)
+
+    def test_template_matches_rotation_function(self, cache):
+        times = np.arange(0, 3000, 10)
+        np.testing.assert_array_equal(cache.template(times), rotation_function_ms(times))
+
+    def test_steady_stream_reuses_template_once_per_cycle(self, cache):
+        first = cache.template(np.arange(0, 1000, 10))
+        second = cache.template(np.arange(2200, 3200, 10))
+        assert second is first
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_each_function_has_its_own_cache(self, cache):
+        times = np.arange(0, 1000, 10)
+        shorter = RotationSummoning(rotation_duration=500)
+        np.testing.assert_array_equal(shorter.template(times), rotation_function_ms(times, rotation_duration=500))
+        assert shorter.template(times) is not cache.template(times)
+
+    def test_evicts_least_recently_used(self, cache):
+        for offset in range(3):
+            cache.template(np.arange(offset, 100 + offset))
+        assert len(cache) == 2
+
+    def test_templates_feed_dtw(self, cache):
+        times = np.arange(0, 1000, 10)
+        template = cache.template(times)
+        assert dtw.distance_fast(template, rotation_function_ms(times)) == 0
+
+
+class TestSummoningFunction:
+    @pytest.fixture
+    def rotation(self):
+        return RotationSummoning(rotation_duration=500, pause_duration=50)
+
+    def test_rotation_evaluates_its_parameters(self, rotation):
+        times = np.arange(0, 3000, 7.0)
+        np.testing.assert_array_equal(rotation(times), rotation_function_ms(times, 500, 50))
+        np.testing.assert_array_equal(rotation.template(times), rotation(times))
+
+    def test_scalar_value_matches_the_vectorized_function(self, rotation):
+        times = np.arange(-1100, 3000, 3.0)
+        np.testing.assert_allclose([rotation.value(t) for t in times.tolist()], rotation(times), atol=1e-12)
+
+    @pytest.mark.parametrize("start", [0.0, 20.0, 1090.0, 5000.0])
+    def test_grid_template_slices_one_table_per_step(self, rotation, start):
+        template = rotation.grid_template(start, 80, 10.0)
+        np.testing.assert_allclose(template, rotation(start + np.arange(80) * 10.0))
+        assert template.base is rotation.grid_template(0.0, 10, 10.0).base
+
+    def test_off_grid_templates_fall_back_to_the_cache(self, rotation):
+        template = rotation.grid_template(3.0, 20, 7.0)
+        np.testing.assert_allclose(template, rotation(3.0 + np.arange(20) * 7.0))
+        assert rotation.cache.misses == 1
+
+    def test_registry_shares_instances_per_configuration(self):
+        first = summoning_function("rotation", rotation_duration=800, threshold=0.2)
+        assert summoning_function("rotation", threshold=0.2, rotation_duration=800) is first
+        assert summoning_function("rotation", rotation_duration=800) is not first
+        assert first.threshold == 0.2 and first.period == 1800
+
+    def test_custom_functions_register_by_name(self):
+        @register_summoning
+        class Sway(SummoningFunction):
+            name = "sway"
+            period = 1000.0
+
+            def __call__(self, times):
+                return 0.5 * np.sin(2 * np.pi * np.asarray(times, dtype=float) / self.period)
+
+        try:
+            sway = summoning_function("sway", axis="z")
+            assert isinstance(sway, Sway) and sway.axis == "z"
+        finally:
+            del summoning_functions["sway"]
+
+    def test_rejects_unknown_names_and_axes(self):
+        with pytest.raises(ValueError):
+            summoning_function("levitation")
+        with pytest.raises(ValueError):
+            RotationSummoning(axis="w")
+
+    def test_functions_must_implement_call(self):
+        with pytest.raises(TypeError):
+            SummoningFunction()
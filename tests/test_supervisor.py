@@ -0,0 +1,198 @@
+import asyncio
+import threading
+
+import pytest
+from channelling_portal.entities import Measurement, Spirit, SpiritState
+from channelling_portal.instrumentation import Instrumentation
+from channelling_portal.network import UDPSpiritServer
+from channelling_portal.osc import encode_message
+from channelling_portal.portal import Portal
+from channelling_portal.supervisor import AsyncConnectionSupervisor, ConnectionSupervisor
+
+
+def measurement(timestamp):
+    return Measurement.trusted(timestamp, 1.0, 0.0, 0.0, 0.0)
+
+
+def sample(device_id, timestamp):
+    return encode_message(f"/spirit/{device_id}/quaternion", "iffff", timestamp, 1.0, 0.0, 0.0, 0.0)
+
+
+class FlakyConduit:
+    """Drops the connection before each timestamp in ``dropouts`` and refuses the next ``refusals`` connects."""
+
+    def __init__(self, count, dropouts=(), refusals=0):
+        self.timestamps = list(range(0, 10 * count, 10))
+        self.dropouts = set(dropouts)
+        self.refusals = refusals
+        self.connected = False
+        self.connects = 0
+        self.disconnects = 0
+        self.states = []
+
+    def connect(self):
+        self.connects += 1
+        if self.refusals:
+            self.refusals -= 1
+            raise ConnectionError("device not found")
+        self.connected = True
+
+    def disconnect(self):
+        self.disconnects += 1
+        self.connected = False
+
+    def measure(self):
+        if not self.connected:
+            raise ConnectionError("not connected")
+        if not self.timestamps:
+            raise EOFError("End of samples")
+        if self.timestamps[0] in self.dropouts:
+            self.dropouts.discard(self.timestamps[0])
+            self.connected = False
+            raise ConnectionError("unplugged")
+        return measurement(self.timestamps.pop(0))
+
+    def notify_state(self, state):
+        if not self.connected:
+            raise ConnectionError("not connected")
+        self.states.append(state)
+
+
+class AsyncFlakyConduit(FlakyConduit):
+    async def connect(self):
+        super().connect()
+
+    async def disconnect(self):
+        super().disconnect()
+
+    async def measure(self):
+        await asyncio.sleep(0)
+        return super().measure()
+
+    async def notify_state(self, state):
+        super().notify_state(state)
+
+
+class TestConnectionSupervisor:
+    def test_reconnects_after_a_dropout_with_backoff(self):
+        conduit = FlakyConduit(5, dropouts=[20], refusals=0)
+        restarts = []
+        supervisor = ConnectionSupervisor(conduit, initial_delay=0.01, instrumentation=Instrumentation(),
+                                          on_reconnect=lambda: restarts.append(True))
+        assert [supervisor.measure().timestamp for _ in range(2)] == [0, 10]
+        conduit.refusals = 2
+        assert [supervisor.measure().timestamp for _ in range(3)] == [20, 30, 40]
+        assert supervisor.reconnects == 1 and restarts == [True]
+        # One connect at the start, two refused and the one that got through
+        assert conduit.connects == 4
+        assert supervisor.downtime >= 0.03
+        counters = supervisor.instrumentation.counters
+        assert counters == {"disconnects": 1, "connect_failed": 2, "reconnects": 1}
+        assert supervisor.instrumentation.stages["downtime"].count == 1
+        with pytest.raises(EOFError):
+            supervisor.measure()
+
+    def test_first_connect_retries_without_counting_a_reconnect(self):
+        conduit = FlakyConduit(1, refusals=3)
+        supervisor = ConnectionSupervisor(conduit, initial_delay=0.001)
+        assert supervisor.measure().timestamp == 0
+        assert supervisor.reconnects == 0 and supervisor.downtime == 0.0
+        assert supervisor.failures == 3
+        assert conduit.connects == 4
+        # Every refused connect was cleaned up before the next
+        assert conduit.disconnects == 3
+
+    def test_backoff_is_capped(self):
+        supervisor = ConnectionSupervisor(FlakyConduit(0), initial_delay=0.5, max_delay=2.0)
+        error = ConnectionError()
+        assert [supervisor._failed(error, attempt) for attempt in range(5)] == [0.5, 1.0, 2.0, 2.0, 2.0]
+        assert supervisor.failures == 5
+
+    def test_downtime_lasts_until_samples_flow_again(self):
+        server = UDPSpiritServer(ip_address="127.0.0.1", port=0)
+        conduit = server.conduit("rain")
+        conduit.silence_timeout = 0.05
+        supervisor = ConnectionSupervisor(conduit, initial_delay=0.01)
+        address = ("127.0.0.1", 9)
+        try:
+            supervisor.connect()
+            server.receive([(sample("rain", t), address) for t in (10, 40)])
+            assert supervisor.measure().timestamp == 10
+            # Held for reordering until the device went quiet
+            assert supervisor.measure().timestamp == 40
+            # Silent for a few timeouts, each one reconnecting at once
+            timer = threading.Timer(0.25, server.receive, [[(sample("rain", t), address) for t in (50, 80)]])
+            timer.start()
+            assert supervisor.measure().timestamp == 50
+            assert supervisor.reconnects == 1 and supervisor.downtime >= 0.15
+        finally:
+            supervisor.disconnect()
+        assert not server._running.is_set()
+
+    def test_stop_ends_reconnecting(self):
+        conduit = FlakyConduit(1, refusals=10 ** 6)
+        supervisor = ConnectionSupervisor(conduit, initial_delay=0.01)
+        supervisor.stop()
+        with pytest.raises(EOFError):
+            supervisor.measure()
+
+
+class TestSupervisedDance:
+    def test_dropout_does_not_end_the_dance(self):
+        conduit = FlakyConduit(60, dropouts=[200, 400])
+        spirit = Spirit(name="Flaky", color="Blue", conduit=conduit, measurement_count=10,
+                        reconnect=True, reconnect_delay=0.01, instrumentation=Instrumentation())
+        with pytest.raises(EOFError):
+            spirit.dance()
+        assert spirit.supervisor.reconnects == 2
+        assert spirit.ingest.received == 60
+        assert spirit.instrumentation.counters["samples"] == 60
+        assert spirit.instrumentation.counters["disconnects"] == 2
+
+    def test_reset_starts_the_window_over(self):
+        conduit = FlakyConduit(25, dropouts=[200])
+        spirit = Spirit(name="Flaky", color="Blue", conduit=conduit, measurement_count=10,
+                        reconnect=True, reconnect_delay=0.01, reconnect_reset=True)
+        with pytest.raises(EOFError):
+            spirit.dance()
+        # Only the five samples after the reconnect are in the window
+        assert len(spirit.measurements) == 5
+        assert spirit.measurements.timestamps[0] == 200
+        assert spirit.state == SpiritState.inert
+        # The new connection was told the spirit starts over
+        assert conduit.states[-1] == SpiritState.inert
+
+    def test_without_reconnect_a_dropout_still_ends_the_dance(self):
+        spirit = Spirit(name="Flaky", color="Blue", conduit=FlakyConduit(10, dropouts=[50]), measurement_count=5)
+        with pytest.raises(ConnectionError):
+            spirit.dance()
+        assert spirit.supervisor is None
+
+
+class TestSupervisedPortal:
+    def test_a_dropout_leaves_the_other_spirits_dancing(self):
+        flaky = AsyncFlakyConduit(40, dropouts=[100], refusals=0)
+        steady = AsyncFlakyConduit(40)
+        spirits = [
+            Spirit(name="Flaky", color="Blue", conduit=flaky, measurement_count=10,
+                   reconnect=True, reconnect_delay=0.01),
+            Spirit(name="Steady", color="Red", conduit=steady, measurement_count=10, reconnect=True),
+        ]
+        portal = Portal(spirits)
+        errors = asyncio.run(portal.run())
+        assert set(errors) == {"Flaky", "Steady"}
+        assert all(isinstance(error, EOFError) for error in errors.values())
+        assert portal.supervisors["Flaky"].reconnects == 1
+        assert portal.supervisors["Steady"].reconnects == 0
+        assert portal.ingests["Flaky"].received == 40
+
+    def test_async_backoff_retries_a_refused_connect(self):
+        conduit = AsyncFlakyConduit(1, refusals=2)
+
+        async def measure():
+            supervisor = AsyncConnectionSupervisor(conduit, initial_delay=0.001)
+            return await supervisor.measure(), supervisor
+
+        result, supervisor = asyncio.run(measure())
+        assert result.timestamp == 0 and conduit.connects == 3
+        assert supervisor.error is not None